@@ -16,7 +16,7 @@ if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
 # Set Alembic DB URL from Settings (.env)
-config.set_main_option("sqlalchemy.url", settings.MYSQL_URL)
+config.set_main_option("sqlalchemy.url", settings.mysql_url)
 
 target_metadata = Base.metadata
 
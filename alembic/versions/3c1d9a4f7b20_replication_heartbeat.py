@@ -0,0 +1,33 @@
+"""replication heartbeat
+
+Revision ID: 3c1d9a4f7b20
+Revises: e6718eb2fb1b
+Create Date: 2026-10-17 11:05:12.402931
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3c1d9a4f7b20"
+down_revision: Union[str, Sequence[str], None] = "e6718eb2fb1b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "replication_heartbeat",
+        sa.Column("heartbeat_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("beat_ms", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("heartbeat_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("replication_heartbeat")
@@ -0,0 +1,37 @@
+"""truck driver assignment
+
+Revision ID: 8b2e4c6d1a93
+Revises: 3c1d9a4f7b20
+Create Date: 2026-10-17 14:20:41.118306
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8b2e4c6d1a93"
+down_revision: Union[str, Sequence[str], None] = "3c1d9a4f7b20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # batch_alter_table: SQLite cannot add a foreign key in place (plain ALTERs elsewhere).
+    with op.batch_alter_table("trucks") as batch_op:
+        batch_op.add_column(sa.Column("driver_id", sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f("ix_trucks_driver_id"), ["driver_id"], unique=False)
+        batch_op.create_foreign_key(
+            "fk_trucks_driver_id_drivers", "drivers", ["driver_id"], ["driver_id"], ondelete="SET NULL"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("trucks") as batch_op:
+        batch_op.drop_constraint("fk_trucks_driver_id_drivers", type_="foreignkey")
+        batch_op.drop_index(batch_op.f("ix_trucks_driver_id"))
+        batch_op.drop_column("driver_id")
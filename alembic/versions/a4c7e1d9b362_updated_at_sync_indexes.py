@@ -0,0 +1,29 @@
+"""updated_at sync indexes
+
+Revision ID: a4c7e1d9b362
+Revises: 5f9a2e7c4b18
+Create Date: 2026-10-17 18:02:13.540217
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4c7e1d9b362"
+down_revision: Union[str, Sequence[str], None] = "5f9a2e7c4b18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_drivers_updated_at_driver_id", "drivers", ["updated_at", "driver_id"], unique=False)
+    op.create_index("ix_trucks_updated_at_truck_id", "trucks", ["updated_at", "truck_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_trucks_updated_at_truck_id", table_name="trucks")
+    op.drop_index("ix_drivers_updated_at_driver_id", table_name="drivers")
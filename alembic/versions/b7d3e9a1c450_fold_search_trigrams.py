@@ -0,0 +1,81 @@
+"""fold search trigrams
+
+Revision ID: b7d3e9a1c450
+Revises: e2b8d4f1c605
+Create Date: 2026-10-18 11:40:05.613920
+"""
+
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d3e9a1c450"
+down_revision: Union[str, Sequence[str], None] = "e2b8d4f1c605"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# entity -> (primary key, indexed columns); mirrors services/search_index.SEARCH_FIELDS
+SEARCH_FIELDS = {
+    "trucks": ("truck_id", ("unit_number", "plate_number", "vin")),
+    "drivers": ("driver_id", ("driver_name",)),
+}
+
+
+def _folded(value):
+    # Mirrors services/search_index.fold
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _lowered(value):
+    return value.lower()
+
+
+def _trigrams(value, normalize):
+    if not value:
+        return set()
+    text = normalize(value)
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _reindex(normalize) -> None:
+    """Recomputes every gram with `normalize` (grams of accented or non-ASCII values change)."""
+    search_trigrams = sa.table(
+        "search_trigrams", sa.column("entity"), sa.column("field"), sa.column("gram"), sa.column("entity_id")
+    )
+    conn = op.get_bind()
+    conn.execute(sa.delete(search_trigrams))
+    for entity, (pk, fields) in SEARCH_FIELDS.items():
+        table = sa.table(entity, sa.column(pk), *[sa.column(f) for f in fields])
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                sa.select(table).where(table.c[pk] > last_id).order_by(table.c[pk]).limit(5000)
+            ).all()
+            if not rows:
+                break
+            grams = [
+                {"entity": entity, "field": field, "gram": gram, "entity_id": row._mapping[pk]}
+                for row in rows
+                for field in fields
+                for gram in _trigrams(row._mapping[field], normalize)
+            ]
+            if grams:
+                op.bulk_insert(search_trigrams, grams)
+            last_id = rows[-1]._mapping[pk]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Grams are now case- and accent-folded to match the columns' collation.
+    _reindex(_folded)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _reindex(_lowered)
@@ -0,0 +1,47 @@
+"""list query indexes
+
+Revision ID: c81f3e5a9d27
+Revises: a4c7e1d9b362
+Create Date: 2026-10-17 19:41:07.215530
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c81f3e5a9d27"
+down_revision: Union[str, Sequence[str], None] = "a4c7e1d9b362"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Proposed by python -m benchmarks.index_advisor for the default list views.
+    op.create_index("ix_trucks_created_at", "trucks", ["created_at"], unique=False)
+    op.create_index("ix_trucks_is_active_unit_number", "trucks", ["is_active", "unit_number"], unique=False)
+    op.create_index("ix_trucks_is_active_created_at", "trucks", ["is_active", "created_at"], unique=False)
+    op.create_index("ix_trucks_is_active_updated_at", "trucks", ["is_active", "updated_at"], unique=False)
+    op.create_index("ix_drivers_created_at", "drivers", ["created_at"], unique=False)
+    op.create_index("ix_drivers_is_active_driver_name", "drivers", ["is_active", "driver_name"], unique=False)
+    op.create_index("ix_drivers_is_active_created_at", "drivers", ["is_active", "created_at"], unique=False)
+    op.create_index("ix_drivers_is_active_updated_at", "drivers", ["is_active", "updated_at"], unique=False)
+    # Duplicates of the primary keys
+    op.drop_index("ix_trucks_truck_id", table_name="trucks")
+    op.drop_index("ix_drivers_driver_id", table_name="drivers")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("ix_drivers_driver_id", "drivers", ["driver_id"], unique=False)
+    op.create_index("ix_trucks_truck_id", "trucks", ["truck_id"], unique=False)
+    op.drop_index("ix_drivers_is_active_updated_at", table_name="drivers")
+    op.drop_index("ix_drivers_is_active_created_at", table_name="drivers")
+    op.drop_index("ix_drivers_is_active_driver_name", table_name="drivers")
+    op.drop_index("ix_drivers_created_at", table_name="drivers")
+    op.drop_index("ix_trucks_is_active_updated_at", table_name="trucks")
+    op.drop_index("ix_trucks_is_active_created_at", table_name="trucks")
+    op.drop_index("ix_trucks_is_active_unit_number", table_name="trucks")
+    op.drop_index("ix_trucks_created_at", table_name="trucks")
@@ -0,0 +1,31 @@
+"""row versions
+
+Revision ID: e2b8d4f1c605
+Revises: c81f3e5a9d27
+Create Date: 2026-10-18 09:12:37.204815
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e2b8d4f1c605"
+down_revision: Union[str, Sequence[str], None] = "c81f3e5a9d27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows start at 1: their ETags change once, then follow every write.
+    op.add_column("drivers", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+    op.add_column("trucks", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("trucks", "version")
+    op.drop_column("drivers", "version")
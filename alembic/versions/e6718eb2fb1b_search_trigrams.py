@@ -0,0 +1,76 @@
+"""search trigrams
+
+Revision ID: e6718eb2fb1b
+Revises: d7f0bb7a3379
+Create Date: 2026-10-17 09:12:40.118204
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e6718eb2fb1b"
+down_revision: Union[str, Sequence[str], None] = "d7f0bb7a3379"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# entity -> (primary key, indexed columns); mirrors services/search_index.SEARCH_FIELDS
+SEARCH_FIELDS = {
+    "trucks": ("truck_id", ("unit_number", "plate_number", "vin")),
+    "drivers": ("driver_id", ("driver_name",)),
+}
+
+
+def _trigrams(value):
+    if not value:
+        return set()
+    text = value.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    search_trigrams = op.create_table(
+        "search_trigrams",
+        sa.Column("entity", sa.String(length=16), nullable=False),
+        sa.Column("field", sa.String(length=32), nullable=False),
+        sa.Column(
+            "gram",
+            sa.String(length=3).with_variant(sa.String(length=3, collation="utf8mb4_bin"), "mysql"),
+            nullable=False,
+        ),
+        sa.Column("entity_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.PrimaryKeyConstraint("entity", "field", "gram", "entity_id"),
+    )
+    op.create_index("ix_search_trigrams_entity_id", "search_trigrams", ["entity", "entity_id"], unique=False)
+
+    # Backfill existing rows so searches are correct as soon as the app uses the index.
+    conn = op.get_bind()
+    for entity, (pk, fields) in SEARCH_FIELDS.items():
+        table = sa.table(entity, sa.column(pk), *[sa.column(f) for f in fields])
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                sa.select(table).where(table.c[pk] > last_id).order_by(table.c[pk]).limit(5000)
+            ).all()
+            if not rows:
+                break
+            grams = [
+                {"entity": entity, "field": field, "gram": gram, "entity_id": row._mapping[pk]}
+                for row in rows
+                for field in fields
+                for gram in _trigrams(row._mapping[field])
+            ]
+            if grams:
+                op.bulk_insert(search_trigrams, grams)
+            last_id = rows[-1]._mapping[pk]
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_search_trigrams_entity_id", table_name="search_trigrams")
+    op.drop_table("search_trigrams")
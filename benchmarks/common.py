@@ -0,0 +1,82 @@
+"""Helpers shared by the benchmark scripts: seeding and latency summaries."""
+from __future__ import annotations
+
+import statistics
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+SEED_BATCH = 10_000
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies_ms: List[float], elapsed_s: float, errors: int) -> Dict[str, object]:
+    if not latencies_ms:
+        return {"requests": 0, "errors": errors}
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "elapsed_s": round(elapsed_s, 3),
+        "throughput_rps": round(len(latencies_ms) / elapsed_s, 1) if elapsed_s else None,
+        "p50_ms": round(statistics.median(latencies_ms), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "max_ms": round(max(latencies_ms), 2),
+    }
+
+
+def seed_fleet(rows: int, search_index: bool = True) -> Dict[str, int]:
+    """
+    Tops trucks and drivers up to `rows` each (existing rows are kept, so a
+    database can be reused between runs). Timestamps are spread over a year so
+    sorting on them is not a no-op. Returns the row counts.
+    """
+    from sqlalchemy import func, insert, select
+
+    from db import Base, SessionLocal, engine
+    from models import Driver, Truck
+    from services.search_index import rebuild
+
+    Base.metadata.create_all(engine)
+    epoch = datetime(2025, 1, 1)
+    step = timedelta(days=365) / max(rows, 1)
+
+    def stamp(i: int) -> datetime:
+        return (epoch + step * i).replace(microsecond=0)
+
+    counts: Dict[str, int] = {}
+    with SessionLocal() as db:
+        for model, make in (
+            (
+                Truck,
+                lambda i: {
+                    "unit_number": f"U{i:07d}",
+                    "plate_number": f"PL{(i * 7919) % 10_000_000:07d}",
+                    "vin": f"1FUJ{i:013d}" if i % 4 else None,
+                    "is_active": i % 3 != 0,
+                    "created_at": stamp(i),
+                    "updated_at": stamp(i),
+                },
+            ),
+            (
+                Driver,
+                lambda i: {
+                    "driver_name": f"Driver {(i * 104729) % rows:07d}",
+                    "is_active": i % 5 != 0,
+                    "created_at": stamp(i),
+                    "updated_at": stamp(i),
+                },
+            ),
+        ):
+            existing = db.execute(select(func.count()).select_from(model)).scalar_one()
+            for start in range(existing, rows, SEED_BATCH):
+                db.execute(insert(model), [make(i) for i in range(start, min(rows, start + SEED_BATCH))])
+                db.commit()
+            if search_index and existing < rows:
+                rebuild(db, model.__tablename__)
+            counts[model.__tablename__] = max(existing, rows)
+    return counts
@@ -1,25 +1,374 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import asyncio
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Optional, Sequence, TypeVar, Union
+
+from fastapi import Request, Response
+from sqlalchemy import Select, create_engine, event, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker, DeclarativeBase, Session
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 
 from config import settings
+from utils.invalidation import last_commit, recent_write_window
+
+T = TypeVar("T")
+
+logger = logging.getLogger("fem_api.db")
 
 
 class Base(DeclarativeBase):
     pass
 
 
-engine = create_engine(
-    settings.mysql_url,
-    pool_pre_ping=True,
-    pool_recycle=1800,
-)
+# Async drivers used for db_mode="async", keyed by backend name.
+ASYNC_DRIVERS = {
+    "mysql": "aiomysql",
+    "sqlite": "aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """mysql+pymysql://... -> mysql+aiomysql://..., sqlite:///... -> sqlite+aiosqlite:///..."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for '{parsed.drivername}'")
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+# Objects stay usable after commit; responses are built from them once the
+# session is closed (and, in async mode, outside the greenlet).
+ENGINE_OPTIONS = {"pool_pre_ping": True, "pool_recycle": 1800}
+
+
+def _pool_options(url: str) -> dict:
+    parsed = make_url(url)
+    # In-memory SQLite uses a single shared connection (no QueuePool to size).
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+    }
+
+
+def _sqlite_foreign_keys(dbapi_connection: Any, connection_record: Any) -> None:
+    # SQLite only enforces FOREIGN KEY constraints when enabled, per connection.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+class Node:
+    """
+    One database server (the primary or a replica): its engine, and for
+    db_mode="async" its AsyncEngine, plus the health state of replicas.
+    """
+
+    def __init__(self, name: str, url: str, async_url: Optional[str] = None, is_replica: bool = False):
+        self.name = name
+        self.is_replica = is_replica
+        self.engine = create_engine(url, **ENGINE_OPTIONS, **_pool_options(url))
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=self.engine)
+        self.async_engine = None
+        self.async_session_factory = None
+        if settings.db_mode == "async":
+            self.async_engine = create_async_engine(async_url or to_async_url(url), **ENGINE_OPTIONS, **_pool_options(url))
+            self.async_session_factory = async_sessionmaker(self.async_engine, autoflush=False, expire_on_commit=False)
+        if self.engine.dialect.name == "sqlite":
+            for sync_engine in filter(None, (self.engine, self.async_engine and self.async_engine.sync_engine)):
+                event.listen(sync_engine, "connect", _sqlite_foreign_keys)
+
+        self.healthy = True
+        self.lag_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def new_session(self) -> Union[Session, AsyncSession]:
+        if self.async_session_factory is not None:
+            session = self.async_session_factory()
+            session.sync_session.info["replica"] = self.is_replica
+            return session
+        session = self.session_factory()
+        session.info["replica"] = self.is_replica
+        return session
+
+    def mark(self, healthy: bool, error: Optional[str] = None) -> None:
+        if healthy != self.healthy:
+            if healthy:
+                logger.warning("replica_restored name=%s lag_seconds=%s", self.name, self.lag_seconds)
+            else:
+                logger.warning("replica_evicted name=%s reason=%s", self.name, error)
+        self.healthy = healthy
+        self.error = error
+
+    def status(self) -> dict:
+        return {"name": self.name, "healthy": self.healthy, "lag_seconds": self.lag_seconds, "error": self.error}
+
+    async def dispose(self) -> None:
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+        await run_in_threadpool(self.engine.dispose)
+
+
+primary = Node("primary", settings.mysql_url, settings.async_mysql_url)
+replicas = [Node(f"replica{i}", url, is_replica=True) for i, url in enumerate(settings.replica_urls, start=1)]
+_next_replica = itertools.count()
+
+# Primary engine/factories under their historical names (CLI tools, alembic, benchmarks).
+engine = primary.engine
+SessionLocal = primary.session_factory
+async_engine = primary.async_engine
+AsyncSessionLocal = primary.async_session_factory
+
+
+def pick_replica() -> Optional[Node]:
+    """Round-robin over healthy replicas; None when there are none (reads then use the primary)."""
+    healthy = [node for node in replicas if node.healthy]
+    if not healthy:
+        return None
+    return healthy[next(_next_replica) % len(healthy)]
+
+
+def replica_may_lag(table: str, entity_id: Optional[Any] = None) -> bool:
+    """
+    True if this process wrote the row (or, without entity_id, the table)
+    recently enough that a healthy replica may not have it yet. Caches use it
+    to avoid storing replica reads that could undo an invalidation.
+    """
+    return time.monotonic() - last_commit(table, entity_id) < recent_write_window()
+
+
+def is_replica_session(session: Session) -> bool:
+    return bool(session.info.get("replica"))
+
+
+# -------------------------
+# Read-your-writes
+# -------------------------
+# A successful write stamps the response with its time (ms since epoch) as a
+# cookie and a header; clients that send it back within
+# read_your_writes_seconds read from the primary, so they never see a
+# replica that has not caught up with their own write yet.
+LAST_WRITE_COOKIE = "last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+SAFE_METHODS = ("GET", "HEAD")
+# POST endpoints that only read (their input is too long for a query string)
+READ_ONLY_PATHS = ("/trucks/lookup", "/drivers/lookup")
+
+
+def is_read(method: str, path: str) -> bool:
+    return method in SAFE_METHODS or (method == "POST" and path in READ_ONLY_PATHS)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def use_replica(request: Request) -> bool:
+    if not replicas or not is_read(request.method, request.url.path):
+        return False
+    raw = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        last_write_ms = int(raw) if raw else None
+    except ValueError:
+        last_write_ms = None
+    return last_write_ms is None or _now_ms() - last_write_ms > settings.read_your_writes_seconds * 1000
+
+
+def mark_write(request: Request, response: Response) -> None:
+    """Stamps successful writes; called by the middleware in main.py."""
+    if not replicas or is_read(request.method, request.url.path) or response.status_code >= 400:
+        return
+    stamp = str(_now_ms())
+    response.headers[LAST_WRITE_HEADER] = stamp
+    response.set_cookie(
+        LAST_WRITE_COOKIE,
+        stamp,
+        max_age=max(1, math.ceil(settings.read_your_writes_seconds)),
+        httponly=True,
+        samesite="lax",
+    )
+
+
+# -------------------------
+# Replica health
+# -------------------------
+def _beat(node: Node, now_ms: int) -> None:
+    from models import ReplicationHeartbeat
+
+    with node.session_factory() as session:
+        updated = session.execute(
+            update(ReplicationHeartbeat).where(ReplicationHeartbeat.heartbeat_id == 1).values(beat_ms=now_ms)
+        ).rowcount
+        if not updated:
+            session.add(ReplicationHeartbeat(heartbeat_id=1, beat_ms=now_ms))
+        session.commit()
+
+
+def _read_beat(node: Node) -> Optional[int]:
+    from models import ReplicationHeartbeat
+
+    with node.session_factory() as session:
+        return session.scalar(select(ReplicationHeartbeat.beat_ms).where(ReplicationHeartbeat.heartbeat_id == 1))
 
 
-def get_db():
-    db = SessionLocal()
+async def check_replicas() -> None:
+    """
+    Writes the heartbeat on the primary, then reads it back from every
+    replica: lag = now - heartbeat seen by the replica. Unreachable replicas
+    and replicas lagging more than replica_max_lag_seconds stop receiving
+    reads until a later check finds them caught up.
+    """
+    if not replicas:
+        return
+    try:
+        await run_in_threadpool(_beat, primary, _now_ms())
+    except SQLAlchemyError as exc:
+        # Lag keeps being measured against the last beat that got through.
+        logger.warning("replica_heartbeat_failed error=%s", exc)
+
+    for node in replicas:
+        try:
+            beat_ms = await run_in_threadpool(_read_beat, node)
+        except SQLAlchemyError as exc:
+            node.lag_seconds = None
+            node.mark(False, f"unreachable: {exc.__class__.__name__}")
+            continue
+        if beat_ms is None:
+            node.lag_seconds = None
+            node.mark(False, "no heartbeat replicated yet")
+            continue
+        node.lag_seconds = max(0.0, (_now_ms() - beat_ms) / 1000)
+        if node.lag_seconds > settings.replica_max_lag_seconds:
+            node.mark(False, f"lagging {node.lag_seconds:.1f}s")
+        else:
+            node.mark(True)
+
+
+async def replica_health_loop() -> None:
+    while True:
+        try:
+            await check_replicas()
+        except Exception:
+            logger.exception("replica_health_check_failed")
+        await asyncio.sleep(settings.replica_check_interval_seconds)
+
+
+class DBSession:
+    """
+    Request-scoped handle that runs the (sync) service functions without
+    blocking the event loop.
+
+    - db_mode="sync": the function runs on a plain Session in AnyIO's threadpool.
+    - db_mode="async": the function runs on an AsyncSession via `run_sync`; it
+      executes on the event loop in a greenlet and awaits the async driver, so
+      no worker thread is held while MySQL is busy.
+
+    Either way the service code is the same: `await db.run(get_truck, truck_id)`.
+
+    Each `run` is one unit of work: the session is closed as soon as the
+    function returns, so the connection goes back to the pool before the
+    response is serialized instead of waiting for a free thread at teardown
+    (with 40 threads and a smaller pool, that wait can deadlock).
+    """
+
+    def __init__(self, session: Union[Session, AsyncSession], node: Optional[Node] = None):
+        self.session = session
+        self.node = node or primary
+
+    @property
+    def is_async(self) -> bool:
+        return isinstance(self.session, AsyncSession)
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        try:
+            return await self._run(fn, *args, **kwargs)
+        except OperationalError as exc:
+            if self.node is primary:
+                raise
+            # Reads are safe to retry: evict the replica and ask the primary.
+            self.node.mark(False, f"query failed: {exc.__class__.__name__}")
+            await self.close()
+            self.node = primary
+            self.session = primary.new_session()
+            return await self._run(fn, *args, **kwargs)
+
+    async def _run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        if self.is_async:
+            try:
+                return await self.session.run_sync(fn, *args, **kwargs)
+            finally:
+                await self.session.close()
+        return await run_in_threadpool(self._run_sync, fn, *args, **kwargs)
+
+    def _run_sync(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        try:
+            return fn(self.session, *args, **kwargs)
+        finally:
+            self.session.close()
+
+    async def stream(self, stmt: Select, chunk_size: int) -> AsyncIterator[Sequence[Any]]:
+        """
+        Yields result rows in partitions of `chunk_size` from a server-side
+        cursor (yield_per/stream_results), so memory stays flat however many
+        rows match. The connection is held until the iteration ends.
+        """
+        stmt = stmt.execution_options(yield_per=chunk_size)
+        if self.is_async:
+            result = await self.session.stream(stmt)
+            try:
+                async for partition in result.partitions():
+                    yield partition
+            finally:
+                await result.close()
+                await self.session.close()
+        else:
+            result = await run_in_threadpool(self.session.execute, stmt)
+            try:
+                async for partition in iterate_in_threadpool(result.partitions()):
+                    yield partition
+            finally:
+                await run_in_threadpool(self._close_result, result)
+
+    def _close_result(self, result: Any) -> None:
+        result.close()
+        self.session.close()
+
+    async def close(self) -> None:
+        # Normally a no-op: `run` already released the connection.
+        if self.is_async:
+            await self.session.close()
+        else:
+            self.session.close()
+
+
+def new_session(read_only: bool = False) -> DBSession:
+    """A session on the primary, or on a healthy replica for read_only work."""
+    node = (pick_replica() if read_only else None) or primary
+    return DBSession(node.new_session(), node)
+
+
+@asynccontextmanager
+async def open_db(read_only: bool = False):
+    db = new_session(read_only)
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        await db.close()
+
+
+async def get_db(request: Request):
+    async with open_db(read_only=use_replica(request)) as db:
+        yield db
+
+
+async def dispose_engines() -> None:
+    for node in (primary, *replicas):
+        await node.dispose()
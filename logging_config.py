@@ -1,9 +1,34 @@
+"""
+Logging for the "fem_api" logger hierarchy (use logging.getLogger("fem_api.<area>")).
+
+Records are only put on a bounded queue by the thread that logs them; a
+QueueListener thread formats them and writes them to stderr, so a slow stderr
+never blocks the event loop. When the queue is full new records are dropped
+and counted (log_records_dropped_total in /metrics).
+
+LOG_FORMAT=json writes one JSON object per line with the request_id and any
+`extra=` fields (method, route, status, duration_ms... for request logs).
+LOG_SUCCESS_SAMPLE_EVERY=N keeps 1 in N request_complete lines for
+successful responses; errors are always logged.
+"""
+import atexit
+import itertools
+import json
 import logging
+import queue
+import threading
+from datetime import datetime, timezone
 from logging import Logger
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
 
 from config import settings
-from request_context import get_request_id
+from utils.request_context import get_request_id
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s fem_api request_id=%(request_id)s %(message)s"
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`.
+_RECORD_ATTRS = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime", "request_id"}
 
 
 class RequestIdFilter(logging.Filter):
@@ -12,17 +37,80 @@ class RequestIdFilter(logging.Filter):
         return True
 
 
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "") or None,
+            "message": record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRS:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args and render the traceback here (they may not outlive the
+        # caller), but leave the formatting itself to the listener thread.
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # The queue may be full at shutdown; wait for the writer to make room.
+        try:
+            self.queue.put(self._sentinel, timeout=5)
+        except queue.Full:
+            pass
+
+
+_handler: Optional[_DroppingQueueHandler] = None
+_listener: Optional[_Listener] = None
+_success_counter = itertools.count()
+
+
 def setup_logging() -> Logger:
+    global _handler, _listener
     logger = logging.getLogger("fem_api")
     logger.setLevel(getattr(logging, settings.log_level.upper(), logging.INFO))
 
     # Avoid duplicate handlers on reload
-    if not logger.handlers:
-        handler = logging.StreamHandler()
-        fmt = "%(asctime)s %(levelname)s fem_api request_id=%(request_id)s %(message)s"
-        handler.setFormatter(logging.Formatter(fmt))
-        handler.addFilter(RequestIdFilter())
-        logger.addHandler(handler)
+    if _listener is None:
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max(settings.log_queue_size, 1))
+        _handler = _DroppingQueueHandler(log_queue)
+        _handler.addFilter(RequestIdFilter())
+        stream = logging.StreamHandler()
+        stream.setFormatter(JsonFormatter() if settings.log_format == "json" else logging.Formatter(TEXT_FORMAT))
+        _listener = _Listener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        logger.addHandler(_handler)
+        atexit.register(stop_logging)
 
     # Keep uvicorn logs reasonable
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
@@ -31,4 +119,23 @@ def setup_logging() -> Logger:
     return logger
 
 
-logger: Optional[Logger] = None
\ No newline at end of file
+def stop_logging() -> None:
+    """Writes out what is still queued and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        if _handler is not None:
+            logging.getLogger("fem_api").removeHandler(_handler)
+
+
+def log_success() -> bool:
+    """Whether this successful request's completion line is kept (1 in LOG_SUCCESS_SAMPLE_EVERY)."""
+    every = settings.log_success_sample_every
+    if every <= 1:
+        return every == 1  # 0 (or less) turns success lines off
+    return next(_success_counter) % every == 0
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
\ No newline at end of file
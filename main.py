@@ -1,25 +1,62 @@
+import asyncio
 import time
 import uuid
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 
 from config import settings
-from logging_config import setup_logging
-from request_context import request_id_var
-from routers.health import router as health_router
-from routers.drivers import router as drivers_router
-from routers.trucks import router as trucks_router
+from db import check_replicas, dispose_engines, mark_write, replica_health_loop, replicas
+from logging_config import log_success, setup_logging
+from utils.admission import AdmissionMiddleware
+from utils.coalesce import CoalescingMiddleware
+from utils.metrics import (
+    RequestStats,
+    StatementBudgetExceeded,
+    observe_request,
+    request_stats_var,
+    route_label,
+    server_timing,
+)
+from utils.slow_log import PROFILE_HEADER, finish_profile, record_request, request_threshold_seconds, start_profile
+from utils.request_context import request_id_var
+from routers.admin_router import router as admin_router
+from routers.changes_router import router as changes_router
+from routers.health_router import router as health_router
+from routers.metrics_router import router as metrics_router
+from routers.drivers_router import router as drivers_router
+from routers.trucks_router import router as trucks_router
 
 
 logger = setup_logging()
 
-app = FastAPI(title=settings.app_name)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    health_task = None
+    if replicas:
+        # First check before serving, so a dead replica never gets traffic.
+        await check_replicas()
+        health_task = asyncio.create_task(replica_health_loop())
+    yield
+    if health_task is not None:
+        health_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await health_task
+    await dispose_engines()
+
+
+app = FastAPI(title=settings.app_name, lifespan=lifespan)
+# Innermost of the middlewares below, so 503s are still logged, timed and counted.
+app.add_middleware(AdmissionMiddleware)
+# Outside admission: requests waiting on an identical one hold no slot.
+app.add_middleware(CoalescingMiddleware)
 
 
 # -------------------------
-# Middleware: Request IDs + timing + logging
+# Middleware: Request IDs + timing + logging + metrics + slow log + SQL budget
 # -------------------------
 @app.middleware("http")
 async def request_id_middleware(request: Request, call_next):
@@ -27,37 +64,88 @@ async def request_id_middleware(request: Request, call_next):
     req_id = incoming.strip() if incoming else str(uuid.uuid4())
 
     token = request_id_var.set(req_id)
+    stats = RequestStats(settings.sql_statement_budget)
+    stats_token = request_stats_var.set(stats)
+    profiler = start_profile(request.headers.get(PROFILE_HEADER))
     start = time.perf_counter()
 
     try:
         response = await call_next(request)
     except Exception as exc:
         # Let exception handlers format response; still log here
-        duration_ms = int((time.perf_counter() - start) * 1000)
+        elapsed = time.perf_counter() - start
+        if profiler is not None:
+            finish_profile(profiler, request.method, request.url.path, elapsed)
+        route = route_label(request)
+        observe_request(request.method, route, 500, elapsed, stats)
+        duration_ms = int(elapsed * 1000)
         logger.exception(
             "request_failed method=%s path=%s duration_ms=%s",
             request.method,
             request.url.path,
             duration_ms,
+            extra={"method": request.method, "path": request.url.path, "route": route, "status": 500, "duration_ms": duration_ms},
         )
+        request_stats_var.reset(stats_token)
         request_id_var.reset(token)
         raise exc
 
-    duration_ms = int((time.perf_counter() - start) * 1000)
+    elapsed = time.perf_counter() - start
+    if profiler is not None:
+        response.headers["X-Profile-Id"] = str(finish_profile(profiler, request.method, request.url.path, elapsed))
+    # Set by the router during call_next; looked up once for metrics, slow log and log line.
+    route = route_label(request)
+    observe_request(request.method, route, response.status_code, elapsed, stats)
+    if elapsed >= request_threshold_seconds():
+        record_request(
+            request.method, request.url.path, route, response.status_code,
+            elapsed, stats.statements, stats.db_seconds,
+        )
+    if stats.over_budget:
+        logger.warning(
+            "statement_budget_exceeded method=%s route=%s statements=%s budget=%s",
+            request.method,
+            route,
+            stats.statements,
+            stats.budget,
+        )
+    duration_ms = int(elapsed * 1000)
     response.headers["X-Request-ID"] = req_id
+    if settings.server_timing_enabled:
+        response.headers["Server-Timing"] = server_timing(stats, elapsed)
 
-    logger.info(
-        "request_complete method=%s path=%s status=%s duration_ms=%s",
-        request.method,
-        request.url.path,
-        response.status_code,
-        duration_ms,
-    )
+    if response.status_code >= 400 or log_success():
+        logger.info(
+            "request_complete method=%s path=%s status=%s duration_ms=%s",
+            request.method,
+            request.url.path,
+            response.status_code,
+            duration_ms,
+            extra={
+                "method": request.method,
+                "path": request.url.path,
+                "route": route,
+                "status": response.status_code,
+                "duration_ms": duration_ms,
+                "db_statements": stats.statements,
+            },
+        )
 
+    request_stats_var.reset(stats_token)
     request_id_var.reset(token)
     return response
 
 
+# -------------------------
+# Middleware: read-your-writes stamp (see db.use_replica)
+# -------------------------
+@app.middleware("http")
+async def read_your_writes_middleware(request: Request, call_next):
+    response = await call_next(request)
+    mark_write(request, response)
+    return response
+
+
 # -------------------------
 # Error handlers: include request_id in body + header
 # -------------------------
@@ -78,6 +166,22 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
+@app.exception_handler(StatementBudgetExceeded)
+async def statement_budget_exception_handler(request: Request, exc: StatementBudgetExceeded):
+    req_id = request.headers.get("x-request-id") or request_id_var.get() or ""
+    return JSONResponse(
+        status_code=500,
+        content={
+            "request_id": req_id,
+            "error": {
+                "code": "statement_budget_exceeded",
+                "message": str(exc),
+            },
+        },
+        headers={"X-Request-ID": req_id},
+    )
+
+
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception):
     req_id = request.headers.get("x-request-id") or request_id_var.get() or ""
@@ -98,5 +202,8 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
 # Routers
 # -------------------------
 app.include_router(health_router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
 app.include_router(drivers_router)
-app.include_router(trucks_router)
\ No newline at end of file
+app.include_router(trucks_router)
+app.include_router(changes_router)
\ No newline at end of file
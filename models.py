@@ -1,38 +1,144 @@
-from sqlalchemy import String, Boolean, DateTime, func
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, String, Boolean, DateTime, ForeignKey, Index, Integer, func, literal_column
 from sqlalchemy.orm import Mapped, mapped_column
 
 from db import Base
 
 
+def utcnow() -> datetime:
+    """App-side equivalent of the server's NOW() (naive UTC, second precision)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def _created_at(context) -> datetime:
+    """INSERT default for updated_at: the row's created_at, so both match like NOW() did."""
+    return context.get_current_parameters().get("created_at") or utcnow()
+
+
 class Driver(Base):
     __tablename__ = "drivers"
 
-    driver_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, index=True)
+    driver_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     driver_name: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False, index=True)
 
-    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Set app-side so writes know the values without reading the row back;
+    # the server defaults remain for rows inserted outside the ORM.
+    created_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), default=utcnow, server_default=func.now(), nullable=False, index=True
+    )
     updated_at: Mapped[str] = mapped_column(
         DateTime(timezone=True),
+        default=_created_at,
         server_default=func.now(),
-        onupdate=func.now(),
+        onupdate=utcnow,
         nullable=False,
     )
+    # Row version for the ETags (utils/conditional): + 1 in SQL on every UPDATE,
+    # as two writes within one second share an updated_at.
+    version: Mapped[int] = mapped_column(
+        Integer, default=1, server_default="1", onupdate=literal_column("version") + 1, nullable=False
+    )
+
+    # Composite indexes for the list queries (python -m benchmarks.index_advisor): the
+    # equality filter, then the sort key. Delta sync (updated_since=) walks the
+    # updated_at range in (updated_at, driver_id) order.
+    __table_args__ = (
+        Index("ix_drivers_is_active_driver_name", "is_active", "driver_name"),
+        Index("ix_drivers_is_active_created_at", "is_active", "created_at"),
+        Index("ix_drivers_is_active_updated_at", "is_active", "updated_at"),
+        Index("ix_drivers_updated_at_driver_id", "updated_at", "driver_id"),
+    )
 
 
 class Truck(Base):
     __tablename__ = "trucks"
 
-    truck_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True, index=True)
+    truck_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     unit_number: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
     plate_number: Mapped[str] = mapped_column(String(32), nullable=True, index=True)
     vin: Mapped[str] = mapped_column(String(32), nullable=True, index=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False, index=True)
+    # Assigned driver, if any. The foreign key rejects unknown drivers without a lookup query.
+    driver_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("drivers.driver_id", name="fk_trucks_driver_id_drivers", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+    )
 
-    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Set app-side so writes know the values without reading the row back;
+    # the server defaults remain for rows inserted outside the ORM.
+    created_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), default=utcnow, server_default=func.now(), nullable=False, index=True
+    )
     updated_at: Mapped[str] = mapped_column(
         DateTime(timezone=True),
+        default=_created_at,
         server_default=func.now(),
-        onupdate=func.now(),
+        onupdate=utcnow,
         nullable=False,
-    )
\ No newline at end of file
+    )
+    # Row version for the ETags (utils/conditional): + 1 in SQL on every UPDATE,
+    # as two writes within one second share an updated_at.
+    version: Mapped[int] = mapped_column(
+        Integer, default=1, server_default="1", onupdate=literal_column("version") + 1, nullable=False
+    )
+
+    # Composite indexes for the list queries (python -m benchmarks.index_advisor): the
+    # equality filter, then the sort key. Delta sync (updated_since=) walks the
+    # updated_at range in (updated_at, truck_id) order.
+    __table_args__ = (
+        Index("ix_trucks_is_active_unit_number", "is_active", "unit_number"),
+        Index("ix_trucks_is_active_created_at", "is_active", "created_at"),
+        Index("ix_trucks_is_active_updated_at", "is_active", "updated_at"),
+        Index("ix_trucks_updated_at_truck_id", "updated_at", "truck_id"),
+    )
+
+
+class SearchTrigram(Base):
+    """
+    Trigram index behind the *_contains filters and q= search.
+    Maintained by services/search_index.py in the same transaction as the write.
+    """
+
+    __tablename__ = "search_trigrams"
+
+    entity: Mapped[str] = mapped_column(String(16), primary_key=True)
+    field: Mapped[str] = mapped_column(String(32), primary_key=True)
+    # Binary collation on MySQL: grams are compared exactly (already folded, see search_index.fold).
+    gram: Mapped[str] = mapped_column(String(3).with_variant(String(3, collation="utf8mb4_bin"), "mysql"), primary_key=True)
+    entity_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+
+    __table_args__ = (Index("ix_search_trigrams_entity_id", "entity", "entity_id"),)
+
+
+class ReplicationHeartbeat(Base):
+    """
+    One row the app rewrites on the primary every health-check interval; its
+    age as read on a replica is that replica's lag (see db.check_replicas).
+    """
+
+    __tablename__ = "replication_heartbeat"
+
+    heartbeat_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    # Milliseconds since the epoch (DATETIME has second precision on MySQL)
+    beat_ms: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+
+class ChangeEvent(Base):
+    """
+    Outbox of writes to trucks and drivers, appended by the services in the
+    same transaction as the write; the change feed (services/change_feed.py)
+    reads it in event_id order.
+    """
+
+    __tablename__ = "change_events"
+
+    event_id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    entity: Mapped[str] = mapped_column(String(16), nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    # "created", "updated" or "deactivated"
+    op: Mapped[str] = mapped_column(String(16), nullable=False)
+    changed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False, index=True)
\ No newline at end of file
@@ -0,0 +1,53 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from config import settings
+from utils.slow_log import profiles, slow_queries, slow_requests
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    # Without ADMIN_TOKEN configured the admin endpoints do not exist.
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/slow-queries")
+async def list_slow_queries(limit: int = Query(50, ge=1, le=1000)):
+    return {"items": slow_queries.list(limit)}
+
+
+@router.delete("/slow-queries", status_code=204)
+async def clear_slow_queries():
+    slow_queries.clear()
+
+
+@router.get("/slow-requests")
+async def list_slow_requests(limit: int = Query(50, ge=1, le=1000)):
+    return {"items": slow_requests.list(limit)}
+
+
+@router.delete("/slow-requests", status_code=204)
+async def clear_slow_requests():
+    slow_requests.clear()
+
+
+@router.get("/profiles")
+async def list_profiles(limit: int = Query(20, ge=1, le=100)):
+    # Summaries only; the stats text is served per profile.
+    return {"items": [{k: v for k, v in entry.items() if k != "stats"} for entry in profiles.list(limit)]}
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: int):
+    entry = profiles.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return entry["stats"]
\ No newline at end of file
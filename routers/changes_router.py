@@ -0,0 +1,107 @@
+from typing import Any, AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+
+from config import settings
+from db import DBSession, get_db, open_db
+from schemas import ChangeListResponse
+from services.change_feed import READ_BATCH, change_feed, read_changes
+from utils.serialization import dumps
+
+router = APIRouter(prefix="/changes", tags=["Changes"])
+
+ENTITY_PATTERN = "^(trucks|drivers)$"
+
+
+@router.get("", response_model=ChangeListResponse)
+async def list_changes_endpoint(
+    after: int = Query(0, ge=0, description="Last event_id already processed (meta.next_after of the previous call)"),
+    limit: int = Query(100, ge=1, le=1000),
+    entity: Optional[str] = Query(None, pattern=ENTITY_PATTERN),
+    db: DBSession = Depends(get_db),
+):
+    batch = await db.run(read_changes, after, limit, entity)
+    return {
+        "meta": {"after": after, "next_after": batch.next_after, "has_more": batch.has_more},
+        "items": batch.events,
+    }
+
+
+def _sse(event: Any) -> bytes:
+    data = dumps(
+        {
+            "event_id": event.event_id,
+            "entity": event.entity,
+            "entity_id": event.entity_id,
+            "op": event.op,
+            "changed_at": event.changed_at,
+        }
+    )
+    return b"id: %d\nevent: change\ndata: %s\n\n" % (event.event_id, data)
+
+
+async def _event_stream(request: Request, after: Optional[int], entity: Optional[str]) -> AsyncIterator[bytes]:
+    # Events from the shared reader may overlap the backfill from the outbox
+    # (or, when the client was far behind, start past it): `position` dedupes.
+    position = after
+
+    async def backfill() -> AsyncIterator[bytes]:
+        nonlocal position
+        while True:
+            async with open_db() as db:
+                batch = await db.run(read_changes, position, READ_BATCH, entity)
+            for event in batch.events:
+                yield _sse(event)
+            position = batch.next_after
+            if not batch.has_more:
+                return
+
+    async with change_feed.subscribe() as subscriber:
+        yield b"retry: 3000\n\n"
+        if position is not None:
+            async for chunk in backfill():
+                yield chunk
+
+        while True:
+            events = await subscriber.next(settings.change_feed_heartbeat_seconds)
+            if not events and subscriber.missed_from is None:
+                if await request.is_disconnected():
+                    break
+                yield b": keepalive\n\n"
+                continue
+            if events and position is not None and events[0].event_id > position + 1:
+                async for chunk in backfill():
+                    yield chunk
+            for event in events:
+                if position is not None and event.event_id <= position:
+                    continue
+                position = event.event_id
+                if entity is None or event.entity == entity:
+                    yield _sse(event)
+            if subscriber.missed_from is not None:
+                # This client fell behind the shared reader: read what it missed from the outbox.
+                if position is None:
+                    position = subscriber.missed_from - 1
+                subscriber.missed_from = None
+                async for chunk in backfill():
+                    yield chunk
+
+
+@router.get("/stream")
+async def change_stream_endpoint(
+    request: Request,
+    after: Optional[int] = Query(None, ge=0, description="Start after this event_id (default: new events, plus the last few seconds' that may still be followed by a late commit)"),
+    entity: Optional[str] = Query(None, pattern=ENTITY_PATTERN),
+    last_event_id: Optional[int] = Header(None, ge=0, description="Sent by EventSource on reconnect; wins over after="),
+):
+    """
+    Server-Sent Events, one `change` event per write (same fields as GET /changes items).
+    All streams share one outbox reader; comment lines keep idle connections open.
+    """
+    start = last_event_id if last_event_id is not None else after
+    return StreamingResponse(
+        _event_stream(request, start, entity),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
\ No newline at end of file
@@ -1,59 +1,284 @@
-from typing import Optional
+from datetime import datetime
+from typing import Optional, Union
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Request, Response
 
-from db import get_db
-from schemas import DriverCreate, DriverUpdate, DriverOut, DriverListResponse, PaginationMeta
+from config import settings
+from db import DBSession, get_db, use_replica
+from models import Driver
+from schemas import (
+    BulkDeactivate,
+    LookupRequest,
+    DriverBulkRequest,
+    DriverBulkResponse,
+    DriverBulkUpdateItem,
+    DriverCreate,
+    DriverUpdate,
+    DriverOut,
+    DriverListResponse,
+    DriverLookupResponse,
+    TruckListResponse,
+    TruckOut,
+    PaginationMeta,
+)
 from services.drivers_service import (
+    bulk_create_drivers,
+    bulk_update_drivers,
+    bulk_deactivate_drivers,
     create_driver,
+    DRIVER_FIELDS,
     get_driver,
+    get_drivers_by_ids,
+    get_driver_fields,
+    get_driver_version,
     update_driver,
     deactivate_driver,
     list_drivers,
+    sync_drivers,
+    export_drivers_query,
+)
+from services.trucks_service import TRUCK_FIELDS, list_driver_trucks
+from utils.bulk import check_bulk_size, summarize, validate_items
+from utils.conditional import (
+    cached_list_response,
+    entity_response,
+    is_conditional,
+    list_validators,
+    not_modified,
+    not_modified_response,
+    projected_entity_response,
+    store_list_page,
 )
+from utils.cache import list_cache
+from utils.count_cache import normalize_filters
+from utils.export import export_response
+from utils.lookup import lookup_response, parse_ids
+from utils.metrics import timed_serialization
+from utils.query import check_delta_params, parse_fields, reject_combined
+from utils.serialization import list_body, split_tombstones
 
 router = APIRouter(prefix="/drivers", tags=["Drivers"])
 
 
 @router.post("", response_model=DriverOut, status_code=201)
-def create_driver_endpoint(payload: DriverCreate, db: Session = Depends(get_db)):
-    return create_driver(db, payload.driver_name)
+async def create_driver_endpoint(payload: DriverCreate, db: DBSession = Depends(get_db)):
+    return await db.run(create_driver, payload.driver_name)
+
+
+# Collection-level routes (/export, /bulk, /lookup) are declared before /{driver_id} so they are not parsed as an id.
+@router.get("/export")
+async def export_drivers_endpoint(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    sort: Optional[str] = Query(None, description="Same as the list endpoint"),
+    driver_name_contains: Optional[str] = Query(None),
+    is_active: Optional[bool] = Query(None),
+):
+    stmt = export_drivers_query(
+        sort=sort,
+        driver_name_contains=driver_name_contains,
+        is_active=is_active,
+    )
+    return export_response(stmt, format, "drivers", read_only=use_replica(request))
+
+
+@router.post("/bulk", response_model=DriverBulkResponse)
+async def bulk_create_drivers_endpoint(
+    payload: DriverBulkRequest,
+    batch_size: Optional[int] = Query(None, ge=1, le=5000, description="Rows per INSERT batch (default from settings)"),
+    db: DBSession = Depends(get_db),
+):
+    check_bulk_size(len(payload.items))
+    valid, invalid = validate_items(payload.items, DriverCreate)
+    outcomes = await db.run(bulk_create_drivers, valid, batch_size or settings.bulk_batch_size) if valid else []
+    return summarize(invalid + outcomes)
+
+
+@router.patch("/bulk", response_model=DriverBulkResponse)
+async def bulk_update_drivers_endpoint(
+    payload: DriverBulkRequest,
+    batch_size: Optional[int] = Query(None, ge=1, le=5000, description="Rows per UPDATE batch (default from settings)"),
+    db: DBSession = Depends(get_db),
+):
+    check_bulk_size(len(payload.items))
+    valid, invalid = validate_items(payload.items, DriverBulkUpdateItem)
+    outcomes = await db.run(bulk_update_drivers, valid, batch_size or settings.bulk_batch_size) if valid else []
+    return summarize(invalid + outcomes)
+
+
+@router.post("/bulk/deactivate", response_model=DriverBulkResponse)
+async def bulk_deactivate_drivers_endpoint(
+    payload: BulkDeactivate,
+    batch_size: Optional[int] = Query(None, ge=1, le=5000, description="Rows per UPDATE batch (default from settings)"),
+    db: DBSession = Depends(get_db),
+):
+    check_bulk_size(len(payload.ids))
+    return summarize(await db.run(bulk_deactivate_drivers, payload.ids, batch_size or settings.bulk_batch_size))
+
+
+@router.post("/lookup", response_model=DriverLookupResponse)
+async def lookup_drivers_endpoint(payload: LookupRequest, db: DBSession = Depends(get_db)):
+    """Same as GET /drivers?ids=, for id lists too long for a URL."""
+    return await lookup_response(db, Driver.__tablename__, payload.ids, get_drivers_by_ids, DriverOut, "driver_id")
 
 
 @router.get("/{driver_id}", response_model=DriverOut)
-def get_driver_endpoint(driver_id: int, db: Session = Depends(get_db)):
-    return get_driver(db, driver_id)
+async def get_driver_endpoint(
+    driver_id: int,
+    request: Request,
+    db: DBSession = Depends(get_db),
+    fields: Optional[str] = Query(None, description="Comma-separated DriverOut fields to return (default: all). Example: driver_id,driver_name"),
+):
+    selected = parse_fields(fields, DRIVER_FIELDS)
+    if selected:
+        return await projected_entity_response(request, db, Driver.__tablename__, driver_id, selected, load=get_driver_fields)
+    return await entity_response(
+        request, db, Driver.__tablename__, driver_id, load=get_driver, probe=get_driver_version, schema=DriverOut
+    )
+
+
+@router.get("/{driver_id}/trucks", response_model=TruckListResponse)
+async def list_driver_trucks_endpoint(
+    driver_id: int,
+    request: Request,
+    db: DBSession = Depends(get_db),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(25, ge=1, le=100),
+    sort: Optional[str] = Query(None, description="Same as GET /trucks"),
+    pagination: str = Query("offset", pattern="^(offset|cursor)$", description="offset (page/page_size) or cursor (keyset)"),
+    cursor: Optional[str] = Query(None, description="Opaque meta.next_cursor/prev_cursor from a previous response. Implies pagination=cursor."),
+    total: Optional[str] = Query(None, pattern="^(exact|estimate|none)$", description="How to compute meta.total. Default: exact (offset), none (cursor)"),
+    fields: Optional[str] = Query(None, description="Comma-separated TruckOut fields to return (default: all)"),
+):
+    keyset = pagination == "cursor" or bool(cursor)
+    selected = parse_fields(fields, TRUCK_FIELDS)
+    result = await db.run(
+        list_driver_trucks,
+        driver_id,
+        page=page,
+        page_size=page_size,
+        sort=sort,
+        cursor=cursor,
+        keyset=keyset,
+        total=total,
+        fields=selected,
+    )
+    headers = list_validators(result, "truck_id")
+    if not_modified(request, headers):
+        return not_modified_response(headers)
+
+    meta = PaginationMeta(
+        page=None if keyset else page,
+        page_size=page_size,
+        total=result.total,
+        total_pages=result.total_pages,
+        total_exact=result.total_exact,
+        sort=sort,
+        next_cursor=result.next_cursor,
+        prev_cursor=result.prev_cursor,
+    )
+    with timed_serialization():
+        body = list_body(meta, result.items, TruckOut, selected)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.patch("/{driver_id}", response_model=DriverOut)
-def update_driver_endpoint(driver_id: int, payload: DriverUpdate, db: Session = Depends(get_db)):
-    return update_driver(db, driver_id, payload.driver_name, payload.is_active)
+async def update_driver_endpoint(driver_id: int, payload: DriverUpdate, db: DBSession = Depends(get_db)):
+    return await db.run(update_driver, driver_id, payload.driver_name, payload.is_active)
 
 
 @router.delete("/{driver_id}", response_model=DriverOut)
-def deactivate_driver_endpoint(driver_id: int, db: Session = Depends(get_db)):
-    return deactivate_driver(db, driver_id)
+async def deactivate_driver_endpoint(driver_id: int, db: DBSession = Depends(get_db)):
+    return await db.run(deactivate_driver, driver_id)
 
 
-@router.get("", response_model=DriverListResponse)
-def list_drivers_endpoint(
-    db: Session = Depends(get_db),
+@router.get("", response_model=Union[DriverListResponse, DriverLookupResponse])
+async def list_drivers_endpoint(
+    request: Request,
+    db: DBSession = Depends(get_db),
     page: int = Query(1, ge=1),
     page_size: int = Query(25, ge=1, le=100),
     sort: Optional[str] = Query(None, description="Comma-separated fields. Use -field for desc. Example: driver_name,-created_at"),
     driver_name_contains: Optional[str] = Query(None),
     is_active: Optional[bool] = Query(None),
+    pagination: str = Query("offset", pattern="^(offset|cursor)$", description="offset (page/page_size) or cursor (keyset)"),
+    cursor: Optional[str] = Query(None, description="Opaque meta.next_cursor/prev_cursor from a previous response. Implies pagination=cursor."),
+    total: Optional[str] = Query(None, pattern="^(exact|estimate|none)$", description="How to compute meta.total. Default: exact (offset), none (cursor)"),
+    fields: Optional[str] = Query(None, description="Comma-separated DriverOut fields to return (default: all). Example: driver_id,driver_name"),
+    ids: Optional[str] = Query(None, description="Comma-separated driver ids: returns those drivers in this order (DriverLookupResponse, with meta.missing) instead of a page"),
+    updated_since: Optional[datetime] = Query(None, description="Delta sync: only rows changed at or after this time (ISO 8601), in (updated_at, id) order, deactivated ones as tombstones. Follow meta.next_cursor (same updated_since); the last page's meta.high_water_mark is the next updated_since."),
 ):
-    items, total, total_pages = list_drivers(
-        db=db,
+    keyset = pagination == "cursor" or bool(cursor)
+    selected = parse_fields(fields, DRIVER_FIELDS)
+    lookup_ids = parse_ids(ids)
+    if lookup_ids is not None:
+        reject_combined(
+            "ids",
+            sort=sort,
+            driver_name_contains=driver_name_contains,
+            is_active=is_active,
+            cursor=cursor,
+            total=total,
+            fields=fields,
+            updated_since=updated_since,
+        )
+        return await lookup_response(db, Driver.__tablename__, lookup_ids, get_drivers_by_ids, DriverOut, "driver_id")
+
+    since = check_delta_params(
+        updated_since, sort=sort, driver_name_contains=driver_name_contains, is_active=is_active, total=total
+    )
+    if since is not None:
+        result = await db.run(sync_drivers, since, page_size, cursor, selected)
+        live, tombstones = split_tombstones(result.items, "driver_id")
+        meta = PaginationMeta(
+            page=None,
+            page_size=page_size,
+            total=None,
+            total_pages=None,
+            sort="updated_at,driver_id",
+            next_cursor=result.next_cursor,
+            high_water_mark=result.high_water_mark,
+        )
+        with timed_serialization():
+            body = list_body(meta, live, DriverOut, selected, tombstones=tombstones)
+        return Response(content=body, media_type="application/json")
+
+    params = dict(
         page=page,
         page_size=page_size,
         sort=sort,
         driver_name_contains=driver_name_contains,
         is_active=is_active,
+        cursor=cursor,
+        keyset=keyset,
+        total=total,
+    )
+    tables = (Driver.__tablename__,)
+    cache_key = list_cache.key(tables, normalize_filters(dict(params, fields=selected)))
+    cached = list_cache.get(cache_key)
+    if cached is not None:
+        return cached_list_response(request, cached)
+
+    if is_conditional(request):
+        # Check the page's row versions before loading and serializing the rows.
+        headers = list_validators(await db.run(list_drivers, **params, probe=True), "driver_id")
+        if not_modified(request, headers):
+            return not_modified_response(headers)
+
+    result = await db.run(list_drivers, **params, fields=selected)
+    meta = PaginationMeta(
+        page=None if keyset else page,
+        page_size=page_size,
+        total=result.total,
+        total_pages=result.total_pages,
+        total_exact=result.total_exact,
+        sort=sort,
+        next_cursor=result.next_cursor,
+        prev_cursor=result.prev_cursor,
     )
-    return DriverListResponse(
-        meta=PaginationMeta(page=page, page_size=page_size, total=total, total_pages=total_pages, sort=sort),
-        items=items,
-    )
\ No newline at end of file
+    # Rows go straight to JSON; response_model stays for the OpenAPI schema.
+    with timed_serialization():
+        body = list_body(meta, result.items, DriverOut, selected)
+    headers = list_validators(result, "driver_id")
+    store_list_page(db, cache_key, tables, body, headers)
+    return Response(content=body, media_type="application/json", headers=headers)
\ No newline at end of file
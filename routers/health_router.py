@@ -1,18 +1,34 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter
 from sqlalchemy import text
-from sqlalchemy.orm import Session
 
-from db import get_db
+from db import open_db, replicas
+from utils.admission import admission_stats
+from utils.cache import entity_cache, list_cache
+from utils.coalesce import coalesce_stats
 
 router = APIRouter(tags=["Health"])
 
 
 @router.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
 @router.get("/db-health")
-def db_health(db: Session = Depends(get_db)):
-    db.execute(text("SELECT 1"))
-    return {"status": "ok"}
\ No newline at end of file
+async def db_health():
+    # Always the primary; replicas report the state of their last health check.
+    async with open_db() as db:
+        await db.run(lambda session: session.execute(text("SELECT 1")))
+    return {"status": "ok", "replicas": [node.status() for node in replicas]}
+
+
+@router.get("/cache-stats")
+async def cache_stats():
+    return {"entity_cache": entity_cache.stats(), "list_cache": list_cache.stats()}
+
+
+@router.get("/admission")
+async def admission():
+    # Limits next to the pool settings they are derived from, and the GETs
+    # that were answered by an identical one in flight instead of being admitted
+    return {**admission_stats(), "coalesce": coalesce_stats()}
\ No newline at end of file
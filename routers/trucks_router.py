@@ -1,44 +1,172 @@
-from typing import Optional
+from datetime import datetime
+from typing import Optional, Union
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Request, Response
 
-from db import get_db
-from schemas import TruckCreate, TruckUpdate, TruckOut, TruckListResponse, PaginationMeta
+from config import settings
+from db import DBSession, get_db, use_replica
+from models import Driver, Truck
+from schemas import (
+    BulkDeactivate,
+    LookupRequest,
+    TruckBulkRequest,
+    TruckBulkResponse,
+    TruckBulkUpdateItem,
+    TruckCreate,
+    TruckUpdate,
+    TruckOut,
+    TruckListResponse,
+    TruckLookupResponse,
+    DriverOut,
+    PaginationMeta,
+)
 from services.trucks_service import (
+    bulk_create_trucks,
+    bulk_update_trucks,
+    bulk_deactivate_trucks,
     create_truck,
+    TRUCK_FIELDS,
     get_truck,
+    get_trucks_by_ids,
+    get_truck_fields,
+    get_truck_version,
     update_truck,
     deactivate_truck,
+    unassign_truck_driver,
     list_trucks,
+    sync_trucks,
+    export_trucks_query,
+)
+from utils.bulk import check_bulk_size, summarize, validate_items
+from utils.conditional import (
+    cached_list_response,
+    entity_response,
+    is_conditional,
+    list_validators,
+    not_modified,
+    not_modified_response,
+    projected_entity_response,
+    store_list_page,
 )
+from utils.cache import list_cache
+from utils.count_cache import normalize_filters
+from utils.export import export_response
+from utils.lookup import lookup_response, parse_ids
+from utils.metrics import timed_serialization
+from utils.query import check_delta_params, parse_fields, reject_combined
+from utils.serialization import embed_related, list_body, split_tombstones
 
 router = APIRouter(prefix="/trucks", tags=["Trucks"])
 
 
 @router.post("", response_model=TruckOut, status_code=201)
-def create_truck_endpoint(payload: TruckCreate, db: Session = Depends(get_db)):
-    return create_truck(db, payload.unit_number, payload.plate_number, payload.vin, bool(payload.is_active))
+async def create_truck_endpoint(payload: TruckCreate, db: DBSession = Depends(get_db)):
+    return await db.run(
+        create_truck, payload.unit_number, payload.plate_number, payload.vin, bool(payload.is_active), payload.driver_id
+    )
+
+
+# Collection-level routes (/export, /bulk, /lookup) are declared before /{truck_id} so they are not parsed as an id.
+@router.get("/export")
+async def export_trucks_endpoint(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    sort: Optional[str] = Query(None, description="Same as the list endpoint"),
+    unit_number_contains: Optional[str] = Query(None),
+    plate_number_contains: Optional[str] = Query(None),
+    vin_contains: Optional[str] = Query(None),
+    is_active: Optional[bool] = Query(None),
+    q: Optional[str] = Query(None, description="Substring search across unit_number, plate_number and vin"),
+    driver_id: Optional[int] = Query(None),
+):
+    stmt = export_trucks_query(
+        sort=sort,
+        unit_number_contains=unit_number_contains,
+        plate_number_contains=plate_number_contains,
+        vin_contains=vin_contains,
+        is_active=is_active,
+        search=q,
+        driver_id=driver_id,
+    )
+    return export_response(stmt, format, "trucks", read_only=use_replica(request))
+
+
+@router.post("/bulk", response_model=TruckBulkResponse)
+async def bulk_create_trucks_endpoint(
+    payload: TruckBulkRequest,
+    batch_size: Optional[int] = Query(None, ge=1, le=5000, description="Rows per INSERT batch (default from settings)"),
+    db: DBSession = Depends(get_db),
+):
+    check_bulk_size(len(payload.items))
+    valid, invalid = validate_items(payload.items, TruckCreate)
+    outcomes = await db.run(bulk_create_trucks, valid, batch_size or settings.bulk_batch_size) if valid else []
+    return summarize(invalid + outcomes)
+
+
+@router.patch("/bulk", response_model=TruckBulkResponse)
+async def bulk_update_trucks_endpoint(
+    payload: TruckBulkRequest,
+    batch_size: Optional[int] = Query(None, ge=1, le=5000, description="Rows per UPDATE batch (default from settings)"),
+    db: DBSession = Depends(get_db),
+):
+    check_bulk_size(len(payload.items))
+    valid, invalid = validate_items(payload.items, TruckBulkUpdateItem)
+    outcomes = await db.run(bulk_update_trucks, valid, batch_size or settings.bulk_batch_size) if valid else []
+    return summarize(invalid + outcomes)
+
+
+@router.post("/bulk/deactivate", response_model=TruckBulkResponse)
+async def bulk_deactivate_trucks_endpoint(
+    payload: BulkDeactivate,
+    batch_size: Optional[int] = Query(None, ge=1, le=5000, description="Rows per UPDATE batch (default from settings)"),
+    db: DBSession = Depends(get_db),
+):
+    check_bulk_size(len(payload.ids))
+    return summarize(await db.run(bulk_deactivate_trucks, payload.ids, batch_size or settings.bulk_batch_size))
+
+
+@router.post("/lookup", response_model=TruckLookupResponse)
+async def lookup_trucks_endpoint(payload: LookupRequest, db: DBSession = Depends(get_db)):
+    """Same as GET /trucks?ids=, for id lists too long for a URL."""
+    return await lookup_response(db, Truck.__tablename__, payload.ids, get_trucks_by_ids, TruckOut, "truck_id")
 
 
 @router.get("/{truck_id}", response_model=TruckOut)
-def get_truck_endpoint(truck_id: int, db: Session = Depends(get_db)):
-    return get_truck(db, truck_id)
+async def get_truck_endpoint(
+    truck_id: int,
+    request: Request,
+    db: DBSession = Depends(get_db),
+    fields: Optional[str] = Query(None, description="Comma-separated TruckOut fields to return (default: all). Example: truck_id,unit_number,is_active"),
+):
+    selected = parse_fields(fields, TRUCK_FIELDS)
+    if selected:
+        return await projected_entity_response(request, db, Truck.__tablename__, truck_id, selected, load=get_truck_fields)
+    return await entity_response(
+        request, db, Truck.__tablename__, truck_id, load=get_truck, probe=get_truck_version, schema=TruckOut
+    )
 
 
 @router.patch("/{truck_id}", response_model=TruckOut)
-def update_truck_endpoint(truck_id: int, payload: TruckUpdate, db: Session = Depends(get_db)):
-    return update_truck(db, truck_id, payload.unit_number, payload.plate_number, payload.vin, payload.is_active)
+async def update_truck_endpoint(truck_id: int, payload: TruckUpdate, db: DBSession = Depends(get_db)):
+    return await db.run(
+        update_truck, truck_id, payload.unit_number, payload.plate_number, payload.vin, payload.is_active, payload.driver_id
+    )
 
 
 @router.delete("/{truck_id}", response_model=TruckOut)
-def deactivate_truck_endpoint(truck_id: int, db: Session = Depends(get_db)):
-    return deactivate_truck(db, truck_id)
+async def deactivate_truck_endpoint(truck_id: int, db: DBSession = Depends(get_db)):
+    return await db.run(deactivate_truck, truck_id)
+
+
+@router.delete("/{truck_id}/driver", response_model=TruckOut)
+async def unassign_truck_driver_endpoint(truck_id: int, db: DBSession = Depends(get_db)):
+    return await db.run(unassign_truck_driver, truck_id)
 
 
-@router.get("", response_model=TruckListResponse)
-def list_trucks_endpoint(
-    db: Session = Depends(get_db),
+@router.get("", response_model=Union[TruckListResponse, TruckLookupResponse])
+async def list_trucks_endpoint(
+    request: Request,
+    db: DBSession = Depends(get_db),
     page: int = Query(1, ge=1),
     page_size: int = Query(25, ge=1, le=100),
     sort: Optional[str] = Query(None, description="Comma-separated fields. Use -field for desc. Example: unit_number,-created_at"),
@@ -46,9 +174,67 @@ def list_trucks_endpoint(
     plate_number_contains: Optional[str] = Query(None),
     vin_contains: Optional[str] = Query(None),
     is_active: Optional[bool] = Query(None),
+    q: Optional[str] = Query(None, description="Substring search across unit_number, plate_number and vin"),
+    driver_id: Optional[int] = Query(None, description="Only trucks assigned to this driver"),
+    pagination: str = Query("offset", pattern="^(offset|cursor)$", description="offset (page/page_size) or cursor (keyset)"),
+    cursor: Optional[str] = Query(None, description="Opaque meta.next_cursor/prev_cursor from a previous response. Implies pagination=cursor."),
+    total: Optional[str] = Query(None, pattern="^(exact|estimate|none)$", description="How to compute meta.total. Default: exact (offset), none (cursor)"),
+    fields: Optional[str] = Query(None, description="Comma-separated TruckOut fields to return (default: all). Example: truck_id,unit_number,is_active"),
+    expand: Optional[str] = Query(None, pattern="^driver$", description="driver: embed each truck's driver (loaded in one batch per page)"),
+    ids: Optional[str] = Query(None, description="Comma-separated truck ids: returns those trucks in this order (TruckLookupResponse, with meta.missing) instead of a page"),
+    updated_since: Optional[datetime] = Query(None, description="Delta sync: only rows changed at or after this time (ISO 8601), in (updated_at, id) order, deactivated ones as tombstones. Follow meta.next_cursor (same updated_since); the last page's meta.high_water_mark is the next updated_since."),
 ):
-    items, total, total_pages = list_trucks(
-        db=db,
+    keyset = pagination == "cursor" or bool(cursor)
+    expand_driver = expand == "driver"
+    selected = parse_fields(fields, TRUCK_FIELDS)
+    lookup_ids = parse_ids(ids)
+    if lookup_ids is not None:
+        reject_combined(
+            "ids",
+            sort=sort,
+            unit_number_contains=unit_number_contains,
+            plate_number_contains=plate_number_contains,
+            vin_contains=vin_contains,
+            is_active=is_active,
+            q=q,
+            driver_id=driver_id,
+            cursor=cursor,
+            total=total,
+            fields=fields,
+            expand=expand,
+            updated_since=updated_since,
+        )
+        return await lookup_response(db, Truck.__tablename__, lookup_ids, get_trucks_by_ids, TruckOut, "truck_id")
+
+    since = check_delta_params(
+        updated_since,
+        sort=sort,
+        unit_number_contains=unit_number_contains,
+        plate_number_contains=plate_number_contains,
+        vin_contains=vin_contains,
+        is_active=is_active,
+        q=q,
+        driver_id=driver_id,
+        total=total,
+        expand=expand,
+    )
+    if since is not None:
+        result = await db.run(sync_trucks, since, page_size, cursor, selected)
+        live, tombstones = split_tombstones(result.items, "truck_id")
+        meta = PaginationMeta(
+            page=None,
+            page_size=page_size,
+            total=None,
+            total_pages=None,
+            sort="updated_at,truck_id",
+            next_cursor=result.next_cursor,
+            high_water_mark=result.high_water_mark,
+        )
+        with timed_serialization():
+            body = list_body(meta, live, TruckOut, selected, tombstones=tombstones)
+        return Response(content=body, media_type="application/json")
+
+    params = dict(
         page=page,
         page_size=page_size,
         sort=sort,
@@ -56,8 +242,45 @@ def list_trucks_endpoint(
         plate_number_contains=plate_number_contains,
         vin_contains=vin_contains,
         is_active=is_active,
+        cursor=cursor,
+        keyset=keyset,
+        total=total,
+        search=q,
+        driver_id=driver_id,
+    )
+    # Expanded pages embed drivers: a write to either table invalidates them.
+    tables = (Truck.__tablename__, Driver.__tablename__) if expand_driver else (Truck.__tablename__,)
+    cache_key = list_cache.key(tables, normalize_filters(dict(params, fields=selected, expand=expand)))
+    cached = list_cache.get(cache_key)
+    if cached is not None:
+        return cached_list_response(request, cached)
+
+    # The probe has no driver versions, so expanded pages are checked after loading.
+    if is_conditional(request) and not expand_driver:
+        # Check the page's row versions before loading and serializing the rows.
+        headers = list_validators(await db.run(list_trucks, **params, probe=True), "truck_id")
+        if not_modified(request, headers):
+            return not_modified_response(headers)
+
+    result = await db.run(list_trucks, **params, fields=selected, expand_driver=expand_driver)
+    headers = list_validators(result, "truck_id")
+    if expand_driver and not_modified(request, headers):
+        return not_modified_response(headers)
+    meta = PaginationMeta(
+        page=None if keyset else page,
+        page_size=page_size,
+        total=result.total,
+        total_pages=result.total_pages,
+        total_exact=result.total_exact,
+        sort=sort,
+        next_cursor=result.next_cursor,
+        prev_cursor=result.prev_cursor,
     )
-    return TruckListResponse(
-        meta=PaginationMeta(page=page, page_size=page_size, total=total, total_pages=total_pages, sort=sort),
-        items=items,
-    )
\ No newline at end of file
+    # Rows go straight to JSON; response_model stays for the OpenAPI schema.
+    with timed_serialization():
+        expanded = None
+        if expand_driver:
+            expanded = {"driver": embed_related(result.items, "driver_id", result.related["driver"], DriverOut, "driver_id")}
+        body = list_body(meta, result.items, TruckOut, selected, expanded)
+    store_list_page(db, cache_key, tables, body, headers)
+    return Response(content=body, media_type="application/json", headers=headers)
\ No newline at end of file
@@ -13,11 +13,32 @@ class APIError(BaseModel):
 
 
 class PaginationMeta(BaseModel):
-    page: int
+    # page is null in cursor mode; total/total_pages are null when total=none
+    page: Optional[int]
     page_size: int
-    total: int
-    total_pages: int
+    total: Optional[int]
+    total_pages: Optional[int]
+    total_exact: Optional[bool] = None
     sort: Optional[str] = None
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    # updated_since= only: set on the last page, the updated_since of the next sync
+    high_water_mark: Optional[datetime] = None
+
+
+class BulkDeactivate(BaseModel):
+    ids: List[int] = Field(min_length=1)
+
+
+class LookupRequest(BaseModel):
+    ids: List[int] = Field(min_length=1)
+
+
+class LookupMeta(BaseModel):
+    requested: int
+    found: int
+    # Requested ids with no row, in request order
+    missing: List[int]
 
 
 # -------------------------
@@ -43,9 +64,45 @@ class DriverOut(BaseModel):
         from_attributes = True
 
 
+class DriverLookupResponse(BaseModel):
+    meta: LookupMeta
+    # In request order (duplicates once)
+    items: List[DriverOut]
+
+
+class DriverTombstone(BaseModel):
+    driver_id: int
+    updated_at: datetime
+
+
 class DriverListResponse(BaseModel):
     meta: PaginationMeta
     items: List[DriverOut]
+    # updated_since= only: drivers deactivated since
+    tombstones: Optional[List[DriverTombstone]] = None
+
+
+class DriverBulkUpdateItem(DriverUpdate):
+    driver_id: int
+
+
+class DriverBulkRequest(BaseModel):
+    # Each item is validated individually (DriverCreate / DriverBulkUpdateItem)
+    # so one bad item is reported instead of rejecting the whole request.
+    items: List[dict[str, Any]] = Field(min_length=1)
+
+
+class DriverBulkItemResult(BaseModel):
+    index: int
+    ok: bool
+    item: Optional[DriverOut] = None
+    error: Optional[dict[str, Any]] = None
+
+
+class DriverBulkResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[DriverBulkItemResult]
 
 
 # -------------------------
@@ -56,6 +113,7 @@ class TruckCreate(BaseModel):
     plate_number: Optional[str] = Field(default=None, max_length=32)
     vin: Optional[str] = Field(default=None, max_length=32)
     is_active: Optional[bool] = True
+    driver_id: Optional[int] = None
 
 
 class TruckUpdate(BaseModel):
@@ -63,6 +121,8 @@ class TruckUpdate(BaseModel):
     plate_number: Optional[str] = Field(default=None, max_length=32)
     vin: Optional[str] = Field(default=None, max_length=32)
     is_active: Optional[bool] = None
+    # Assigns the truck; unassign with DELETE /trucks/{truck_id}/driver
+    driver_id: Optional[int] = None
 
 
 class TruckOut(BaseModel):
@@ -71,6 +131,7 @@ class TruckOut(BaseModel):
     plate_number: Optional[str]
     vin: Optional[str]
     is_active: bool
+    driver_id: Optional[int]
     created_at: datetime
     updated_at: datetime
 
@@ -78,6 +139,69 @@ class TruckOut(BaseModel):
         from_attributes = True
 
 
+class TruckLookupResponse(BaseModel):
+    meta: LookupMeta
+    # In request order (duplicates once)
+    items: List[TruckOut]
+
+
+class TruckTombstone(BaseModel):
+    truck_id: int
+    updated_at: datetime
+
+
 class TruckListResponse(BaseModel):
     meta: PaginationMeta
-    items: List[TruckOut]
\ No newline at end of file
+    items: List[TruckOut]
+    # updated_since= only: trucks deactivated since
+    tombstones: Optional[List[TruckTombstone]] = None
+
+
+class TruckBulkUpdateItem(TruckUpdate):
+    truck_id: int
+
+
+class TruckBulkRequest(BaseModel):
+    # Each item is validated individually (TruckCreate / TruckBulkUpdateItem)
+    # so one bad item is reported instead of rejecting the whole request.
+    items: List[dict[str, Any]] = Field(min_length=1)
+
+
+class TruckBulkItemResult(BaseModel):
+    index: int
+    ok: bool
+    item: Optional[TruckOut] = None
+    error: Optional[dict[str, Any]] = None
+
+
+class TruckBulkResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[TruckBulkItemResult]
+
+
+# -------------------------
+# Change feed
+# -------------------------
+class ChangeEventOut(BaseModel):
+    event_id: int
+    entity: str
+    entity_id: int
+    # created | updated | deactivated
+    op: str
+    changed_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ChangeListMeta(BaseModel):
+    after: int
+    # Pass as after= to continue; it moves past events filtered out by entity too
+    next_after: int
+    has_more: bool
+
+
+class ChangeListResponse(BaseModel):
+    meta: ChangeListMeta
+    items: List[ChangeEventOut]
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""
+Change feed: an outbox of the writes to trucks and drivers.
+
+The services call `record_changes` before they commit, so an event exists
+exactly when its write committed. Consumers read the outbox in event_id order:
+
+- GET /changes?after=<event_id> pages through it (batch consumers);
+- GET /changes/stream is Server-Sent Events. One shared reader per process
+  polls the outbox (local commits wake it at once) and fans new events out to
+  every subscriber, so a thousand open streams cost one query per poll.
+  Reconnecting clients resume after their Last-Event-ID.
+
+Event ids are taken at INSERT, not at COMMIT, so a slower transaction can
+commit an id below one that is already visible. Readers stop at such a gap
+until the event after it is change_feed_gap_seconds old (a rolled-back
+transaction leaves a permanent gap on MySQL): events are delivered in id order
+and resuming after an id does not skip a late commit.
+
+Delete old events with:
+
+    python -m services.change_feed prune [--older-than-hours 168]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import AsyncIterator, Deque, List, Optional, Sequence, Set
+
+from sqlalchemy import Row, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from db import SessionLocal, open_db
+from models import ChangeEvent, Driver, Truck, utcnow
+from utils.invalidation import on_commit
+
+logger = logging.getLogger("fem_api.changes")
+
+CHANGE_ENTITIES = (Truck.__tablename__, Driver.__tablename__)
+# Events per outbox query
+READ_BATCH = 500
+
+
+def record_changes(db: Session, entity: str, op: str, ids: Sequence[int]) -> None:
+    """Appends one event per id in the caller's transaction; op is "created", "updated" or "deactivated"."""
+    if not ids:
+        return
+    now = utcnow()
+    db.execute(insert(ChangeEvent), [{"entity": entity, "entity_id": i, "op": op, "changed_at": now} for i in ids])
+
+
+@dataclass
+class ChangeBatch:
+    events: List[Row]
+    # Resume point: the last event read (even if filtered out by entity)
+    next_after: int
+    # More events can be read right away
+    has_more: bool
+
+
+def read_changes(db: Session, after: int, limit: int = READ_BATCH, entity: Optional[str] = None) -> ChangeBatch:
+    """Up to `limit` events after `after`, stopping at a gap that may still be filled (see module docstring)."""
+    rows = db.execute(
+        select(*ChangeEvent.__table__.columns)
+        .where(ChangeEvent.event_id > after)
+        .order_by(ChangeEvent.event_id)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    settled = utcnow() - timedelta(seconds=settings.change_feed_gap_seconds)
+
+    events = []
+    last = after
+    for row in rows[:limit]:
+        if row.event_id != last + 1 and row.changed_at > settled:
+            has_more = False
+            break
+        last = row.event_id
+        if entity is None or row.entity == entity:
+            events.append(row)
+    return ChangeBatch(events, last, has_more)
+
+
+def settled_event_id(db: Session) -> int:
+    """The newest event that no late commit can precede any more: a safe starting point."""
+    settled = utcnow() - timedelta(seconds=settings.change_feed_gap_seconds)
+    return db.scalar(select(func.max(ChangeEvent.event_id)).where(ChangeEvent.changed_at <= settled)) or 0
+
+
+def prune(db: Session, older_than: timedelta) -> int:
+    deleted = db.execute(delete(ChangeEvent).where(ChangeEvent.changed_at < utcnow() - older_than)).rowcount
+    db.commit()
+    return deleted
+
+
+# -------------------------
+# Shared reader for the SSE streams
+# -------------------------
+class Subscriber:
+    def __init__(self, buffer: int):
+        self.buffer = buffer
+        self.pending: Deque[Row] = deque()
+        # Set when more than `buffer` events were waiting: the first event id
+        # dropped since; the stream then catches up from the outbox.
+        self.missed_from: Optional[int] = None
+        self._ready = asyncio.Event()
+
+    def push(self, events: Sequence[Row]) -> None:
+        if self.missed_from is None:
+            if len(self.pending) + len(events) > self.buffer:
+                self.missed_from = events[0].event_id
+            else:
+                self.pending.extend(events)
+        self._ready.set()
+
+    async def next(self, timeout: float) -> List[Row]:
+        """The events received since the last call; [] after `timeout` seconds without any."""
+        if not self.pending and self.missed_from is None:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._ready.clear()
+        events = list(self.pending)
+        self.pending.clear()
+        return events
+
+
+class ChangeFeed:
+    """
+    Polls the outbox while at least one stream is subscribed and hands each
+    new batch to every subscriber. Runs on the event loop of the subscribers.
+    """
+
+    def __init__(self) -> None:
+        self.subscribers: Set[Subscriber] = set()
+        self.position: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[Subscriber]:
+        subscriber = Subscriber(settings.change_feed_subscriber_buffer)
+        self.subscribers.add(subscriber)
+        self._ensure_reader()
+        try:
+            yield subscriber
+        finally:
+            self.subscribers.discard(subscriber)
+
+    def wake(self) -> None:
+        """Polls now instead of at the next interval; safe to call from any thread."""
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    def _ensure_reader(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        try:
+            while self.subscribers:
+                try:
+                    async with open_db() as db:
+                        if self.position is None:
+                            # New streams start from (about) now; resuming ones backfill from the outbox.
+                            self.position = await db.run(settled_event_id)
+                        batch = await db.run(read_changes, self.position)
+                except Exception:
+                    logger.exception("change_feed_read_failed")
+                    await asyncio.sleep(settings.change_feed_poll_seconds)
+                    continue
+                self.position = batch.next_after
+                if batch.events:
+                    for subscriber in list(self.subscribers):
+                        subscriber.push(batch.events)
+                if batch.has_more:
+                    continue
+                try:
+                    await asyncio.wait_for(self._wake.wait(), settings.change_feed_poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+        finally:
+            # The next subscriber starts a fresh reader from the then-latest event.
+            self.position = None
+
+
+change_feed = ChangeFeed()
+
+
+@on_commit
+def _wake_change_feed(table: str, ids: Sequence[int]) -> None:
+    if table in CHANGE_ENTITIES and change_feed.subscribers:
+        change_feed.wake()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain the change feed outbox")
+    parser.add_argument("command", choices=["prune"])
+    parser.add_argument("--older-than-hours", type=float, default=168.0)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        print(f"change_events: deleted {prune(db, timedelta(hours=args.older_than_hours))} events")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
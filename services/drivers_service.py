@@ -1,18 +1,40 @@
-from typing import Optional, Tuple
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
 
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import Row, Select, select
 from sqlalchemy.orm import Session
 
+from config import settings
 from models import Driver
-from utils.query import apply_pagination, parse_sort, apply_sort
+from schemas import DriverCreate, DriverBulkUpdateItem
+from services.change_feed import record_changes
+from services.search_index import contains_clause, index_rows
+from utils.bulk import BulkOutcome, chunked, item_error, run_batch
+from utils.count_cache import normalize_filters
+from utils.invalidation import notify_commit
+from utils.query import (
+    PaginationResult,
+    apply_delta_pagination,
+    apply_keyset_pagination,
+    apply_pagination,
+    apply_sort,
+    delta_sort_fields,
+    parse_sort,
+    window_columns,
+    with_tiebreaker,
+)
+from utils.writes import update_by_pk
 
 
 def create_driver(db: Session, driver_name: str) -> Driver:
     driver = Driver(driver_name=driver_name, is_active=True)
     db.add(driver)
+    db.flush()
+    index_rows(db, Driver.__tablename__, [driver], replace=False)
+    record_changes(db, Driver.__tablename__, "created", [driver.driver_id])
     db.commit()
-    db.refresh(driver)
+    notify_commit(Driver.__tablename__, [driver.driver_id])
     return driver
 
 
@@ -23,25 +45,187 @@ def get_driver(db: Session, driver_id: int) -> Driver:
     return driver
 
 
+def get_drivers_by_ids(db: Session, driver_ids: Iterable[int]) -> List[Row]:
+    """
+    Rows of all driver columns for these ids, in no particular order (missing
+    ids are skipped): one IN query per lookup_chunk_size ids.
+    """
+    ids = sorted(set(driver_ids))
+    rows: List[Row] = []
+    for chunk in chunked(ids, settings.lookup_chunk_size):
+        rows.extend(db.execute(select(*Driver.__table__.columns).where(Driver.driver_id.in_(chunk))).all())
+    return rows
+
+
+def get_driver_version(db: Session, driver_id: int) -> Row:
+    """(updated_at, version) only, for conditional GETs that may not need the row."""
+    row = db.execute(select(Driver.updated_at, Driver.version).where(Driver.driver_id == driver_id)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Driver not found")
+    return row
+
+
+def get_driver_fields(db: Session, driver_id: int, fields: List[str]) -> Row:
+    """Only the requested columns (plus updated_at and version, for the validators) of one driver."""
+    columns = window_columns([], Driver.updated_at, Driver.version, *[DRIVER_FIELDS[name] for name in fields])
+    row = db.execute(select(*columns).where(Driver.driver_id == driver_id)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Driver not found")
+    return row
+
+
 def update_driver(db: Session, driver_id: int, driver_name: Optional[str], is_active: Optional[bool]) -> Driver:
-    driver = get_driver(db, driver_id)
+    values = {name: value for name, value in (("driver_name", driver_name), ("is_active", is_active)) if value is not None}
+    if not values:
+        return get_driver(db, driver_id)
+
+    driver = update_by_pk(db, Driver, driver_id, values)
+    if driver is None:
+        raise HTTPException(status_code=404, detail="Driver not found")
+    if driver_name is not None:
+        index_rows(db, Driver.__tablename__, [driver])
+    record_changes(db, Driver.__tablename__, "updated", [driver.driver_id])
+
+    db.commit()
+    notify_commit(Driver.__tablename__, [driver.driver_id])
+    return driver
+
 
+def _apply_driver_changes(driver: Driver, driver_name: Optional[str], is_active: Optional[bool]) -> None:
     if driver_name is not None:
         driver.driver_name = driver_name
     if is_active is not None:
         driver.is_active = is_active
 
+
+def deactivate_driver(db: Session, driver_id: int) -> Driver:
+    driver = update_by_pk(db, Driver, driver_id, {"is_active": False})
+    if driver is None:
+        raise HTTPException(status_code=404, detail="Driver not found")
+    record_changes(db, Driver.__tablename__, "deactivated", [driver.driver_id])
     db.commit()
-    db.refresh(driver)
+    notify_commit(Driver.__tablename__, [driver.driver_id])
     return driver
 
 
-def deactivate_driver(db: Session, driver_id: int) -> Driver:
-    driver = get_driver(db, driver_id)
-    driver.is_active = False
+# -------------------------
+# Bulk
+# -------------------------
+def bulk_create_drivers(db: Session, items: List[Tuple[int, DriverCreate]], batch_size: int) -> List[BulkOutcome]:
+    """
+    Inserts already-validated items in batches, all in one transaction.
+    Timestamps are model defaults (app-side), so no refresh is needed to return the rows.
+    """
+    outcomes: List[BulkOutcome] = []
+
+    def op(payload: DriverCreate):
+        def add(session: Session) -> Driver:
+            driver = Driver(driver_name=payload.driver_name, is_active=True)
+            session.add(driver)
+            return driver
+        return add
+
+    for batch in chunked(items, batch_size):
+        batch_outcomes = run_batch(db, [(index, op(payload)) for index, payload in batch])
+        index_rows(db, Driver.__tablename__, [o.entity for o in batch_outcomes if o.entity is not None], replace=False)
+        outcomes.extend(batch_outcomes)
+
+    ids = [o.entity.driver_id for o in outcomes if o.entity is not None]
+    record_changes(db, Driver.__tablename__, "created", ids)
     db.commit()
-    db.refresh(driver)
-    return driver
+    notify_commit(Driver.__tablename__, ids)
+    return outcomes
+
+
+def _bulk_modify_drivers(
+    db: Session,
+    targets: List[Tuple[int, int, dict]],
+    batch_size: int,
+    reindex: bool = True,
+    change: str = "updated",
+) -> List[BulkOutcome]:
+    """
+    targets: (index, driver_id, changes) with changes as update_driver keyword arguments.
+    reindex=False skips the search index when no indexed field can change.
+    change is the op recorded in the change feed, for the rows whose values
+    actually changed (as with update_by_pk, a no-op is not a change).
+    """
+    outcomes: List[BulkOutcome] = []
+    changed_ids = set()
+
+    def op(driver: Driver, changes: dict):
+        def modify(session: Session) -> Driver:
+            _apply_driver_changes(driver, **changes)
+            return driver
+        return modify
+
+    for batch in chunked(targets, batch_size):
+        ids = {driver_id for _, driver_id, _ in batch}
+        found = {d.driver_id: d for d in db.scalars(select(Driver).where(Driver.driver_id.in_(ids)))}
+
+        ops = []
+        for index, driver_id, changes in batch:
+            driver = found.get(driver_id)
+            if driver is None:
+                outcomes.append(BulkOutcome(index, error=item_error("not_found", "Driver not found")))
+            else:
+                if any(value is not None and getattr(driver, name) != value for name, value in changes.items()):
+                    changed_ids.add(driver_id)
+                ops.append((index, op(driver, changes)))
+        batch_outcomes = run_batch(db, ops)
+        if reindex:
+            index_rows(db, Driver.__tablename__, [o.entity for o in batch_outcomes if o.entity is not None])
+        outcomes.extend(batch_outcomes)
+
+    ids = [o.entity.driver_id for o in outcomes if o.entity is not None]
+    record_changes(db, Driver.__tablename__, change, [i for i in ids if i in changed_ids])
+    db.commit()
+    notify_commit(Driver.__tablename__, ids)
+    return outcomes
+
+
+def bulk_update_drivers(db: Session, items: List[Tuple[int, DriverBulkUpdateItem]], batch_size: int) -> List[BulkOutcome]:
+    targets = [
+        (index, payload.driver_id, dict(driver_name=payload.driver_name, is_active=payload.is_active))
+        for index, payload in items
+    ]
+    return _bulk_modify_drivers(db, targets, batch_size)
+
+
+def bulk_deactivate_drivers(db: Session, driver_ids: List[int], batch_size: int) -> List[BulkOutcome]:
+    targets = [(index, driver_id, dict(driver_name=None, is_active=False)) for index, driver_id in enumerate(driver_ids)]
+    return _bulk_modify_drivers(db, targets, batch_size, reindex=False, change="deactivated")
+
+
+# Whitelist for fields= (sparse fieldsets); the keys are the DriverOut fields.
+DRIVER_FIELDS = {
+    "driver_id": Driver.driver_id,
+    "driver_name": Driver.driver_name,
+    "is_active": Driver.is_active,
+    "created_at": Driver.created_at,
+    "updated_at": Driver.updated_at,
+}
+
+
+DRIVER_SORT_FIELDS = {
+    "driver_id": Driver.driver_id,
+    "driver_name": Driver.driver_name,
+    "is_active": Driver.is_active,
+    "created_at": Driver.created_at,
+    "updated_at": Driver.updated_at,
+}
+
+
+def _filter_drivers(q: Select, driver_name_contains: Optional[str], is_active: Optional[bool]) -> Select:
+    if driver_name_contains:
+        indexed = contains_clause(Driver.__tablename__, ("driver_name",), driver_name_contains)
+        if indexed is not None:
+            q = q.where(indexed)
+        q = q.where(Driver.driver_name.ilike(f"%{driver_name_contains}%"))
+
+    if is_active is not None:
+        q = q.where(Driver.is_active == is_active)
+    return q
 
 
 def list_drivers(
@@ -51,28 +235,61 @@ def list_drivers(
     sort: Optional[str],
     driver_name_contains: Optional[str],
     is_active: Optional[bool],
-) -> Tuple[list[Driver], int, int]:
-    q = select(Driver)
+    cursor: Optional[str] = None,
+    keyset: bool = False,
+    total: Optional[str] = None,
+    probe: bool = False,
+    fields: Optional[List[str]] = None,
+) -> PaginationResult:
+    """
+    Items are rows of all driver columns (no ORM entities; see utils/serialization),
+    or of `fields` (see parse_fields) plus the sort keys, updated_at and version.
+    probe=True returns the same page as rows of (sort keys, updated_at, version) only.
+    """
+    sort_fields = with_tiebreaker(parse_sort(sort, DRIVER_SORT_FIELDS), Driver.driver_id)
+    if probe:
+        base = select(*window_columns(sort_fields, Driver.updated_at, Driver.version))
+    elif fields:
+        # The sort keys feed the cursors, updated_at and version the validators.
+        base = select(*window_columns(sort_fields, Driver.updated_at, Driver.version, *[DRIVER_FIELDS[name] for name in fields]))
+    else:
+        base = select(*Driver.__table__.columns)
+    q = _filter_drivers(base, driver_name_contains, is_active)
 
-    if driver_name_contains:
-        q = q.where(Driver.driver_name.ilike(f"%{driver_name_contains}%"))
+    filters = {
+        "driver_name_contains": driver_name_contains,
+        "is_active": is_active,
+    }
+    count_key = (Driver.__tablename__, normalize_filters(filters))
 
-    if is_active is not None:
-        q = q.where(Driver.is_active == is_active)
+    if keyset or cursor:
+        return apply_keyset_pagination(db, q, sort_fields, page_size, cursor, total or "none", count_key)
+
+    q = apply_sort(q, sort_fields)
+    return apply_pagination(db, q, page, page_size, total or "exact", count_key)
 
-    allowed = {
-        "driver_id": Driver.driver_id,
-        "driver_name": Driver.driver_name,
-        "is_active": Driver.is_active,
-        "created_at": Driver.created_at,
-        "updated_at": Driver.updated_at,
-    }
 
-    sort_fields = parse_sort(sort, allowed)
-    if sort_fields:
-        q = apply_sort(q, sort_fields)
+def sync_drivers(
+    db: Session,
+    updated_since: datetime,
+    page_size: int,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> PaginationResult:
+    """
+    Drivers changed since `updated_since` (see apply_delta_pagination), active
+    or not: rows of all driver columns, or of `fields` plus the sort keys and
+    is_active, for split_tombstones.
+    """
+    if fields:
+        sort_fields = delta_sort_fields(Driver.updated_at, Driver.driver_id)
+        base = select(*window_columns(sort_fields, Driver.is_active, *[DRIVER_FIELDS[name] for name in fields]))
     else:
-        q = q.order_by(Driver.driver_id.asc())
+        base = select(*Driver.__table__.columns)
+    return apply_delta_pagination(db, base, Driver.updated_at, Driver.driver_id, updated_since, page_size, cursor)
+
 
-    paged = apply_pagination(db, q, page, page_size)
-    return paged.items, paged.total, paged.total_pages
\ No newline at end of file
+def export_drivers_query(sort: Optional[str], driver_name_contains: Optional[str], is_active: Optional[bool]) -> Select:
+    """Same filters/sort as list_drivers, selecting the DriverOut columns (no ORM objects) for streaming."""
+    q = _filter_drivers(select(*DRIVER_FIELDS.values()), driver_name_contains, is_active)
+    return apply_sort(q, with_tiebreaker(parse_sort(sort, DRIVER_SORT_FIELDS), Driver.driver_id))
\ No newline at end of file
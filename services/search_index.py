@@ -0,0 +1,163 @@
+"""
+Trigram search index for substring filters.
+
+`ilike('%x%')` cannot use a B-tree index, so every *_contains search was a
+full scan. Each indexed column value is split into case- and accent-folded
+trigrams stored in `search_trigrams`; a search for a term of 3+ characters
+first narrows the candidates to ids whose value contains every trigram of the
+term (index range scans), and the original ILIKE then only runs on those rows.
+Shorter terms, and terms with LIKE wildcards, fall back to the plain ILIKE.
+
+Rebuild after loading data outside the API, or after a change to `fold`:
+
+    python -m services.search_index rebuild [--entity trucks]
+"""
+from __future__ import annotations
+
+import argparse
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import ColumnElement, and_, delete, insert, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Driver, SearchTrigram, Truck
+
+# entity -> (model, primary key attribute, indexed fields)
+SEARCH_FIELDS: Dict[str, Tuple[Any, str, Tuple[str, ...]]] = {
+    Truck.__tablename__: (Truck, "truck_id", ("unit_number", "plate_number", "vin")),
+    Driver.__tablename__: (Driver, "driver_id", ("driver_name",)),
+}
+
+
+# Characters the ILIKE does not match literally: wildcards, and MySQL's default LIKE escape
+LIKE_SPECIAL = ("%", "_", "\\")
+
+
+def fold(value: str) -> str:
+    """
+    Case and accent folding at least as coarse as the columns' collation
+    (MySQL's *_ai_ci: 'É' = 'e', 'ß' = 'ss'; SQLite only folds ASCII case), so
+    every value the ILIKE matches contains all the term's trigrams.
+    """
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def trigrams(value: Optional[str]) -> Set[str]:
+    if not value:
+        return set()
+    text = fold(value)
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _gram_rows(entity: str, entity_id: int, fields: Iterable[str], source: Any) -> List[Dict[str, Any]]:
+    return [
+        {"entity": entity, "field": field, "gram": gram, "entity_id": entity_id}
+        for field in fields
+        for gram in trigrams(getattr(source, field))
+    ]
+
+
+def index_rows(
+    db: Session,
+    entity: str,
+    rows: Sequence[Any],
+    fields: Optional[Iterable[str]] = None,
+    replace: bool = True,
+) -> None:
+    """
+    (Re)indexes `rows` (ORM objects or rows with the pk + field attributes)
+    for `fields` (default: all indexed fields of the entity), in the caller's
+    transaction. Use replace=False for freshly inserted rows.
+    """
+    if not rows:
+        return
+    _, pk, all_fields = SEARCH_FIELDS[entity]
+    fields = tuple(fields) if fields is not None else all_fields
+    ids = [getattr(row, pk) for row in rows]
+
+    if replace:
+        db.execute(
+            delete(SearchTrigram).where(
+                SearchTrigram.entity == entity,
+                SearchTrigram.entity_id.in_(ids),
+                SearchTrigram.field.in_(fields),
+            )
+        )
+
+    gram_rows = [g for row, entity_id in zip(rows, ids) for g in _gram_rows(entity, entity_id, fields, row)]
+    if gram_rows:
+        db.execute(insert(SearchTrigram), gram_rows)
+
+
+def contains_clause(entity: str, fields: Sequence[str], term: Optional[str]) -> Optional[ColumnElement]:
+    """
+    Restricts the entity's pk to ids having every trigram of `term` in one of
+    `fields`, or returns None when the index cannot help (disabled, or term
+    shorter than 3) or could disagree with the ILIKE (term with `%`, `_` or
+    `\\`, which the ILIKE does not match literally). Callers keep their ILIKE
+    as well: trigrams narrow, ILIKE confirms (adjacency, and which field
+    matched for multi-field searches).
+
+    One `pk IN (...)` per trigram, each a range scan on the
+    (entity, field, gram) primary key prefix.
+    """
+    if not term or not settings.search_index_enabled or any(c in term for c in LIKE_SPECIAL):
+        return None
+    grams = trigrams(term)
+    if not grams:
+        return None
+    model, pk, _ = SEARCH_FIELDS[entity]
+    pk_col = getattr(model, pk)
+
+    return and_(
+        *[
+            pk_col.in_(
+                select(SearchTrigram.entity_id).where(
+                    SearchTrigram.entity == entity,
+                    SearchTrigram.field.in_(fields),
+                    SearchTrigram.gram == gram,
+                )
+            )
+            for gram in sorted(grams)
+        ]
+    )
+
+
+def rebuild(db: Session, entity: str, chunk_size: int = 5000) -> int:
+    """Drops and recomputes the whole index for one entity. Returns the number of rows indexed."""
+    model, pk, fields = SEARCH_FIELDS[entity]
+    db.execute(delete(SearchTrigram).where(SearchTrigram.entity == entity))
+
+    stmt = select(getattr(model, pk), *[getattr(model, f) for f in fields]).order_by(getattr(model, pk))
+    # Read in pk ranges rather than holding a streaming cursor open while inserting.
+    count = 0
+    last_id = 0
+    while True:
+        chunk = db.execute(stmt.where(getattr(model, pk) > last_id).limit(chunk_size)).all()
+        if not chunk:
+            break
+        index_rows(db, entity, chunk, replace=False)
+        count += len(chunk)
+        last_id = getattr(chunk[-1], pk)
+    db.commit()
+    return count
+
+
+def main() -> None:
+    from db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain the trigram search index")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--entity", choices=sorted(SEARCH_FIELDS), action="append")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        for entity in args.entity or sorted(SEARCH_FIELDS):
+            print(f"{entity}: indexed {rebuild(db, entity)} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,44 @@
-from typing import Optional, Tuple
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import Row, Select, or_, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from models import Truck
-from utils.query import apply_pagination, parse_sort, apply_sort
+from config import settings
+from models import Driver, Truck
+from schemas import TruckCreate, TruckBulkUpdateItem
+from services.drivers_service import get_drivers_by_ids
+from services.change_feed import record_changes
+from services.search_index import contains_clause, index_rows
+from utils.bulk import BulkOutcome, chunked, item_error, run_batch
+from utils.count_cache import normalize_filters
+from utils.invalidation import notify_commit
+from utils.query import (
+    PaginationResult,
+    apply_delta_pagination,
+    apply_keyset_pagination,
+    apply_pagination,
+    apply_sort,
+    delta_sort_fields,
+    parse_sort,
+    window_columns,
+    with_tiebreaker,
+)
+from utils.writes import is_foreign_key_violation, update_by_pk
+
+
+@contextmanager
+def _driver_must_exist() -> Iterator[None]:
+    """The trucks.driver_id foreign key checks the driver; its violation becomes a 422 (no lookup query)."""
+    try:
+        yield
+    except IntegrityError as exc:
+        if is_foreign_key_violation(exc):
+            raise HTTPException(status_code=422, detail="Driver not found")
+        raise
 
 
 def create_truck(
@@ -14,16 +47,22 @@ def create_truck(
     plate_number: Optional[str],
     vin: Optional[str],
     is_active: bool,
+    driver_id: Optional[int] = None,
 ) -> Truck:
     truck = Truck(
         unit_number=unit_number,
         plate_number=plate_number,
         vin=vin,
         is_active=is_active,
+        driver_id=driver_id,
     )
     db.add(truck)
+    with _driver_must_exist():
+        db.flush()
+    index_rows(db, Truck.__tablename__, [truck], replace=False)
+    record_changes(db, Truck.__tablename__, "created", [truck.truck_id])
     db.commit()
-    db.refresh(truck)
+    notify_commit(Truck.__tablename__, [truck.truck_id])
     return truck
 
 
@@ -34,6 +73,35 @@ def get_truck(db: Session, truck_id: int) -> Truck:
     return truck
 
 
+def get_trucks_by_ids(db: Session, truck_ids: Iterable[int]) -> List[Row]:
+    """
+    Rows of all truck columns for these ids, in no particular order (missing
+    ids are skipped): one IN query per lookup_chunk_size ids.
+    """
+    ids = sorted(set(truck_ids))
+    rows: List[Row] = []
+    for chunk in chunked(ids, settings.lookup_chunk_size):
+        rows.extend(db.execute(select(*Truck.__table__.columns).where(Truck.truck_id.in_(chunk))).all())
+    return rows
+
+
+def get_truck_version(db: Session, truck_id: int) -> Row:
+    """(updated_at, version) only, for conditional GETs that may not need the row."""
+    row = db.execute(select(Truck.updated_at, Truck.version).where(Truck.truck_id == truck_id)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Truck not found")
+    return row
+
+
+def get_truck_fields(db: Session, truck_id: int, fields: List[str]) -> Row:
+    """Only the requested columns (plus updated_at and version, for the validators) of one truck."""
+    columns = window_columns([], Truck.updated_at, Truck.version, *[TRUCK_FIELDS[name] for name in fields])
+    row = db.execute(select(*columns).where(Truck.truck_id == truck_id)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Truck not found")
+    return row
+
+
 def update_truck(
     db: Session,
     truck_id: int,
@@ -41,9 +109,44 @@ def update_truck(
     plate_number: Optional[str],
     vin: Optional[str],
     is_active: Optional[bool],
+    driver_id: Optional[int] = None,
 ) -> Truck:
-    truck = get_truck(db, truck_id)
+    values = {
+        name: value
+        for name, value in (
+            ("unit_number", unit_number),
+            ("plate_number", plate_number),
+            ("vin", vin),
+            ("is_active", is_active),
+            ("driver_id", driver_id),
+        )
+        if value is not None
+    }
+    if not values:
+        return get_truck(db, truck_id)
 
+    with _driver_must_exist():
+        truck = update_by_pk(db, Truck, truck_id, values)
+    if truck is None:
+        raise HTTPException(status_code=404, detail="Truck not found")
+    changed = [f for f in TRUCK_SEARCH_FIELDS if f in values]
+    if changed:
+        index_rows(db, Truck.__tablename__, [truck], fields=changed)
+    record_changes(db, Truck.__tablename__, "updated", [truck.truck_id])
+
+    db.commit()
+    notify_commit(Truck.__tablename__, [truck.truck_id])
+    return truck
+
+
+def _apply_truck_changes(
+    truck: Truck,
+    unit_number: Optional[str],
+    plate_number: Optional[str],
+    vin: Optional[str],
+    is_active: Optional[bool],
+    driver_id: Optional[int] = None,
+) -> None:
     if unit_number is not None:
         truck.unit_number = unit_number
     if plate_number is not None:
@@ -52,57 +155,303 @@ def update_truck(
         truck.vin = vin
     if is_active is not None:
         truck.is_active = is_active
+    if driver_id is not None:
+        truck.driver_id = driver_id
+
 
+def deactivate_truck(db: Session, truck_id: int) -> Truck:
+    truck = update_by_pk(db, Truck, truck_id, {"is_active": False})
+    if truck is None:
+        raise HTTPException(status_code=404, detail="Truck not found")
+    record_changes(db, Truck.__tablename__, "deactivated", [truck.truck_id])
     db.commit()
-    db.refresh(truck)
+    notify_commit(Truck.__tablename__, [truck.truck_id])
     return truck
 
 
-def deactivate_truck(db: Session, truck_id: int) -> Truck:
-    truck = get_truck(db, truck_id)
-    truck.is_active = False
+def unassign_truck_driver(db: Session, truck_id: int) -> Truck:
+    truck = update_by_pk(db, Truck, truck_id, {"driver_id": None})
+    if truck is None:
+        raise HTTPException(status_code=404, detail="Truck not found")
+    record_changes(db, Truck.__tablename__, "updated", [truck.truck_id])
     db.commit()
-    db.refresh(truck)
+    notify_commit(Truck.__tablename__, [truck.truck_id])
     return truck
 
 
-def list_trucks(
+# -------------------------
+# Bulk
+# -------------------------
+def bulk_create_trucks(db: Session, items: List[Tuple[int, TruckCreate]], batch_size: int) -> List[BulkOutcome]:
+    """
+    Inserts already-validated items in batches, all in one transaction.
+    Timestamps are model defaults (app-side), so no refresh is needed to return the rows.
+    """
+    outcomes: List[BulkOutcome] = []
+
+    def op(payload: TruckCreate):
+        def add(session: Session) -> Truck:
+            truck = Truck(
+                unit_number=payload.unit_number,
+                plate_number=payload.plate_number,
+                vin=payload.vin,
+                is_active=bool(payload.is_active),
+                driver_id=payload.driver_id,
+            )
+            session.add(truck)
+            return truck
+        return add
+
+    for batch in chunked(items, batch_size):
+        batch_outcomes = run_batch(db, [(index, op(payload)) for index, payload in batch], missing_parent="Driver not found")
+        index_rows(db, Truck.__tablename__, [o.entity for o in batch_outcomes if o.entity is not None], replace=False)
+        outcomes.extend(batch_outcomes)
+
+    ids = [o.entity.truck_id for o in outcomes if o.entity is not None]
+    record_changes(db, Truck.__tablename__, "created", ids)
+    db.commit()
+    notify_commit(Truck.__tablename__, ids)
+    return outcomes
+
+
+def _bulk_modify_trucks(
     db: Session,
-    page: int,
-    page_size: int,
-    sort: Optional[str],
+    targets: List[Tuple[int, int, dict]],
+    batch_size: int,
+    reindex: bool = True,
+    change: str = "updated",
+) -> List[BulkOutcome]:
+    """
+    targets: (index, truck_id, changes) with changes as update_truck keyword arguments.
+    reindex=False skips the search index when no indexed field can change.
+    change is the op recorded in the change feed, for the rows whose values
+    actually changed (as with update_by_pk, a no-op is not a change).
+    """
+    outcomes: List[BulkOutcome] = []
+    changed_ids = set()
+
+    def op(truck: Truck, changes: dict):
+        def modify(session: Session) -> Truck:
+            _apply_truck_changes(truck, **changes)
+            return truck
+        return modify
+
+    for batch in chunked(targets, batch_size):
+        ids = {truck_id for _, truck_id, _ in batch}
+        found = {t.truck_id: t for t in db.scalars(select(Truck).where(Truck.truck_id.in_(ids)))}
+
+        ops = []
+        for index, truck_id, changes in batch:
+            truck = found.get(truck_id)
+            if truck is None:
+                outcomes.append(BulkOutcome(index, error=item_error("not_found", "Truck not found")))
+            else:
+                if any(value is not None and getattr(truck, name) != value for name, value in changes.items()):
+                    changed_ids.add(truck_id)
+                ops.append((index, op(truck, changes)))
+        batch_outcomes = run_batch(db, ops, missing_parent="Driver not found")
+        if reindex:
+            index_rows(db, Truck.__tablename__, [o.entity for o in batch_outcomes if o.entity is not None])
+        outcomes.extend(batch_outcomes)
+
+    ids = [o.entity.truck_id for o in outcomes if o.entity is not None]
+    record_changes(db, Truck.__tablename__, change, [i for i in ids if i in changed_ids])
+    db.commit()
+    notify_commit(Truck.__tablename__, ids)
+    return outcomes
+
+
+def bulk_update_trucks(db: Session, items: List[Tuple[int, TruckBulkUpdateItem]], batch_size: int) -> List[BulkOutcome]:
+    targets = [
+        (
+            index,
+            payload.truck_id,
+            dict(
+                unit_number=payload.unit_number,
+                plate_number=payload.plate_number,
+                vin=payload.vin,
+                is_active=payload.is_active,
+                driver_id=payload.driver_id,
+            ),
+        )
+        for index, payload in items
+    ]
+    return _bulk_modify_trucks(db, targets, batch_size)
+
+
+def bulk_deactivate_trucks(db: Session, truck_ids: List[int], batch_size: int) -> List[BulkOutcome]:
+    targets = [
+        (index, truck_id, dict(unit_number=None, plate_number=None, vin=None, is_active=False))
+        for index, truck_id in enumerate(truck_ids)
+    ]
+    return _bulk_modify_trucks(db, targets, batch_size, reindex=False, change="deactivated")
+
+
+# Whitelist for fields= (sparse fieldsets); the keys are the TruckOut fields.
+TRUCK_FIELDS = {
+    "truck_id": Truck.truck_id,
+    "unit_number": Truck.unit_number,
+    "plate_number": Truck.plate_number,
+    "vin": Truck.vin,
+    "is_active": Truck.is_active,
+    "driver_id": Truck.driver_id,
+    "created_at": Truck.created_at,
+    "updated_at": Truck.updated_at,
+}
+
+
+TRUCK_SORT_FIELDS = {
+    "truck_id": Truck.truck_id,
+    "unit_number": Truck.unit_number,
+    "plate_number": Truck.plate_number,
+    "vin": Truck.vin,
+    "is_active": Truck.is_active,
+    "driver_id": Truck.driver_id,
+    "created_at": Truck.created_at,
+    "updated_at": Truck.updated_at,
+}
+
+
+TRUCK_SEARCH_FIELDS = ("unit_number", "plate_number", "vin")
+
+
+def _contains(q: Select, fields: Tuple[str, ...], term: str) -> Select:
+    """ILIKE '%term%' on any of `fields`, narrowed through the trigram index when possible."""
+    indexed = contains_clause(Truck.__tablename__, fields, term)
+    if indexed is not None:
+        q = q.where(indexed)
+    return q.where(or_(*[getattr(Truck, f).ilike(f"%{term}%") for f in fields]))
+
+
+def _filter_trucks(
+    q: Select,
     unit_number_contains: Optional[str],
     plate_number_contains: Optional[str],
     vin_contains: Optional[str],
     is_active: Optional[bool],
-) -> Tuple[list[Truck], int, int]:
-    q = select(Truck)
-
+    search: Optional[str] = None,
+    driver_id: Optional[int] = None,
+) -> Select:
     if unit_number_contains:
-        q = q.where(Truck.unit_number.ilike(f"%{unit_number_contains}%"))
+        q = _contains(q, ("unit_number",), unit_number_contains)
     if plate_number_contains:
-        q = q.where(Truck.plate_number.ilike(f"%{plate_number_contains}%"))
+        q = _contains(q, ("plate_number",), plate_number_contains)
     if vin_contains:
-        q = q.where(Truck.vin.ilike(f"%{vin_contains}%"))
+        q = _contains(q, ("vin",), vin_contains)
+    if search:
+        q = _contains(q, TRUCK_SEARCH_FIELDS, search)
 
     if is_active is not None:
         q = q.where(Truck.is_active == is_active)
+    if driver_id is not None:
+        q = q.where(Truck.driver_id == driver_id)
+    return q
+
+
+def list_trucks(
+    db: Session,
+    page: int,
+    page_size: int,
+    sort: Optional[str],
+    unit_number_contains: Optional[str],
+    plate_number_contains: Optional[str],
+    vin_contains: Optional[str],
+    is_active: Optional[bool],
+    cursor: Optional[str] = None,
+    keyset: bool = False,
+    total: Optional[str] = None,
+    search: Optional[str] = None,
+    probe: bool = False,
+    fields: Optional[List[str]] = None,
+    driver_id: Optional[int] = None,
+    expand_driver: bool = False,
+) -> PaginationResult:
+    """
+    Items are rows of all truck columns (no ORM entities; see utils/serialization),
+    or of `fields` (see parse_fields) plus the sort keys, updated_at and version.
+    probe=True returns the same page as rows of (sort keys, updated_at, version) only.
 
-    allowed = {
-        "truck_id": Truck.truck_id,
-        "unit_number": Truck.unit_number,
-        "plate_number": Truck.plate_number,
-        "vin": Truck.vin,
-        "is_active": Truck.is_active,
-        "created_at": Truck.created_at,
-        "updated_at": Truck.updated_at,
+    expand_driver=True also loads the page's drivers with one IN query, as
+    result.related["driver"].
+    """
+    sort_fields = with_tiebreaker(parse_sort(sort, TRUCK_SORT_FIELDS), Truck.truck_id)
+    if probe:
+        base = select(*window_columns(sort_fields, Truck.updated_at, Truck.version))
+    elif fields:
+        # The sort keys feed the cursors, updated_at and version the validators.
+        extra = [Truck.driver_id] if expand_driver else []
+        base = select(*window_columns(sort_fields, Truck.updated_at, Truck.version, *extra, *[TRUCK_FIELDS[name] for name in fields]))
+    else:
+        base = select(*Truck.__table__.columns)
+    q = _filter_trucks(base, unit_number_contains, plate_number_contains, vin_contains, is_active, search, driver_id)
+
+    filters = {
+        "unit_number_contains": unit_number_contains,
+        "plate_number_contains": plate_number_contains,
+        "vin_contains": vin_contains,
+        "is_active": is_active,
+        "q": search,
+        "driver_id": driver_id,
     }
+    count_key = (Truck.__tablename__, normalize_filters(filters))
 
-    sort_fields = parse_sort(sort, allowed)
-    if sort_fields:
-        q = apply_sort(q, sort_fields)
+    if keyset or cursor:
+        result = apply_keyset_pagination(db, q, sort_fields, page_size, cursor, total or "none", count_key)
+    else:
+        result = apply_pagination(db, apply_sort(q, sort_fields), page, page_size, total or "exact", count_key)
+
+    if expand_driver and not probe:
+        result.related["driver"] = get_drivers_by_ids(db, {row.driver_id for row in result.items if row.driver_id is not None})
+    return result
+
+
+def sync_trucks(
+    db: Session,
+    updated_since: datetime,
+    page_size: int,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> PaginationResult:
+    """
+    Trucks changed since `updated_since` (see apply_delta_pagination), active
+    or not: rows of all truck columns, or of `fields` plus the sort keys and
+    is_active, for split_tombstones.
+    """
+    if fields:
+        sort_fields = delta_sort_fields(Truck.updated_at, Truck.truck_id)
+        base = select(*window_columns(sort_fields, Truck.is_active, *[TRUCK_FIELDS[name] for name in fields]))
     else:
-        q = q.order_by(Truck.truck_id.asc())
+        base = select(*Truck.__table__.columns)
+    return apply_delta_pagination(db, base, Truck.updated_at, Truck.truck_id, updated_since, page_size, cursor)
 
-    paged = apply_pagination(db, q, page, page_size)
-    return paged.items, paged.total, paged.total_pages
\ No newline at end of file
+
+def list_driver_trucks(db: Session, driver_id: int, **params) -> PaginationResult:
+    """list_trucks for one driver; 404 for an unknown driver (only looked up when the page is empty)."""
+    result = list_trucks(
+        db,
+        unit_number_contains=None,
+        plate_number_contains=None,
+        vin_contains=None,
+        is_active=None,
+        driver_id=driver_id,
+        **params,
+    )
+    if not result.items and db.scalar(select(Driver.driver_id).where(Driver.driver_id == driver_id)) is None:
+        raise HTTPException(status_code=404, detail="Driver not found")
+    return result
+
+
+def export_trucks_query(
+    sort: Optional[str],
+    unit_number_contains: Optional[str],
+    plate_number_contains: Optional[str],
+    vin_contains: Optional[str],
+    is_active: Optional[bool],
+    search: Optional[str] = None,
+    driver_id: Optional[int] = None,
+) -> Select:
+    """Same filters/sort as list_trucks, selecting the TruckOut columns (no ORM objects) for streaming."""
+    q = _filter_trucks(
+        select(*TRUCK_FIELDS.values()), unit_number_contains, plate_number_contains, vin_contains, is_active, search, driver_id
+    )
+    return apply_sort(q, with_tiebreaker(parse_sort(sort, TRUCK_SORT_FIELDS), Truck.truck_id))
\ No newline at end of file
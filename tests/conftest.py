@@ -0,0 +1,77 @@
+"""
+Shared fixtures. Settings are read and the engines built when config/db are
+first imported, so the environment is set here, before anything imports
+them: every test run uses a throwaway SQLite file, in DB_MODE sync unless
+the environment says otherwise (DB_MODE=async python -m pytest).
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+_workdir = tempfile.mkdtemp(prefix="fem_tests_")
+os.environ["MYSQL_URL"] = f"sqlite:///{_workdir}/test.db"
+os.environ.setdefault("DB_MODE", "sync")
+os.environ["REPLICA_URLS"] = ""
+os.environ["LOG_LEVEL"] = "WARNING"
+
+import pytest
+from fastapi.testclient import TestClient
+
+import models  # noqa: F401  (registers the tables on Base.metadata)
+from db import Base, engine
+from main import app
+from utils.invalidation import notify_commit
+
+
+@pytest.fixture
+def client():
+    """A client on empty tables and empty caches."""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    for table in Base.metadata.tables:
+        notify_commit(table)
+    return TestClient(app)
+
+
+@pytest.fixture
+def statements():
+    """SQL statements sent to the database (primary engine, sync or async) while the test runs."""
+    from sqlalchemy import event
+
+    from db import async_engine
+
+    engines = [engine] if async_engine is None else [engine, async_engine.sync_engine]
+    sent = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        sent.append(statement)
+
+    for target in engines:
+        event.listen(target, "before_cursor_execute", capture)
+    yield sent
+    for target in engines:
+        event.remove(target, "before_cursor_execute", capture)
+
+
+class FrozenClock:
+    """The time seen by models.utcnow, moved only by tick()."""
+
+    def __init__(self):
+        self.now = datetime.now(timezone.utc)
+
+    def tick(self, seconds: float = 1.0) -> None:
+        self.now += timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def frozen_clock(monkeypatch):
+    """Every app-side timestamp falls in the same second until the test calls tick()."""
+    clock = FrozenClock()
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock.now.astimezone(tz) if tz else clock.now.replace(tzinfo=None)
+
+    monkeypatch.setattr(models, "datetime", FrozenDatetime)
+    return clock
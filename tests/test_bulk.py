@@ -0,0 +1,52 @@
+from sqlalchemy.exc import DataError, IntegrityError
+
+from utils.bulk import row_error
+
+
+def _errors(body):
+    return {result["index"]: result["error"] for result in body["results"] if not result["ok"]}
+
+
+def test_bulk_create_reports_an_unknown_driver_like_the_single_endpoint(client):
+    driver = client.post("/drivers", json={"driver_name": "Ada"}).json()
+    single = client.post("/trucks", json={"unit_number": "X", "driver_id": 999999})
+    assert (single.status_code, single.json()["detail"]) == (422, "Driver not found")
+
+    items = [
+        {"unit_number": "T-1", "driver_id": driver["driver_id"]},
+        {"unit_number": "T-2", "driver_id": 999999},
+        {"unit_number": "T-3"},
+    ]
+    body = client.post("/trucks/bulk", json={"items": items}).json()
+
+    assert (body["succeeded"], body["failed"]) == (2, 1)
+    assert _errors(body) == {1: {"code": "not_found", "message": "Driver not found"}}
+    created = [result["item"]["unit_number"] for result in body["results"] if result["ok"]]
+    assert created == ["T-1", "T-3"]
+    assert client.get("/trucks").json()["meta"]["total"] == 2
+
+
+def test_bulk_update_reports_an_unknown_driver_like_the_single_endpoint(client):
+    trucks = [client.post("/trucks", json={"unit_number": f"T-{i}"}).json() for i in range(3)]
+    items = [
+        {"truck_id": trucks[0]["truck_id"], "unit_number": "U-0"},
+        {"truck_id": trucks[1]["truck_id"], "driver_id": 999999},
+        {"truck_id": trucks[2]["truck_id"], "unit_number": "U-2"},
+    ]
+    body = client.patch("/trucks/bulk", json={"items": items}).json()
+
+    assert _errors(body) == {1: {"code": "not_found", "message": "Driver not found"}}
+    assert [truck["unit_number"] for truck in client.get("/trucks", params={"sort": "truck_id"}).json()["items"]] == ["U-0", "T-1", "U-2"]
+
+
+def test_other_rejected_rows_do_not_get_the_database_message():
+    generic = {"code": "integrity_error", "message": "Conflicts with existing data or a database constraint"}
+    unique = IntegrityError("INSERT ...", {}, Exception("UNIQUE constraint failed: trucks.unit_number"))
+    too_long = DataError("INSERT ...", {}, Exception("Data too long for column 'vin' at row 1"))
+
+    assert row_error(unique, missing_parent="Driver not found") == generic
+    assert row_error(too_long, missing_parent="Driver not found") == generic
+    # Without a parent to report, a foreign key violation is just a constraint error.
+    foreign_key = IntegrityError("INSERT ...", {}, Exception("FOREIGN KEY constraint failed"))
+    assert row_error(foreign_key) == generic
+    assert row_error(foreign_key, missing_parent="Driver not found") == {"code": "not_found", "message": "Driver not found"}
@@ -0,0 +1,37 @@
+import pytest
+
+
+def _events(client, after):
+    body = client.get("/changes", params={"after": after}).json()
+    return [(event["entity"], event["entity_id"], event["op"]) for event in body["items"]], body["meta"]["next_after"]
+
+
+@pytest.mark.parametrize(
+    "entity, pk, payload",
+    [("trucks", "truck_id", {"unit_number": "T"}), ("drivers", "driver_id", {"driver_name": "D"})],
+)
+def test_bulk_deactivate_only_records_rows_that_were_active(client, entity, pk, payload):
+    ids = [client.post(f"/{entity}", json=payload).json()[pk] for _ in range(3)]
+    client.delete(f"/{entity}/{ids[0]}")
+    _, after = _events(client, 0)
+
+    body = client.post(f"/{entity}/bulk/deactivate", json={"ids": ids}).json()
+    assert body["succeeded"] == 3
+
+    events, after = _events(client, after)
+    assert events == [(entity, ids[1], "deactivated"), (entity, ids[2], "deactivated")]
+    # Deactivating them all again changes nothing
+    client.post(f"/{entity}/bulk/deactivate", json={"ids": ids})
+    assert _events(client, after)[0] == []
+
+
+def test_bulk_update_only_records_rows_whose_values_changed(client):
+    trucks = [client.post("/trucks", json={"unit_number": f"T-{i}"}).json() for i in range(2)]
+    _, after = _events(client, 0)
+
+    items = [
+        {"truck_id": trucks[0]["truck_id"], "unit_number": "T-0", "is_active": True},
+        {"truck_id": trucks[1]["truck_id"], "unit_number": "U-1"},
+    ]
+    assert client.patch("/trucks/bulk", json={"items": items}).json()["succeeded"] == 2
+    assert _events(client, after)[0] == [("trucks", trucks[1]["truck_id"], "updated")]
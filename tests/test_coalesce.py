@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from config import settings
+from utils import coalesce
+from utils.coalesce import CoalescingMiddleware
+from utils.invalidation import notify_commit
+
+
+class SlowApp:
+    """Answers every request after `release` is set, with a body numbering the call."""
+
+    def __init__(self, status=200, fail=False):
+        self.status = status
+        self.fail = fail
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        call = self.calls
+        await self.release.wait()
+        if self.fail and call == 1:
+            raise RuntimeError("leader failed")
+        await send({"type": "http.response.start", "status": self.status, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": f"call {call}".encode(), "more_body": False})
+
+
+def _scope(path="/trucks", query=b"is_active=true"):
+    return {"type": "http", "method": "GET", "path": path, "query_string": query, "headers": []}
+
+
+async def _request(middleware, scope=None):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    try:
+        await middleware(scope or _scope(), receive, send)
+    except RuntimeError:
+        return None
+    return messages[0]["status"], b"".join(m.get("body", b"") for m in messages[1:])
+
+
+async def _concurrently(app, count, between=None, scopes=None):
+    middleware = CoalescingMiddleware(app)
+    tasks = []
+    for i in range(count):
+        tasks.append(asyncio.create_task(_request(middleware, scopes[i] if scopes else None)))
+        # Let each request reach the app (leader) or the flight (followers).
+        await asyncio.sleep(0)
+        if between is not None and i == 0:
+            between()
+    await asyncio.sleep(0)
+    app.release.set()
+    return await asyncio.gather(*tasks)
+
+
+@pytest.fixture(autouse=True)
+def counters(monkeypatch):
+    monkeypatch.setattr(settings, "coalesce_enabled", True)
+    monkeypatch.setattr(coalesce, "counters", dict.fromkeys(coalesce.counters, 0))
+    yield coalesce.counters
+    assert not coalesce.flights
+
+
+def test_followers_get_the_leaders_response(counters):
+    app = SlowApp()
+    responses = asyncio.run(_concurrently(app, 3))
+    assert app.calls == 1
+    assert responses == [(200, b"call 1")] * 3
+    assert counters["coalesced"] == 2
+
+
+def test_different_queries_do_not_coalesce():
+    app = SlowApp()
+    scopes = [_scope(query=b"is_active=true&page=1"), _scope(query=b"page=1&is_active=true"), _scope(query=b"page=2")]
+    responses = asyncio.run(_concurrently(app, 3, scopes=scopes))
+    assert app.calls == 2
+    assert responses[0] == responses[1] == (200, b"call 1")
+    assert responses[2] == (200, b"call 2")
+
+
+def test_no_join_after_a_commit(counters):
+    app = SlowApp()
+    # A write commits after the leader started: its response may predate the write.
+    responses = asyncio.run(_concurrently(app, 2, between=lambda: notify_commit("trucks", [1])))
+    assert app.calls == 2
+    assert responses == [(200, b"call 1"), (200, b"call 2")]
+    assert counters["coalesced"] == 0
+
+
+def test_followers_run_on_their_own_after_a_5xx(counters):
+    app = SlowApp(status=503)
+    responses = asyncio.run(_concurrently(app, 3))
+    assert app.calls == 3
+    assert sorted(responses) == [(503, b"call 1"), (503, b"call 2"), (503, b"call 3")]
+    assert counters["not_shared"] == 2
+
+
+def test_followers_run_on_their_own_when_the_leader_raises(counters):
+    app = SlowApp(fail=True)
+    responses = asyncio.run(_concurrently(app, 3))
+    assert app.calls == 3
+    assert responses[0] is None
+    assert sorted(responses[1:]) == [(200, b"call 2"), (200, b"call 3")]
+    assert counters["not_shared"] == 2
+
+
+def test_waiters_stop_waiting_after_coalesce_max_wait_ms(monkeypatch, counters):
+    monkeypatch.setattr(settings, "coalesce_max_wait_ms", 10.0)
+    app = SlowApp()
+
+    async def scenario():
+        middleware = CoalescingMiddleware(app)
+        leader = asyncio.create_task(_request(middleware))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(_request(middleware))
+        await asyncio.sleep(0.05)
+        # The follower timed out and is now in the app too, behind the same gate.
+        assert app.calls == 2
+        app.release.set()
+        return await asyncio.gather(leader, follower)
+
+    assert asyncio.run(scenario()) == [(200, b"call 1"), (200, b"call 2")]
+    assert counters["wait_timeout"] == 1
+
+
+def test_key_does_not_build_a_request_without_replicas(monkeypatch):
+    def fail(request):
+        raise AssertionError("use_replica called")
+
+    monkeypatch.setattr(coalesce, "replicas", [])
+    monkeypatch.setattr(coalesce, "use_replica", fail)
+    assert coalesce._key(_scope())[-1] is False
@@ -0,0 +1,96 @@
+"""
+Validators must change with every write, including two writes within the
+same second (updated_at has second precision): a stale ETag must never get
+a 304.
+"""
+import pytest
+
+
+@pytest.fixture
+def truck(client, frozen_clock):
+    driver = client.post("/drivers", json={"driver_name": "Ada"}).json()
+    return client.post("/trucks", json={"unit_number": "T-1", "driver_id": driver["driver_id"]}).json()
+
+
+def _get(client, path, etag=None):
+    return client.get(path, headers={"If-None-Match": etag} if etag else {})
+
+
+@pytest.mark.parametrize("path", ["/trucks/{id}", "/trucks/{id}?fields=truck_id,unit_number"])
+def test_entity_etag_changes_within_the_same_second(client, truck, path):
+    path = path.format(id=truck["truck_id"])
+    before = _get(client, path)
+    assert _get(client, path, before.headers["ETag"]).status_code == 304
+
+    patched = client.patch(f"/trucks/{truck['truck_id']}", json={"unit_number": "T-2"}).json()
+    assert patched["updated_at"] == truck["updated_at"]
+
+    # Entity cache empty after the write: answered from the version probe.
+    after = _get(client, path, before.headers["ETag"])
+    assert after.status_code == 200
+    assert after.json()["unit_number"] == "T-2"
+    assert after.headers["ETag"] != before.headers["ETag"]
+    # Now cached: answered from the cache entry.
+    assert _get(client, path, before.headers["ETag"]).status_code == 200
+    assert _get(client, path, after.headers["ETag"]).status_code == 304
+
+
+def test_noop_patch_keeps_the_etag(client, truck):
+    path = f"/trucks/{truck['truck_id']}"
+    before = _get(client, path)
+    client.patch(path, json={"unit_number": truck["unit_number"]})
+    assert _get(client, path, before.headers["ETag"]).status_code == 304
+
+
+@pytest.mark.parametrize(
+    "write",
+    [
+        lambda client, truck: client.patch(f"/trucks/{truck['truck_id']}", json={"vin": "VIN-2"}),
+        lambda client, truck: client.delete(f"/trucks/{truck['truck_id']}"),
+        lambda client, truck: client.patch("/trucks/bulk", json={"items": [{"truck_id": truck["truck_id"], "vin": "VIN-2"}]}),
+        lambda client, truck: client.post("/trucks/bulk/deactivate", json={"ids": [truck["truck_id"]]}),
+    ],
+    ids=["patch", "delete", "bulk-update", "bulk-deactivate"],
+)
+@pytest.mark.parametrize("path", ["/trucks", "/trucks?fields=truck_id,vin", "/trucks?pagination=cursor"])
+def test_list_etag_changes_within_the_same_second(client, truck, path, write):
+    before = _get(client, path)
+    assert _get(client, path, before.headers["ETag"]).status_code == 304
+
+    assert write(client, truck).status_code == 200
+    assert client.get(f"/trucks/{truck['truck_id']}").json()["updated_at"] == truck["updated_at"]
+
+    after = _get(client, path, before.headers["ETag"])
+    assert after.status_code == 200
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert _get(client, path, after.headers["ETag"]).status_code == 304
+
+
+def test_expanded_list_etag_follows_driver_writes_within_the_same_second(client, truck):
+    path = "/trucks?expand=driver"
+    before = _get(client, path)
+
+    client.patch(f"/drivers/{truck['driver_id']}", json={"driver_name": "Grace"})
+
+    after = _get(client, path, before.headers["ETag"])
+    assert after.status_code == 200
+    assert after.json()["items"][0]["driver"]["driver_name"] == "Grace"
+
+
+def test_last_modified_is_only_sent_once_its_second_is_over(client, truck, frozen_clock):
+    path = f"/trucks/{truck['truck_id']}"
+    # Written in this second: a later write in the same second would share it.
+    assert "Last-Modified" not in client.get(path).headers
+    assert "Last-Modified" not in client.get("/trucks").headers
+
+    frozen_clock.tick()
+    response = client.get(path)
+    last_modified = response.headers["Last-Modified"]
+    assert client.get(path, headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    # Any later write is in a later second, so it moves Last-Modified.
+    client.patch(path, json={"unit_number": "T-2"})
+    after = client.get(path, headers={"If-Modified-Since": last_modified})
+    assert after.status_code == 200
+    assert after.json()["unit_number"] == "T-2"
+    assert "Last-Modified" not in after.headers
@@ -0,0 +1,76 @@
+import base64
+import json
+
+import pytest
+
+
+def _sync(client, path, updated_since):
+    """
+    A delta sync one row per page: (items, tombstones, high_water_mark), plus
+    the (updated_at, id) of every row in the order the pages returned them.
+    """
+    pk = path.strip("/")[:-1] + "_id"
+    params = {"updated_since": updated_since, "page_size": 1}
+    items, tombstones, order = [], [], []
+    while True:
+        body = client.get(path, params=params).json()
+        items.extend(body["items"])
+        tombstones.extend(body["tombstones"])
+        order.extend((row["updated_at"], row[pk]) for row in body["items"] + body["tombstones"])
+        if body["meta"]["next_cursor"] is None:
+            return items, tombstones, body["meta"]["high_water_mark"], order
+        assert body["meta"]["high_water_mark"] is None
+        params["cursor"] = body["meta"]["next_cursor"]
+
+
+def test_create_update_deactivate_round_trip(client, frozen_clock):
+    first = client.post("/trucks", json={"unit_number": "A"}).json()
+    second = client.post("/trucks", json={"unit_number": "B"}).json()
+    frozen_clock.tick(10)
+
+    items, tombstones, high_water_mark, _ = _sync(client, "/trucks", "2000-01-01T00:00:00Z")
+    assert [row["truck_id"] for row in items] == [first["truck_id"], second["truck_id"]]
+    assert tombstones == []
+
+    frozen_clock.tick(10)
+    client.patch(f"/trucks/{first['truck_id']}", json={"unit_number": "A2"})
+    frozen_clock.tick(1)
+    client.delete(f"/trucks/{second['truck_id']}")
+    frozen_clock.tick(1)
+    third = client.post("/trucks", json={"unit_number": "C"}).json()
+    frozen_clock.tick(10)
+
+    items, tombstones, _, order = _sync(client, "/trucks", high_water_mark)
+    assert [(row["truck_id"], row["unit_number"]) for row in items] == [(first["truck_id"], "A2"), (third["truck_id"], "C")]
+    assert [row["truck_id"] for row in tombstones] == [second["truck_id"]]
+    # One walk in (updated_at, id) order, tombstones included
+    assert order == sorted(order)
+    assert [truck_id for _, truck_id in order] == [first["truck_id"], second["truck_id"], third["truck_id"]]
+
+
+def test_high_water_mark_trails_by_the_settle_window(client, frozen_clock):
+    client.post("/drivers", json={"driver_name": "Ada"})
+    frozen_clock.tick(60)
+
+    _, _, high_water_mark, _ = _sync(client, "/drivers", "2000-01-01T00:00:00Z")
+    items, _, _, _ = _sync(client, "/drivers", high_water_mark)
+    assert items == []
+
+    driver = client.post("/drivers", json={"driver_name": "Grace"}).json()
+    items, _, _, _ = _sync(client, "/drivers", high_water_mark)
+    assert [row["driver_id"] for row in items] == [driver["driver_id"]]
+
+
+def _cursor(values, pk):
+    payload = {"s": f"updated_at,{pk}", "d": "next", "v": values}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("path, pk", [("/trucks", "truck_id"), ("/drivers", "driver_id")])
+@pytest.mark.parametrize("values", [["abc", 1], [[1], 1], [{"dt": "2024-01-01T00:00:00"}, "1"], [None, 1]])
+def test_malformed_delta_cursor_is_rejected(client, path, pk, values):
+    params = {"updated_since": "2000-01-01T00:00:00Z", "cursor": _cursor(values, pk)}
+    response = client.get(path, params=params)
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Invalid cursor"
+    assert client.get(path, params={**params, "fields": pk}).status_code == 422
@@ -0,0 +1,36 @@
+import time
+
+import pytest
+
+from config import settings
+from db import replica_may_lag
+from utils.invalidation import notify_commit, recent_write_window
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """time.monotonic() as seen by utils.invalidation and db, moved by hand."""
+    now = [time.monotonic()]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize(
+    "setting, value",
+    [("replica_max_lag_seconds", 120.0), ("replica_check_interval_seconds", 90.0), ("read_your_writes_seconds", 300.0)],
+)
+def test_row_writes_are_remembered_for_the_configured_window(monkeypatch, clock, setting, value):
+    monkeypatch.setattr(settings, setting, value)
+    window = recent_write_window()
+    assert window >= value
+
+    notify_commit("trucks", [1])
+    clock[0] += window - 1
+    # Another write prunes old entries: the first one is still inside the window.
+    notify_commit("trucks", [2])
+    assert replica_may_lag("trucks", 1)
+
+    clock[0] += 2
+    notify_commit("trucks", [3])
+    assert not replica_may_lag("trucks", 1)
+    assert replica_may_lag("trucks", 3)
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import pytest
+
+import routers.trucks_router as trucks_router
+from config import settings
+from db import SessionLocal
+from services.trucks_service import update_truck
+from utils.cache import list_cache
+from utils.conditional import store_list_page
+from utils.invalidation import notify_commit
+
+
+@pytest.fixture
+def truck(client):
+    driver = client.post("/drivers", json={"driver_name": "Ada"}).json()
+    return client.post("/trucks", json={"unit_number": "T-1", "driver_id": driver["driver_id"]}).json()
+
+
+def _hits():
+    return list_cache.stats()["hits"]
+
+
+def test_pages_are_served_from_the_cache_until_a_write(client, truck):
+    first = client.get("/trucks")
+    hits = _hits()
+    assert client.get("/trucks").content == first.content
+    assert _hits() == hits + 1
+
+    client.patch(f"/trucks/{truck['truck_id']}", json={"unit_number": "T-2"})
+    assert client.get("/trucks").json()["items"][0]["unit_number"] == "T-2"
+    assert _hits() == hits + 1
+
+
+def test_driver_writes_invalidate_expanded_truck_pages(client, truck):
+    client.get("/trucks?expand=driver")
+    client.get("/trucks")
+
+    client.patch(f"/drivers/{truck['driver_id']}", json={"driver_name": "Grace"})
+
+    hits = _hits()
+    expanded = client.get("/trucks?expand=driver").json()
+    assert expanded["items"][0]["driver"]["driver_name"] == "Grace"
+    assert _hits() == hits
+    # A page without the drivers does not depend on them: still cached.
+    client.get("/trucks")
+    assert _hits() == hits + 1
+
+
+def test_page_read_before_a_concurrent_commit_is_never_served(client, truck, monkeypatch):
+    original = trucks_router.list_trucks
+    raced = []
+
+    def list_then_commit(db, **params):
+        # The page is read, then another request's write commits before it is cached.
+        result = original(db, **params)
+        if not params.get("probe") and not raced:
+            raced.append(True)
+            with SessionLocal() as other:
+                update_truck(other, truck["truck_id"], "T-2", None, None, None)
+        return result
+
+    monkeypatch.setattr(trucks_router, "list_trucks", list_then_commit)
+    stale = client.get("/trucks")
+    assert stale.json()["items"][0]["unit_number"] == "T-1"
+
+    hits = _hits()
+    fresh = client.get("/trucks")
+    assert fresh.json()["items"][0]["unit_number"] == "T-2"
+    assert _hits() == hits
+
+
+@pytest.mark.parametrize("tables", [("trucks",), ("trucks", "drivers")])
+def test_replica_reads_that_may_lag_are_not_stored(client, monkeypatch, tables):
+    replica = SimpleNamespace(node=SimpleNamespace(is_replica=True))
+    primary = SimpleNamespace(node=SimpleNamespace(is_replica=False))
+    notify_commit(tables[-1], [1])
+    key = list_cache.key(tables, {"page": 1})
+
+    store_list_page(replica, key, tables, b"{}", {"ETag": 'W/"r"'})
+    assert list_cache.get(key) is None
+    # The primary has every committed write.
+    store_list_page(primary, key, tables, b"{}", {"ETag": 'W/"p"'})
+    assert list_cache.get(key).headers["ETag"] == 'W/"p"'
+
+    # Once the write is older than any replica's lag, replica reads are cached too.
+    monkeypatch.setattr(settings, "replica_max_lag_seconds", 0.0)
+    monkeypatch.setattr(settings, "replica_check_interval_seconds", 0.0)
+    monkeypatch.setattr(settings, "read_your_writes_seconds", 0.0)
+    store_list_page(replica, key, tables, b"{}", {"ETag": 'W/"r"'})
+    assert list_cache.get(key).headers["ETag"] == 'W/"r"'
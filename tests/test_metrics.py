@@ -0,0 +1,47 @@
+import main
+from config import settings
+from utils import metrics
+
+
+def _count(client, route, status):
+    prefix = f'http_request_duration_seconds_count{{method="GET",route="{route}",status="{status}"}} '
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(prefix):
+            return int(line[len(prefix):])
+    return 0
+
+
+def test_request_histograms_are_bound_once_per_route_and_status(client):
+    truck = client.post("/trucks", json={"unit_number": "T-1"}).json()
+    path = f"/trucks/{truck['truck_id']}"
+    before = _count(client, "/trucks/{truck_id}", 200)
+
+    client.get(path)
+    children = metrics._request_children["/trucks/{truck_id}"]["GET"][200]
+    bound = len(metrics.http_request_duration._children)
+    client.get(path)
+    client.get("/trucks/999999")
+
+    assert metrics._request_children["/trucks/{truck_id}"]["GET"][200] is children
+    # One more child for the 404, none for the repeated 200
+    assert len(metrics.http_request_duration._children) == bound + 1
+    assert _count(client, "/trucks/{truck_id}", 200) == before + 2
+    assert _count(client, "/trucks/{truck_id}", 404) >= 1
+
+
+def test_route_label_is_looked_up_once_per_request(client, monkeypatch):
+    calls = []
+
+    def counting_route_label(request):
+        calls.append(request.url.path)
+        return metrics.route_label(request)
+
+    monkeypatch.setattr(main, "route_label", counting_route_label)
+    # Every consumer of the label runs: slow log, statement budget warning, request log line.
+    monkeypatch.setattr(settings, "slow_request_ms", 0.001)
+    monkeypatch.setattr(settings, "sql_statement_budget", 1)
+    monkeypatch.setattr(settings, "log_success_sample_every", 1)
+
+    client.post("/trucks", json={"unit_number": "T-1"})
+    client.get("/trucks")
+    assert calls == ["/trucks", "/trucks"]
@@ -0,0 +1,155 @@
+import base64
+import json
+
+import pytest
+
+
+UNIT_NUMBERS = ["A", "B", "A", "C", "B", "A", "C", "B", "A", "C", "A"]
+PLATES = ["P1", None, "P2", None, "P1", "P3", None, "P2", None, "P1", "P3"]
+
+
+@pytest.fixture
+def fleet(client):
+    """Trucks with duplicate unit_numbers and NULL plate_numbers: (truck_id, unit_number, plate_number)."""
+    rows = []
+    for unit_number, plate_number in zip(UNIT_NUMBERS, PLATES):
+        truck = client.post("/trucks", json={"unit_number": unit_number, "plate_number": plate_number}).json()
+        rows.append((truck["truck_id"], unit_number, plate_number))
+    return rows
+
+
+def _walk(client, sort, page_size=3):
+    """Every page forward via next_cursor, then back via prev_cursor: (forward ids, backward ids)."""
+    params = {"pagination": "cursor", "sort": sort, "page_size": page_size}
+    pages = [client.get("/trucks", params=params).json()]
+    assert pages[0]["meta"]["prev_cursor"] is None
+    while pages[-1]["meta"]["next_cursor"]:
+        pages.append(client.get("/trucks", params=dict(params, cursor=pages[-1]["meta"]["next_cursor"])).json())
+    forward = [item["truck_id"] for page in pages for item in page["items"]]
+
+    backward = [item["truck_id"] for item in pages[-1]["items"]]
+    page = pages[-1]
+    while page["meta"]["prev_cursor"]:
+        page = client.get("/trucks", params=dict(params, cursor=page["meta"]["prev_cursor"])).json()
+        assert page["meta"]["next_cursor"] is not None
+        backward = [item["truck_id"] for item in page["items"]] + backward
+    return forward, backward
+
+
+@pytest.mark.parametrize(
+    "sort, key",
+    [
+        ("unit_number", lambda row: (row[1], row[0])),
+        ("-unit_number", lambda row: (row[1], row[0])),
+        # NULLs sort first ascending, last descending
+        ("plate_number", lambda row: (row[2] is not None, row[2] or "", row[0])),
+        ("-plate_number", lambda row: (row[2] is not None, row[2] or "", row[0])),
+        ("unit_number,-plate_number", None),
+    ],
+)
+def test_cursor_walk_has_no_duplicates_or_gaps(client, fleet, sort, key):
+    forward, backward = _walk(client, sort)
+
+    assert len(forward) == len(set(forward)) == len(fleet)
+    assert backward == forward
+    if key is not None:
+        expected = [row[0] for row in sorted(fleet, key=key, reverse=sort.startswith("-"))]
+        assert forward == expected
+    else:
+        offset = client.get("/trucks", params={"sort": sort, "page_size": 100}).json()
+        assert forward == [item["truck_id"] for item in offset["items"]]
+
+
+def test_cursor_walk_survives_inserts_between_pages(client, fleet):
+    params = {"pagination": "cursor", "sort": "unit_number", "page_size": 4}
+    first = client.get("/trucks", params=params).json()
+    seen = [item["truck_id"] for item in first["items"]]
+    # Sorts before the cursor: must neither shift the next page nor show up in it.
+    client.post("/trucks", json={"unit_number": "0"})
+
+    page = first
+    while page["meta"]["next_cursor"]:
+        page = client.get("/trucks", params=dict(params, cursor=page["meta"]["next_cursor"])).json()
+        seen.extend(item["truck_id"] for item in page["items"])
+    assert len(seen) == len(set(seen)) == len(fleet)
+
+
+def _cursor_payload(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+
+
+def _cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_invalid_cursor_is_rejected(client, fleet):
+    for cursor in ("not-a-cursor", "e30", _cursor([1, 2]), _cursor({"s": "unit_number,truck_id", "d": "next"})):
+        response = client.get("/trucks", params={"sort": "unit_number", "cursor": cursor})
+        assert response.status_code == 422, cursor
+        assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_tampered_cursor_is_rejected(client, fleet):
+    cursor = client.get("/trucks", params={"pagination": "cursor", "sort": "unit_number", "page_size": 2}).json()["meta"]["next_cursor"]
+    payload = _cursor_payload(cursor)
+
+    for tampered in (
+        dict(payload, d="sideways"),
+        dict(payload, v=payload["v"][:1]),
+        dict(payload, s="vin,truck_id"),
+    ):
+        response = client.get("/trucks", params={"sort": "unit_number", "cursor": _cursor(tampered)})
+        assert response.status_code == 422, tampered
+        assert response.json()["detail"] == "Cursor does not match the requested sort"
+
+
+def test_cursor_with_a_different_sort_is_rejected(client, fleet):
+    cursor = client.get("/trucks", params={"pagination": "cursor", "sort": "unit_number", "page_size": 2}).json()["meta"]["next_cursor"]
+
+    for sort in ("-unit_number", "vin", "unit_number,created_at", None):
+        params = {"cursor": cursor, **({"sort": sort} if sort else {})}
+        response = client.get("/trucks", params=params)
+        assert response.status_code == 422, sort
+        assert response.json()["detail"] == "Cursor does not match the requested sort"
+
+
+@pytest.mark.parametrize(
+    "sort, values",
+    [
+        ("created_at", ["abc", 1]),
+        ("created_at", [[1], 1]),
+        ("created_at", [{"dt": 5}, 1]),
+        ("created_at", [{"dt": "not a date"}, 1]),
+        ("created_at", [None, 1]),
+        ("created_at", [{"dt": "2024-01-01T00:00:00"}, "1"]),
+        ("created_at", [{"dt": "2024-01-01T00:00:00"}, True]),
+        ("created_at", [{"dt": "2024-01-01T00:00:00"}, 1.5]),
+        ("created_at", [{"dt": "2024-01-01T00:00:00"}, 2**64]),
+        ("unit_number", [5, 1]),
+        ("unit_number", [None, 1]),
+        ("unit_number", [{"dt": "2024-01-01T00:00:00"}, 1]),
+        ("is_active", [1, 1]),
+        ("is_active", ["true", 1]),
+        ("driver_id", [[], 1]),
+    ],
+)
+def test_cursor_values_of_the_wrong_type_are_rejected(client, fleet, sort, values):
+    cursor = _cursor({"s": f"{sort},truck_id", "d": "next", "v": values})
+    response = client.get("/trucks", params={"sort": sort, "cursor": cursor})
+    assert response.status_code == 422, values
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize(
+    "sort, values",
+    [
+        ("created_at", [{"dt": "2000-01-01T00:00:00"}, 1]),
+        ("plate_number", [None, 1]),
+        ("is_active", [False, 1]),
+        ("driver_id", [None, 1]),
+    ],
+)
+def test_client_built_cursors_of_the_right_types_are_accepted(client, fleet, sort, values):
+    cursor = _cursor({"s": f"{sort},truck_id", "d": "next", "v": values})
+    response = client.get("/trucks", params={"sort": sort, "cursor": cursor})
+    assert response.status_code == 200
@@ -0,0 +1,33 @@
+import pytest
+
+from services.search_index import contains_clause, fold, trigrams
+
+
+@pytest.fixture
+def fleet(client):
+    names = ["AB_C-100", "ABXC-200", "ab%c-300", "José Straße", "JOSE STRASSE"]
+    return {name: client.post("/trucks", json={"unit_number": name}).json()["truck_id"] for name in names}
+
+
+def _search(client, **params):
+    return sorted(item["unit_number"] for item in client.get("/trucks", params={"page_size": 100, **params}).json()["items"])
+
+
+@pytest.mark.parametrize("term", ["b_c", "B%C", "ab\\", "_c-", "%", "c-1", "C-2", "osé", "OSE", "strasse", "STRASSE", "traß"])
+def test_results_do_not_depend_on_the_index(client, fleet, monkeypatch, term):
+    indexed = _search(client, unit_number_contains=term)
+    monkeypatch.setattr("services.search_index.settings.search_index_enabled", False)
+    assert _search(client, unit_number_contains=term, sort="unit_number") == indexed
+
+
+def test_like_wildcards_skip_the_index():
+    for term in ("b_c", "b%c", "ab\\c"):
+        assert contains_clause("trucks", ("unit_number",), term) is None
+    assert contains_clause("trucks", ("unit_number",), "abc") is not None
+
+
+def test_grams_fold_case_and_accents():
+    assert fold("JOSÉ Straße") == "jose strasse"
+    assert trigrams("Osé") == trigrams("OSE") == {"ose"}
+    # A term's grams are a subset of those of every value a case/accent-insensitive collation matches.
+    assert trigrams("strasse") <= trigrams("Straße")
@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql
+
+from models import Truck
+from utils.count_cache import count_cache, normalize_filters
+from utils.query import _estimated_total
+
+
+@pytest.fixture
+def fleet(client):
+    for i in range(7):
+        client.post("/trucks", json={"unit_number": f"T-{i}", "is_active": i % 2 == 0})
+
+
+def _meta(client, **params):
+    return client.get("/trucks", params={"page_size": 2, **params}).json()["meta"]
+
+
+def _counts(statements):
+    return sum(1 for sql in statements if "count(" in sql.lower())
+
+
+def test_total_modes(client, fleet):
+    exact = _meta(client)
+    assert (exact["total"], exact["total_pages"], exact["total_exact"]) == (7, 4, True)
+
+    none = _meta(client, total="none")
+    assert (none["total"], none["total_pages"], none["total_exact"]) == (None, None, None)
+    # Cursor pages skip the count unless asked for.
+    assert _meta(client, pagination="cursor")["total"] is None
+    assert _meta(client, pagination="cursor", total="exact")["total"] == 7
+
+
+@pytest.mark.parametrize("filters", [{}, {"is_active": "true"}])
+def test_estimate_falls_back_to_an_exact_count_on_sqlite(client, fleet, filters):
+    meta = _meta(client, total="estimate", **filters)
+    assert meta["total"] == (4 if filters else 7)
+    assert meta["total_exact"] is True
+
+
+def test_counts_are_cached_per_filter_until_a_write(client, fleet, statements):
+    assert _meta(client, is_active="true")["total"] == 4
+    assert _counts(statements) == 1
+
+    # Another page (not in the list cache) of the same filters: no new count
+    assert _meta(client, is_active="true", page=2)["total"] == 4
+    assert _meta(client, is_active="true", page=2, total="estimate")["total"] == 4
+    assert _counts(statements) == 1
+    # Other filters have their own count
+    assert _meta(client, is_active="false")["total"] == 3
+    assert _counts(statements) == 2
+
+    client.post("/trucks", json={"unit_number": "T-7"})
+    assert _meta(client, is_active="true", page=2)["total"] == 5
+    assert _counts(statements) == 3
+
+
+def test_a_count_that_raced_with_a_write_is_not_cached(client):
+    key = normalize_filters({"is_active": True})
+    generation = count_cache.generation("trucks")
+    count_cache.invalidate("trucks")
+
+    count_cache.set("trucks", key, 4, generation)
+    assert count_cache.get("trucks", key) is None
+    count_cache.set("trucks", key, 4, count_cache.generation("trucks"))
+    assert count_cache.get("trucks", key) == 4
+
+
+def test_mysql_explain_gets_positional_parameters():
+    query = select(Truck).where(Truck.unit_number.ilike("%a%"), Truck.driver_id == 3)
+    sent = []
+
+    class Connection:
+        def exec_driver_sql(self, statement, parameters):
+            sent.append((statement, parameters))
+            return SimpleNamespace(mappings=lambda: SimpleNamespace(first=lambda: {"rows": 40, "filtered": 25.0}))
+
+    dialect = mysql.pymysql.dialect()
+    db = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=dialect), connection=Connection)
+
+    assert _estimated_total(db, query, filtered=True) == 10
+    statement, parameters = sent[0]
+    assert statement.startswith("EXPLAIN SELECT")
+    assert statement.count("%s") == len(parameters) == 2
+    assert parameters == ("%a%", 3)
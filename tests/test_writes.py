@@ -0,0 +1,91 @@
+"""
+SQL statements per single-row write: no SELECT before the write, and no
+refresh after the commit (utils/writes.update_by_pk, app-side timestamps).
+"""
+import pytest
+
+from db import async_engine, engine
+
+
+@pytest.fixture(params=["returning", "reload"])
+def update_path(request, monkeypatch):
+    """UPDATE ... RETURNING (SQLite, PostgreSQL), or UPDATE then one SELECT (MySQL; forced here)."""
+    if request.param == "reload":
+        for target in [engine] if async_engine is None else [engine, async_engine.sync_engine]:
+            monkeypatch.setattr(target.dialect, "update_returning", False)
+    return request.param
+
+
+def _kinds(sent):
+    """Each statement as "UPDATE trucks", "SELECT trucks", "INSERT INTO change_events"..., in order."""
+    kinds = []
+    for statement in sent:
+        words = statement.split()
+        if words[0] == "SELECT":
+            kinds.append("SELECT " + words[words.index("FROM") + 1])
+        else:
+            kinds.append(" ".join(words[:3 if words[0] in ("INSERT", "DELETE") else 2]))
+    return kinds
+
+
+def _update(table, update_path):
+    return [f"UPDATE {table}"] if update_path == "returning" else [f"UPDATE {table}", f"SELECT {table}"]
+
+
+def test_create_is_one_insert_per_table(client, statements):
+    driver = client.post("/drivers", json={"driver_name": "Ada"})
+    assert driver.status_code == 201
+    assert _kinds(statements) == ["INSERT INTO drivers", "INSERT INTO search_trigrams", "INSERT INTO change_events"]
+
+    statements.clear()
+    truck = client.post("/trucks", json={"unit_number": "T-100", "driver_id": driver.json()["driver_id"]})
+    assert truck.status_code == 201
+    assert truck.json()["created_at"] == truck.json()["updated_at"]
+    assert _kinds(statements) == ["INSERT INTO trucks", "INSERT INTO search_trigrams", "INSERT INTO change_events"]
+
+
+def test_patch_updates_without_loading_the_row(client, statements, update_path):
+    truck = client.post("/trucks", json={"unit_number": "T-100"}).json()
+
+    statements.clear()
+    patched = client.patch(f"/trucks/{truck['truck_id']}", json={"is_active": False})
+    assert patched.status_code == 200
+    assert patched.json()["is_active"] is False
+    assert _kinds(statements) == [*_update("trucks", update_path), "INSERT INTO change_events"]
+    if update_path == "returning":
+        assert " RETURNING " in statements[0]
+
+    # A searchable field also rewrites the row's trigrams.
+    statements.clear()
+    patched = client.patch(f"/trucks/{truck['truck_id']}", json={"unit_number": "T-200"})
+    assert patched.json()["unit_number"] == "T-200"
+    assert _kinds(statements) == [
+        *_update("trucks", update_path),
+        "DELETE FROM search_trigrams",
+        "INSERT INTO search_trigrams",
+        "INSERT INTO change_events",
+    ]
+
+    statements.clear()
+    patched = client.patch("/drivers/1", json={"driver_name": "Grace"})
+    assert patched.status_code == 404
+    assert _kinds(statements) == ["UPDATE drivers"]
+
+
+def test_delete_is_one_update(client, statements, update_path):
+    driver = client.post("/drivers", json={"driver_name": "Ada"}).json()
+    truck = client.post("/trucks", json={"unit_number": "T-100"}).json()
+
+    statements.clear()
+    deleted = client.delete(f"/trucks/{truck['truck_id']}")
+    assert deleted.json()["is_active"] is False
+    assert _kinds(statements) == [*_update("trucks", update_path), "INSERT INTO change_events"]
+
+    statements.clear()
+    deleted = client.delete(f"/drivers/{driver['driver_id']}")
+    assert deleted.json()["is_active"] is False
+    assert _kinds(statements) == [*_update("drivers", update_path), "INSERT INTO change_events"]
+
+    statements.clear()
+    assert client.delete(f"/trucks/{truck['truck_id'] + 1}").status_code == 404
+    assert _kinds(statements) == ["UPDATE trucks"]
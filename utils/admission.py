@@ -0,0 +1,189 @@
+"""
+Admission control in front of the connection pool.
+
+Requests are admitted per group (reads: GET/HEAD and the POST lookups,
+writes: everything else) up to a concurrency limit derived from the pool
+settings, so a spike queues here, briefly and in bounded numbers, instead of
+piling up on pool checkouts until every request times out. A request that
+finds the wait queue full, or is still queued after admission_queue_timeout_ms,
+gets a 503 with Retry-After right away.
+
+Health, metrics and admin endpoints are never held back.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import settings
+from db import is_read, replicas
+from utils.request_context import get_request_id
+
+# Ops endpoints, and SSE streams (long-lived; they share one outbox reader instead of a connection each)
+EXEMPT_PATHS = ("/health", "/db-health", "/metrics", "/admin", "/admission", "/cache-stats", "/docs", "/redoc", "/openapi.json", "/changes/stream")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, group: str, reason: str):
+        super().__init__(f"{group}: {reason}")
+        self.group = group
+        self.reason = reason
+
+
+class AdmissionGate:
+    """
+    At most `limit` holders; up to `max_queue` more wait in FIFO order for at
+    most `timeout` seconds. Used from the event loop only, so no lock.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, timeout: float):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.active = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "queue_timeout": 0}
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            self._reject("queue_timeout")
+        except BaseException:
+            # Cancelled after release() handed us the slot: pass it on.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.admitted += 1
+
+    def release(self) -> None:
+        # Hand the slot straight to the next waiter: `active` stays at the
+        # limit, so a newcomer cannot take the slot ahead of the queue.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _reject(self, reason: str) -> None:
+        self.rejected[reason] += 1
+        raise AdmissionRejected(self.name, reason)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "queue_timeout_ms": round(self.timeout * 1000),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+
+def pool_capacity() -> int:
+    """Connections one node's pool can hand out at once."""
+    return settings.db_pool_size + settings.db_max_overflow
+
+
+def _gate(name: str, configured: int, derived: int) -> AdmissionGate:
+    limit = configured or derived
+    return AdmissionGate(
+        name,
+        limit,
+        settings.admission_queue_size or limit,
+        settings.admission_queue_timeout_ms / 1000,
+    )
+
+
+# Reads spread over the primary and the replicas; writes only use the
+# primary and leave its overflow connections to the reads.
+gates = {
+    "read": _gate("read", settings.admission_read_limit, pool_capacity() * (1 + len(replicas))),
+    "write": _gate("write", settings.admission_write_limit, settings.db_pool_size),
+}
+
+
+def admission_stats() -> Dict[str, Any]:
+    return {
+        "enabled": settings.admission_enabled,
+        "pool": {
+            "size": settings.db_pool_size,
+            "max_overflow": settings.db_max_overflow,
+            "timeout_seconds": settings.db_pool_timeout_seconds,
+            "nodes": 1 + len(replicas),
+        },
+        "groups": {name: gate.stats() for name, gate in gates.items()},
+    }
+
+
+def _group(scope: Scope) -> Optional[str]:
+    if scope["type"] != "http" or not settings.admission_enabled:
+        return None
+    if scope["path"].startswith(EXEMPT_PATHS):
+        return None
+    return "read" if is_read(scope["method"], scope["path"]) else "write"
+
+
+def _rejection(exc: AdmissionRejected) -> JSONResponse:
+    req_id = get_request_id()
+    return JSONResponse(
+        status_code=503,
+        content={
+            "request_id": req_id,
+            "error": {
+                "code": "overloaded",
+                "message": f"Server is at capacity for {exc.group} requests ({exc.reason.replace('_', ' ')}), retry later",
+            },
+        },
+        headers={"Retry-After": str(max(1, math.ceil(settings.admission_retry_after_seconds))), "X-Request-ID": req_id},
+    )
+
+
+class AdmissionMiddleware:
+    """
+    Plain ASGI middleware (not @app.middleware) so the slot is held until the
+    response body is sent: streamed exports keep their connection that long.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        name = _group(scope)
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+        gate = gates[name]
+        try:
+            await gate.acquire()
+        except AdmissionRejected as exc:
+            await _rejection(exc)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Type, TypeVar
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import inspect
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from config import settings
+from utils.writes import is_foreign_key_violation
+
+M = TypeVar("M", bound=BaseModel)
+T = TypeVar("T")
+
+logger = logging.getLogger("fem_api.bulk")
+
+# Errors that belong to one row; anything else (connection loss, deadlock...) aborts the whole request.
+ROW_ERRORS = (IntegrityError, DataError)
+
+
+@dataclass
+class BulkOutcome:
+    index: int
+    entity: Optional[Any] = None
+    error: Optional[Dict[str, Any]] = None
+
+
+def chunked(items: Sequence[T], size: int) -> Iterator[Sequence[T]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def item_error(code: str, message: str, details: Any = None) -> Dict[str, Any]:
+    error: Dict[str, Any] = {"code": code, "message": message}
+    if details is not None:
+        error["details"] = details
+    return error
+
+
+def check_bulk_size(count: int) -> None:
+    if count > settings.bulk_max_items:
+        raise HTTPException(status_code=413, detail=f"At most {settings.bulk_max_items} items per bulk request")
+
+
+def validate_items(raw_items: List[Dict[str, Any]], model: Type[M]) -> Tuple[List[Tuple[int, M]], List[BulkOutcome]]:
+    """
+    Validates every item against the single-item schema.
+    Returns (valid (index, payload) pairs, outcomes for the invalid ones).
+    """
+    valid: List[Tuple[int, M]] = []
+    invalid: List[BulkOutcome] = []
+    for index, raw in enumerate(raw_items):
+        try:
+            valid.append((index, model.model_validate(raw)))
+        except ValidationError as exc:
+            details = exc.errors(include_url=False, include_context=False, include_input=False)
+            invalid.append(BulkOutcome(index, error=item_error("validation_error", "Validation failed", details)))
+    return valid, invalid
+
+
+def row_error(exc: Exception, missing_parent: Optional[str] = None) -> Dict[str, Any]:
+    """
+    The item error for a row the database rejected. The driver's message names
+    tables, constraints and values, so it is only logged; a foreign key
+    violation is reported as `missing_parent`, like the single-row endpoints do.
+    """
+    logger.info("bulk row rejected: %s", getattr(exc, "orig", exc))
+    if missing_parent is not None and isinstance(exc, IntegrityError) and is_foreign_key_violation(exc):
+        return item_error("not_found", missing_parent)
+    return item_error("integrity_error", "Conflicts with existing data or a database constraint")
+
+
+def run_batch(
+    db: Session,
+    ops: List[Tuple[int, Callable[[Session], Any]]],
+    missing_parent: Optional[str] = None,
+) -> List[BulkOutcome]:
+    """
+    Applies one batch of row operations inside a SAVEPOINT and flushes them
+    together. If the batch is rejected by the database, it is replayed one row
+    per SAVEPOINT so only the offending rows are reported as failed (see
+    `row_error`).
+
+    Each op mutates the session (add or set attributes) and returns the entity.
+    """
+    try:
+        with db.begin_nested():
+            entities = [op(db) for _, op in ops]
+        return [BulkOutcome(index, entity=entity) for (index, _), entity in zip(ops, entities)]
+    except ROW_ERRORS:
+        pass
+
+    outcomes: List[BulkOutcome] = []
+    for index, op in ops:
+        try:
+            with db.begin_nested():
+                entity = op(db)
+            # The batch rollback expired the entity; reload what the op did not set.
+            if inspect(entity).expired_attributes:
+                db.refresh(entity)
+            outcomes.append(BulkOutcome(index, entity=entity))
+        except ROW_ERRORS as exc:
+            outcomes.append(BulkOutcome(index, error=row_error(exc, missing_parent)))
+    return outcomes
+
+
+def summarize(outcomes: List[BulkOutcome]) -> Dict[str, Any]:
+    """Shapes outcomes as a *BulkResponse body, in request order."""
+    ordered = sorted(outcomes, key=lambda o: o.index)
+    failed = sum(1 for o in ordered if o.error is not None)
+    return {
+        "succeeded": len(ordered) - failed,
+        "failed": failed,
+        "results": [
+            {"index": o.index, "ok": o.error is None, "item": o.entity, "error": o.error}
+            for o in ordered
+        ],
+    }
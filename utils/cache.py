@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence, Tuple, Type
+
+from pydantic import BaseModel
+
+from config import settings
+from utils.invalidation import on_commit
+
+
+class CacheBackend(ABC):
+    """
+    Storage for serialized values. Keys are str, values are bytes, so a shared
+    backend (Redis, memcached...) can implement the same interface without
+    knowing about the schemas.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, *keys: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        ...
+
+
+class NullCache(CacheBackend):
+    """Caches nothing; every get is a miss."""
+
+    def __init__(self) -> None:
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: bytes) -> None:
+        pass
+
+    def delete(self, *keys: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": 0, "misses": self.misses, "evictions": 0, "expirations": 0, "entries": 0, "bytes": 0}
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process LRU with a TTL, bounded by entry count and by total bytes
+    (key + value). Least recently used entries are evicted first.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _size(key: str, value: bytes) -> int:
+        return len(key) + len(value)
+
+    def _drop(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._bytes -= self._size(key, value)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        size = self._size(key, value)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+def build_backend(name: str, max_entries: int, max_bytes: int, ttl_seconds: float) -> CacheBackend:
+    if name == "memory":
+        return MemoryCache(max_entries=max_entries, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+    if name == "none":
+        return NullCache()
+    raise ValueError(f"Unknown cache backend: {name}")
+
+
+@dataclass
+class CachedEntity:
+    body: bytes
+    updated_at: datetime
+    version: int
+
+
+class EntityCache:
+    """
+    Read-through cache of single-entity response bodies (the JSON of TruckOut,
+    DriverOut...), keyed "<table>:<id>". The entity's updated_at and version are
+    stored with the body so conditional GETs can be answered from the cache alone.
+
+    Writes reach it through utils.invalidation after commit. Like CountCache,
+    each table has a generation bumped on every write; a body loaded while a
+    write to the same table committed is returned but not stored, so a read
+    racing an update cannot put the old row back into the cache.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(table: str, entity_id: Any) -> str:
+        return f"{table}:{entity_id}"
+
+    def peek(self, table: str, entity_id: Any) -> Optional[CachedEntity]:
+        value = self.backend.get(self.key(table, entity_id))
+        if value is None:
+            return None
+        header, body = value.split(b"\n", 1)
+        updated_at, version = header.decode().split(" ")
+        return CachedEntity(body=body, updated_at=datetime.fromisoformat(updated_at), version=int(version))
+
+    def generation(self, table: str) -> int:
+        return self._generations.get(table, 0)
+
+    @staticmethod
+    def serialize(entity: Any, schema: Type[BaseModel]) -> CachedEntity:
+        return CachedEntity(
+            body=schema.model_validate(entity).model_dump_json().encode(), updated_at=entity.updated_at, version=entity.version
+        )
+
+    def store(self, table: str, entity_id: Any, cached: CachedEntity, generation: int) -> None:
+        """Stores an entry loaded while the table was at `generation`; skipped if a write committed since."""
+        if self._generations.get(table, 0) != generation:
+            return
+        # Compact JSON never contains a raw newline, so it separates the header ("<updated_at> <version>").
+        header = f"{cached.updated_at.isoformat()} {cached.version}".encode()
+        self.backend.set(self.key(table, entity_id), header + b"\n" + cached.body)
+
+    def invalidate(self, table: str, ids: Sequence[Any] = ()) -> None:
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+        if ids:
+            self.backend.delete(*[self.key(table, entity_id) for entity_id in ids])
+        else:
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return self.backend.stats()
+
+
+entity_cache = EntityCache(
+    build_backend(
+        settings.entity_cache_backend,
+        settings.entity_cache_max_entries,
+        settings.entity_cache_max_bytes,
+        settings.entity_cache_ttl_seconds,
+    )
+)
+
+
+@dataclass
+class CachedPage:
+    body: bytes
+    # The page's validators (ETag, Last-Modified)
+    headers: Dict[str, str]
+
+
+class ListCache:
+    """
+    Serialized list pages, keyed by the normalized request (filters, sort,
+    page/cursor, page_size, fields...) and by the generation of every table
+    the page was read from. Writes bump their table's generation after
+    commit, so the next lookup misses without scanning any entry; pages of
+    old generations are never read again and age out of the LRU.
+
+    A page read while a write committed is stored under the generation taken
+    before the read, which that write has already superseded (or is about to):
+    no request sees it.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def key(self, tables: Sequence[str], params: Any) -> str:
+        """`params`: a hashable, normalized form of the request (see normalize_filters)."""
+        generations = ",".join(f"{table}@{self._generations.get(table, 0)}" for table in tables)
+        return f"list:{generations}:{json.dumps(params, separators=(',', ':'), default=str)}"
+
+    def get(self, key: str) -> Optional[CachedPage]:
+        value = self.backend.get(key)
+        if value is None:
+            return None
+        headers, body = value.split(b"\n", 1)
+        return CachedPage(body=body, headers=json.loads(headers))
+
+    def store(self, key: str, page: CachedPage) -> None:
+        # Compact JSON never contains a raw newline, so it separates the header.
+        self.backend.set(key, json.dumps(page.headers, separators=(",", ":")).encode() + b"\n" + page.body)
+
+    def invalidate(self, table: str) -> None:
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+
+    def stats(self) -> Dict[str, int]:
+        return self.backend.stats()
+
+
+list_cache = ListCache(
+    build_backend(
+        settings.list_cache_backend,
+        settings.list_cache_max_entries,
+        settings.list_cache_max_bytes,
+        settings.list_cache_ttl_seconds,
+    )
+)
+
+
+@on_commit
+def _invalidate_entities(table: str, ids: Sequence[int]) -> None:
+    entity_cache.invalidate(table, ids)
+    list_cache.invalidate(table)
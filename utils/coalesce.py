@@ -0,0 +1,151 @@
+"""
+Single-flight for identical concurrent reads.
+
+When many clients send the same GET at once (shift change: hundreds of
+GET /trucks?is_active=true within a few milliseconds), the first request runs
+and the others wait for its response instead of each running the same count
+and page queries. Requests are identical when they have the same method,
+path, query parameters (in any order), conditional headers and read target
+(replica or primary, see db.use_replica).
+
+A request only joins a flight if no write committed in this process since
+the flight started, so it never gets a response older than a write it could
+have read. A waiter that has not been answered after coalesce_max_wait_ms
+runs on its own, and so does every waiter when the leader fails or answers
+with a 5xx.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+from db import replicas, use_replica
+from utils.invalidation import on_commit
+from utils.slow_log import PROFILE_HEADER
+
+# Ops endpoints, and streamed responses (exports, SSE) that must not be buffered
+EXEMPT_PATHS = ("/health", "/db-health", "/metrics", "/admin", "/admission", "/cache-stats", "/docs", "/redoc", "/openapi.json", "/changes/stream")
+STREAMED_SUFFIXES = ("/export",)
+
+FlightKey = Tuple[Any, ...]
+
+_commits = itertools.count(1)
+# Bumped by every committed write; a flight is only joined within one generation.
+_generation = 0
+
+
+@on_commit
+def _next_generation(table: str, ids: Sequence[int]) -> None:
+    global _generation
+    _generation = next(_commits)
+
+
+class Flight:
+    def __init__(self) -> None:
+        self.generation = _generation
+        self.waiters = 0
+        # (response start message, body), or None when the response cannot be shared
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+flights: Dict[FlightKey, Flight] = {}
+counters: Dict[str, int] = {"led": 0, "coalesced": 0, "wait_timeout": 0, "not_shared": 0}
+
+
+def coalesce_stats() -> Dict[str, Any]:
+    return {"enabled": settings.coalesce_enabled, "in_flight": len(flights), **counters}
+
+
+def _key(scope: Scope) -> Optional[FlightKey]:
+    if scope["type"] != "http" or not settings.coalesce_enabled or scope["method"] not in ("GET", "HEAD"):
+        return None
+    path = scope["path"]
+    if path.startswith(EXEMPT_PATHS) or path.endswith(STREAMED_SUFFIXES):
+        return None
+    headers = Headers(scope=scope)
+    if headers.get(PROFILE_HEADER):
+        return None
+    query = tuple(sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)))
+    # Without replicas every read goes to the primary: no Request to build.
+    return (
+        scope["method"],
+        path,
+        query,
+        headers.get("if-none-match"),
+        headers.get("if-modified-since"),
+        bool(replicas) and use_replica(Request(scope)),
+    )
+
+
+class CoalescingMiddleware:
+    """
+    Plain ASGI middleware. It sits outside AdmissionMiddleware, so waiters do
+    not hold admission slots, and inside the request-ID/timing middleware, so
+    each waiter is still logged and counted as its own request.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        key = _key(scope)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        flight = flights.get(key)
+        if flight is not None and flight.generation == _generation:
+            if await self._follow(flight, send):
+                return
+            await self.app(scope, receive, send)
+            return
+        await self._lead(key, scope, receive, send)
+
+    async def _follow(self, flight: Flight, send: Send) -> bool:
+        """Sends the leader's response; False if this request has to run on its own."""
+        flight.waiters += 1
+        try:
+            result = await asyncio.wait_for(asyncio.shield(flight.result), settings.coalesce_max_wait_ms / 1000)
+        except asyncio.TimeoutError:
+            counters["wait_timeout"] += 1
+            return False
+        if result is None:
+            counters["not_shared"] += 1
+            return False
+        start, body = result
+        counters["coalesced"] += 1
+        await send({"type": "http.response.start", "status": start["status"], "headers": list(start["headers"])})
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+        return True
+
+    async def _lead(self, key: FlightKey, scope: Scope, receive: Receive, send: Send) -> None:
+        flight = flights[key] = Flight()
+        counters["led"] += 1
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        complete = False
+
+        async def capture(message: Message) -> None:
+            nonlocal start, complete
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                complete = not message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            if flights.get(key) is flight:
+                del flights[key]
+            shareable = complete and start is not None and start["status"] < 500
+            # Nobody can join any more: only build the body if someone is waiting.
+            flight.result.set_result((start, b"".join(chunks)) if shareable and flight.waiters else None)
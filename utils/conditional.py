@@ -0,0 +1,186 @@
+"""
+ETag / Last-Modified validators and conditional GET handling.
+
+Validators are derived from row versions (id + version column, bumped by
+every UPDATE), not from the response bytes, so they can be checked before a
+body is loaded or serialized. updated_at is only the Last-Modified date: it
+has second precision, so two writes within one second share it, and it is
+only sent once its second is over.
+
+- single entity: the cached entry, else a `SELECT updated_at, version` probe
+  (or the projected row itself for a sparse fieldset);
+- list: the cached page (see ListCache), else the page window (ids,
+  versions, total, cursors) fetched with only the columns needed, before
+  the full page query runs.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Type
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from db import DBSession, replica_may_lag
+from models import utcnow
+from utils.cache import CachedEntity, CachedPage, entity_cache, list_cache
+from utils.metrics import timed_serialization
+from utils.query import PaginationResult
+from utils.serialization import dumps, row_dicts
+
+
+def _etag(material: Any) -> str:
+    digest = hashlib.sha1(json.dumps(material, separators=(",", ":"), default=str).encode()).hexdigest()
+    # Weak: equal validators mean the same row versions, not byte-identical bodies.
+    return f'W/"{digest[:20]}"'
+
+
+def _http_date(value: datetime) -> str:
+    # Stored timestamps are naive UTC.
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def validators(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    headers = {"ETag": etag}
+    # Within its own second a Last-Modified could also be that of a later write
+    # in the same second, and If-Modified-Since would then confirm a stale copy:
+    # it is only sent once that second is over (RFC 9110 8.8.2.2).
+    if last_modified is not None and last_modified.replace(microsecond=0) < utcnow():
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+
+def entity_validators(table: str, entity_id: Any, updated_at: datetime, version: int) -> Dict[str, str]:
+    return validators(_etag([table, entity_id, version, updated_at.isoformat()]), updated_at)
+
+
+def list_validators(result: PaginationResult, pk: str) -> Dict[str, str]:
+    """
+    Validators for one page. `result.items` may be ORM objects or probe rows;
+    both expose the pk, updated_at and version attributes.
+    """
+    versions = [[getattr(item, pk), item.version, item.updated_at.isoformat()] for item in result.items]
+    material = [versions, result.total, result.total_exact, result.next_cursor, result.prev_cursor]
+    updated = [item.updated_at for item in result.items]
+    # Expanded relations are part of the body: their rows' versions count too.
+    for name, rows in sorted(result.related.items()):
+        material.append([name, sorted([str(value) for value in row] for row in rows)])
+        updated.extend(row.updated_at for row in rows)
+    return validators(_etag(material), max(updated, default=None))
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def _strip_weak(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def not_modified(request: Request, headers: Dict[str, str]) -> bool:
+    """
+    RFC 9110 evaluation for GET/HEAD: If-None-Match (weak comparison) wins;
+    If-Modified-Since is only consulted when no If-None-Match was sent.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return False
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        etag = _strip_weak(headers["ETag"])
+        return any(_strip_weak(tag.strip()) == etag for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = headers.get("Last-Modified")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False
+        return parsedate_to_datetime(last_modified) <= since
+    return False
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+def cached_list_response(request: Request, page: CachedPage) -> Response:
+    if not_modified(request, page.headers):
+        return not_modified_response(page.headers)
+    return Response(content=page.body, media_type="application/json", headers=page.headers)
+
+
+def store_list_page(db: DBSession, key: str, tables: Sequence[str], body: bytes, headers: Dict[str, str]) -> None:
+    # A replica read of a table this process just wrote may predate the write.
+    if db.node.is_replica and any(replica_may_lag(table) for table in tables):
+        return
+    list_cache.store(key, CachedPage(body=body, headers=headers))
+
+
+async def entity_response(
+    request: Request,
+    db: DBSession,
+    table: str,
+    entity_id: Any,
+    load: Callable[[Session, Any], Any],
+    probe: Callable[[Session, Any], Any],
+    schema: Type[BaseModel],
+) -> Response:
+    """
+    GET of one entity through the entity cache, answering conditional requests
+    with 304 as early as possible: from the cached entry, else from `probe`
+    (the row's updated_at and version), and only then loading and serializing
+    the row with `load`. Both are service functions run via `db.run`.
+    """
+    cached: Optional[CachedEntity] = entity_cache.peek(table, entity_id)
+    if cached is None:
+        if is_conditional(request):
+            row = await db.run(probe, entity_id)
+            headers = entity_validators(table, entity_id, row.updated_at, row.version)
+            if not_modified(request, headers):
+                return not_modified_response(headers)
+
+        generation = entity_cache.generation(table)
+        entity = await db.run(load, entity_id)
+        with timed_serialization():
+            cached = entity_cache.serialize(entity, schema)
+        # A replica read of a row this process just wrote may predate the write.
+        if not (db.node.is_replica and replica_may_lag(table, entity_id)):
+            entity_cache.store(table, entity_id, cached, generation)
+
+    headers = entity_validators(table, entity_id, cached.updated_at, cached.version)
+    if not_modified(request, headers):
+        return not_modified_response(headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+async def projected_entity_response(
+    request: Request,
+    db: DBSession,
+    table: str,
+    entity_id: Any,
+    fields: List[str],
+    load: Callable[[Session, Any, List[str]], Any],
+) -> Response:
+    """
+    GET of one entity limited to `fields`. `load` selects just those columns
+    plus updated_at and version, which is cheap enough to also answer
+    conditional requests, so the entity cache (which holds full bodies) is not
+    involved.
+    """
+    row = await db.run(load, entity_id, fields)
+    headers = entity_validators(table, entity_id, row.updated_at, row.version)
+    if not_modified(request, headers):
+        return not_modified_response(headers)
+    with timed_serialization():
+        body = dumps(row_dicts([row], fields)[0])
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+from config import settings
+from utils.invalidation import on_commit
+
+
+def normalize_filters(filters: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    """
+    Turns a filter dict into a hashable key. Unset filters are dropped and
+    `*_contains`/`q` values are lower-cased (they are matched case-insensitively),
+    so equivalent requests share one entry.
+    """
+    items = []
+    for name, value in filters.items():
+        if value is None or value == "":
+            continue
+        if (name == "q" or name.endswith("_contains")) and isinstance(value, str):
+            value = value.lower()
+        items.append((name, value))
+    return tuple(sorted(items))
+
+
+class CountCache:
+    """
+    Exact COUNT(*) results per (table, normalized filters), bounded by size and TTL.
+
+    Every table has a generation number that `invalidate` bumps. A count is only
+    stored if the generation did not move while it was being computed, so a
+    count that raced with a write is never cached.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[int, float]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, table: str) -> int:
+        return self._generations.get(table, 0)
+
+    def get(self, table: str, key: Hashable) -> Optional[int]:
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get((table, key))
+            if entry is None:
+                return None
+            total, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[(table, key)]
+                return None
+            self._entries.move_to_end((table, key))
+            return total
+
+    def set(self, table: str, key: Hashable, total: int, generation: int) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if self._generations.get(table, 0) != generation:
+                return
+            self._entries[(table, key)] = (total, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end((table, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table: str) -> None:
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for cache_key in [k for k in self._entries if k[0] == table]:
+                del self._entries[cache_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache(
+    ttl_seconds=settings.count_cache_ttl_seconds,
+    max_entries=settings.count_cache_max_entries,
+)
+
+
+@on_commit
+def _invalidate_counts(table: str, ids: Sequence[int]) -> None:
+    count_cache.invalidate(table)
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, List
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+
+from config import settings
+from db import open_db
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+async def _partitions(stmt: Select, read_only: bool) -> AsyncIterator[Any]:
+    # The response outlives the request's dependencies, so the stream owns its session.
+    async with open_db(read_only=read_only) as db:
+        async for partition in db.stream(stmt, settings.export_chunk_size):
+            yield partition
+
+
+async def _ndjson(stmt: Select, columns: List[str], read_only: bool) -> AsyncIterator[bytes]:
+    async for partition in _partitions(stmt, read_only):
+        lines = [json.dumps(dict(zip(columns, row)), default=_json_default, separators=(",", ":")) for row in partition]
+        yield ("\n".join(lines) + "\n").encode()
+
+
+async def _csv(stmt: Select, columns: List[str], read_only: bool) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for partition in _partitions(stmt, read_only):
+        writer.writerows([_csv_value(v) for v in row] for row in partition)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def export_response(stmt: Select, fmt: str, name: str, read_only: bool = False) -> StreamingResponse:
+    """
+    Streams every row of `stmt` as NDJSON or CSV, one chunk per cursor partition.
+    read_only=True reads from a replica (pass db.use_replica(request)).
+    """
+    columns = [c.name for c in stmt.selected_columns]
+    body = _ndjson(stmt, columns, read_only) if fmt == "ndjson" else _csv(stmt, columns, read_only)
+    extension = "ndjson" if fmt == "ndjson" else "csv"
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"'},
+    )
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config import settings
+
+logger = logging.getLogger("fem_api.invalidation")
+
+# listener(table, ids): ids of the rows written, or () when unknown/all
+CommitListener = Callable[[str, Sequence[int]], None]
+
+_listeners: List[CommitListener] = []
+
+# When each table / row was last written by this process (time.monotonic()),
+# so readers can tell whether a replica may not have the write yet.
+# Row entries older than recent_write_window() are forgotten.
+_table_writes: Dict[str, float] = {}
+_unkeyed_writes: Dict[str, float] = {}  # writes notified without ids: count for every row
+_row_writes: "OrderedDict[Tuple[str, Any], float]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def recent_write_window() -> float:
+    """
+    Seconds during which a write counts as recent (see db.replica_may_lag): a
+    healthy replica lags at most replica_max_lag_seconds, plus up to one
+    replica_check_interval_seconds before a lagging one is evicted, and a
+    client reads from the primary for read_your_writes_seconds anyway.
+    """
+    return max(
+        settings.replica_max_lag_seconds + settings.replica_check_interval_seconds,
+        settings.read_your_writes_seconds,
+    )
+
+
+def on_commit(listener: CommitListener) -> CommitListener:
+    """Registers a listener for committed writes. Usable as a decorator."""
+    _listeners.append(listener)
+    return listener
+
+
+def notify_commit(table: str, ids: Sequence[int] = ()) -> None:
+    """
+    Called by the services right after a successful commit that wrote rows of
+    `table`. Listeners drop whatever they cached for those rows; a failing
+    listener is logged and does not fail the (already committed) request.
+    """
+    _remember(table, ids)
+    for listener in _listeners:
+        try:
+            listener(table, ids)
+        except Exception:
+            logger.exception("Commit listener %r failed for %s", listener, table)
+
+
+def _remember(table: str, ids: Sequence[int]) -> None:
+    now = time.monotonic()
+    with _lock:
+        _table_writes[table] = now
+        if not ids:
+            _unkeyed_writes[table] = now
+        for entity_id in ids:
+            _row_writes.pop((table, entity_id), None)
+            _row_writes[(table, entity_id)] = now
+        forget_before = now - recent_write_window()
+        while _row_writes and next(iter(_row_writes.values())) < forget_before:
+            _row_writes.popitem(last=False)
+
+
+def last_commit(table: str, entity_id: Optional[Any] = None) -> float:
+    """time.monotonic() of the last write to the row (or any row of the table), 0.0 if none is remembered."""
+    if entity_id is None:
+        return _table_writes.get(table, 0.0)
+    return max(_row_writes.get((table, entity_id), 0.0), _unkeyed_writes.get(table, 0.0))
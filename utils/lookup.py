@@ -0,0 +1,81 @@
+"""
+Multi-get: many entities by id in one request (GET /trucks?ids=1,2,3 or
+POST /trucks/lookup, same for drivers).
+
+Bodies are taken from the entity cache first; only the misses are loaded,
+with one IN query per lookup_chunk_size ids, and stored back in the cache
+for the single-entity GETs. Items come back in request order, and ids with
+no row are listed in meta.missing instead of failing the request.
+"""
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, List, Optional, Type
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from config import settings
+from db import DBSession, replica_may_lag
+from utils.cache import CachedEntity, entity_cache
+from utils.metrics import timed_serialization
+from utils.serialization import dumps, row_dicts
+
+
+def parse_ids(ids: Optional[str]) -> Optional[List[int]]:
+    """ids=1,2,3 -> [1, 2, 3]; None when not given."""
+    if ids is None:
+        return None
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be comma-separated integers")
+    if not parsed:
+        raise HTTPException(status_code=422, detail="ids is empty")
+    return parsed
+
+
+def check_lookup_size(count: int) -> None:
+    if count > settings.lookup_max_ids:
+        raise HTTPException(status_code=413, detail=f"At most {settings.lookup_max_ids} ids per lookup")
+
+
+async def lookup_response(
+    db: DBSession,
+    table: str,
+    ids: Iterable[int],
+    load: Callable[[Session, List[int]], list],
+    schema: Type[BaseModel],
+    pk: str,
+) -> Response:
+    """
+    `{"meta": LookupMeta, "items": [...]}` for `ids`. `load` is a service
+    function returning rows of all columns for the ids it is given.
+    """
+    requested = list(dict.fromkeys(ids))
+    check_lookup_size(len(requested))
+
+    bodies: Dict[int, bytes] = {}
+    for entity_id in requested:
+        cached = entity_cache.peek(table, entity_id)
+        if cached is not None:
+            bodies[entity_id] = cached.body
+
+    misses = [entity_id for entity_id in requested if entity_id not in bodies]
+    if misses:
+        generation = entity_cache.generation(table)
+        rows = await db.run(load, misses)
+        fields = list(schema.model_fields)
+        with timed_serialization():
+            for row, item in zip(rows, row_dicts(rows, fields)):
+                entity_id = getattr(row, pk)
+                bodies[entity_id] = dumps(item)
+                # A replica read of a row this process just wrote may predate the write.
+                if not (db.node.is_replica and replica_may_lag(table, entity_id)):
+                    cached = CachedEntity(body=bodies[entity_id], updated_at=row.updated_at, version=row.version)
+                    entity_cache.store(table, entity_id, cached, generation)
+
+    missing = [entity_id for entity_id in requested if entity_id not in bodies]
+    meta = dumps({"requested": len(requested), "found": len(requested) - len(missing), "missing": missing})
+    items = b",".join(bodies[entity_id] for entity_id in requested if entity_id in bodies)
+    return Response(content=b'{"meta":' + meta + b',"items":[' + items + b"]}", media_type="application/json")
@@ -0,0 +1,413 @@
+"""
+Prometheus metrics without a client library.
+
+Everything on the hot path is preallocated: a histogram child owns a fixed
+list of bucket counters, children are created once per label set and then
+looked up, and an observation is a bisect plus two additions under a lock.
+The request histograms are bound once per (route, method, status) and found
+through nested dicts, so observing a request builds no label tuple or string.
+Pool gauges are read from the pools at scrape time, so they cost nothing
+between scrapes.
+
+SQL timings come from cursor events on every engine in db.py; the per-request
+totals are accumulated in a RequestStats object carried by a contextvar
+(the threadpool and SQLAlchemy's greenlets both run with the request's context).
+The same totals feed the Server-Timing header and the statement budget.
+"""
+from __future__ import annotations
+
+import contextvars
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from starlette.requests import Request
+
+from config import settings
+from db import Node, primary, replicas
+from logging_config import dropped_records
+from services.change_feed import change_feed
+from utils import slow_log
+from utils.admission import gates
+from utils.coalesce import counters as coalesce_counters, flights
+from utils.cache import entity_cache, list_cache
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Statements per request
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class _CounterChild:
+    __slots__ = ("value", "lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self.lock:
+            self.value += amount
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> Any:
+        """Returns the child for these label values; bind it once where the labels are fixed."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.bounds)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            with child.lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip((*self.bounds, float("inf")), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Gauge or counter whose samples are read at scrape time: fn() -> [(label values, value)]."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], fn: Callable[[], Iterable[Tuple[Sequence[str], float]]], kind: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, value in self.fn():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_request_duration = REGISTRY.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+)
+http_request_db_statements = REGISTRY.register(
+    Histogram("http_request_db_statements", "SQL statements per HTTP request", ("method", "route"), COUNT_BUCKETS)
+)
+http_request_db_seconds = REGISTRY.register(
+    Histogram("http_request_db_seconds", "Time spent in SQL per HTTP request", ("method", "route"), SQL_BUCKETS)
+)
+db_statement_duration = REGISTRY.register(
+    Histogram("db_statement_duration_seconds", "SQL statement execution time", ("node",), SQL_BUCKETS)
+)
+db_pool_wait = REGISTRY.register(
+    Histogram("db_pool_wait_seconds", "Time to get a connection from the pool", ("node",), SQL_BUCKETS)
+)
+
+
+# -------------------------
+# Per-request accounting
+# -------------------------
+class RequestStats:
+    __slots__ = ("statements", "db_seconds", "serialize_seconds", "budget")
+
+    def __init__(self, budget: int = 0) -> None:
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        # Statements allowed before the budget check fires; 0 means unlimited.
+        self.budget = budget or sys.maxsize
+
+    @property
+    def over_budget(self) -> bool:
+        return self.statements > self.budget
+
+
+class StatementBudgetExceeded(Exception):
+    def __init__(self, statements: int, budget: int):
+        super().__init__(f"SQL statement budget exceeded: statement {statements} of {budget} allowed")
+        self.statements = statements
+        self.budget = budget
+
+
+request_stats_var: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+@contextmanager
+def timed_serialization() -> Iterator[None]:
+    """Counts the enclosed block as serialization time of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = request_stats_var.get()
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - started
+
+
+def server_timing(stats: RequestStats, total: float) -> str:
+    """
+    Server-Timing value splitting `total` into db, ser (serialization) and app
+    (everything else), with the statement count in the db description.
+    """
+    app = max(total - stats.db_seconds - stats.serialize_seconds, 0.0)
+    return (
+        f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.statements} statements", '
+        f"ser;dur={stats.serialize_seconds * 1000:.2f}, "
+        f"app;dur={app * 1000:.2f}, "
+        f"total;dur={total * 1000:.2f}"
+    )
+
+
+def route_label(request: Request) -> str:
+    # The route template, not the raw path, keeps label cardinality bounded.
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class _RequestChildren:
+    """The request histograms' children for one (method, route, status)."""
+
+    __slots__ = ("duration", "statements", "db_seconds")
+
+    def __init__(self, method: str, route: str, status: int):
+        self.duration = http_request_duration.labels(method, route, str(status))
+        self.statements = http_request_db_statements.labels(method, route)
+        self.db_seconds = http_request_db_seconds.labels(method, route)
+
+
+# route -> method -> status -> children
+_request_children: Dict[str, Dict[str, Dict[int, _RequestChildren]]] = {}
+
+
+def _bound_children(method: str, route: str, status: int) -> _RequestChildren:
+    try:
+        return _request_children[route][method][status]
+    except KeyError:
+        # Two threads may both bind the first request: labels() hands them the same children.
+        children = _RequestChildren(method, route, status)
+        _request_children.setdefault(route, {}).setdefault(method, {})[status] = children
+        return children
+
+
+def observe_request(method: str, route: str, status: int, duration: float, stats: RequestStats) -> None:
+    """`route` is route_label() of the request, computed once by the caller."""
+    children = _bound_children(method, route, status)
+    children.duration.observe(duration)
+    children.statements.observe(stats.statements)
+    children.db_seconds.observe(stats.db_seconds)
+
+
+# -------------------------
+# Engine instrumentation
+# -------------------------
+def _active_engine(node: Node) -> Any:
+    return node.async_engine.sync_engine if node.async_engine is not None else node.engine
+
+
+def instrument(node: Node) -> None:
+    engine = _active_engine(node)
+    statement_child = db_statement_duration.labels(node.name)
+    wait_child = db_pool_wait.labels(node.name)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        statement_child.observe(elapsed)
+        stats = request_stats_var.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+            if stats.statements > stats.budget and settings.sql_statement_budget_mode == "raise":
+                # Fails at the offending statement, so the traceback shows the N+1 call site.
+                raise StatementBudgetExceeded(stats.statements, stats.budget)
+        if elapsed >= slow_log.query_threshold_seconds() and not context.execution_options.get("slow_log_skip"):
+            slow_log.record_query(node.engine, node.name, statement, parameters, context, elapsed)
+
+    # Pool.connect is where a checkout waits for a free connection.
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            wait_child.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+
+
+def _pool_samples(read: Callable[[Any], int]) -> Callable[[], Iterable[Tuple[Sequence[str], float]]]:
+    def samples():
+        for node in (primary, *replicas):
+            pool = _active_engine(node).pool
+            try:
+                yield (node.name,), read(pool)
+            except AttributeError:
+                # Pools without a queue (e.g. in-memory SQLite) have no size/overflow.
+                continue
+    return samples
+
+
+REGISTRY.register(CallbackMetric("db_pool_checked_out", "Connections currently checked out", ("node",), _pool_samples(lambda p: p.checkedout())))
+REGISTRY.register(CallbackMetric("db_pool_overflow", "Connections open beyond pool_size (negative: unused pool slots)", ("node",), _pool_samples(lambda p: p.overflow())))
+REGISTRY.register(CallbackMetric("db_pool_size", "Configured pool size", ("node",), _pool_samples(lambda p: p.size())))
+REGISTRY.register(
+    CallbackMetric(
+        "entity_cache_events_total",
+        "Entity cache lookups and removals by outcome",
+        ("event",),
+        lambda: [((name,), value) for name, value in entity_cache.stats().items() if name in ("hits", "misses", "evictions", "expirations")],
+        kind="counter",
+    )
+)
+REGISTRY.register(
+    CallbackMetric(
+        "list_cache_events_total",
+        "List page cache lookups and removals by outcome",
+        ("event",),
+        lambda: [((name,), value) for name, value in list_cache.stats().items() if name in ("hits", "misses", "evictions", "expirations")],
+        kind="counter",
+    )
+)
+REGISTRY.register(
+    CallbackMetric("log_records_dropped_total", "Log records dropped because the log queue was full", (), lambda: [((), dropped_records())], kind="counter")
+)
+REGISTRY.register(
+    CallbackMetric("admission_in_flight", "Requests admitted and running, by group", ("group",), lambda: [((n,), g.active) for n, g in gates.items()])
+)
+REGISTRY.register(
+    CallbackMetric("admission_queued", "Requests waiting for admission, by group", ("group",), lambda: [((n,), g.queued) for n, g in gates.items()])
+)
+REGISTRY.register(
+    CallbackMetric(
+        "admission_rejected_total",
+        "Requests answered 503 by admission control, by group and reason",
+        ("group", "reason"),
+        lambda: [((n, reason), count) for n, g in gates.items() for reason, count in g.rejected.items()],
+        kind="counter",
+    )
+)
+REGISTRY.register(
+    CallbackMetric(
+        "coalesce_requests_total",
+        "GET requests by single-flight outcome: led (ran), coalesced (got the leader's response), wait_timeout / not_shared (ran on their own)",
+        ("outcome",),
+        lambda: [((outcome,), count) for outcome, count in coalesce_counters.items()],
+        kind="counter",
+    )
+)
+REGISTRY.register(
+    CallbackMetric("coalesce_in_flight", "Distinct GET requests currently running with possible waiters", (), lambda: [((), len(flights))])
+)
+REGISTRY.register(
+    CallbackMetric("change_feed_subscribers", "Open /changes/stream connections", (), lambda: [((), len(change_feed.subscribers))])
+)
+
+for _node in (primary, *replicas):
+    instrument(_node)
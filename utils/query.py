@@ -1,30 +1,155 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import base64
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
 from math import ceil
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Dict, Hashable, List, Tuple, Optional
 
 from fastapi import HTTPException
-from sqlalchemy import asc, desc, func, Select
+from sqlalchemy import and_, asc, desc, false, func, literal, or_, text, tuple_, Select
 from sqlalchemy.orm import Session
 
+from config import settings
+from db import is_replica_session, replica_may_lag
+from models import utcnow
+from utils.count_cache import count_cache
+
+
+TOTAL_MODES = ("exact", "estimate", "none")
+
 
 @dataclass
 class PaginationResult:
     items: list
-    total: int
-    total_pages: int
+    total: Optional[int]
+    total_pages: Optional[int]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    total_exact: Optional[bool] = None
+    # Related rows loaded for the page in one query each, by relation name (e.g. expand=driver)
+    related: Dict[str, list] = field(default_factory=dict)
+    # Delta sync (updated_since=): set on the last page, the updated_since for the next sync
+    high_water_mark: Optional[datetime] = None
 
 
-def apply_pagination(db: Session, query: Select, page: int, page_size: int) -> PaginationResult:
-    # total count
-    count_q = query.with_only_columns(func.count()).order_by(None)
+def _exact_total(db: Session, query: Select, count_key: Optional[Tuple[str, Hashable]]) -> int:
+    if count_key is not None:
+        table, key = count_key
+        cached = count_cache.get(table, key)
+        if cached is not None:
+            return cached
+        generation = count_cache.generation(table)
+
+    # maintain_column_froms: without a WHERE the FROM would otherwise be dropped (SELECT count(*) -> 1)
+    count_q = query.with_only_columns(func.count(), maintain_column_froms=True).order_by(None)
     total = db.execute(count_q).scalar_one()
-    total_pages = max(1, ceil(total / page_size)) if page_size > 0 else 1
+
+    # A lagging replica's count could outlive the write's invalidation.
+    if count_key is not None and not (is_replica_session(db) and replica_may_lag(table)):
+        count_cache.set(table, key, total, generation)
+    return total
+
+
+def _driver_params(compiled: Any) -> Any:
+    """
+    The bound values of a compiled statement in the driver's paramstyle: a
+    tuple in placeholder order for the positional ones (the MySQL drivers use
+    `format`, %s), else the dict by name.
+    """
+    if compiled.positional:
+        return tuple(compiled.params[name] for name in compiled.positiontup)
+    return compiled.params
+
+
+def _estimated_total(db: Session, query: Select, filtered: bool) -> Optional[int]:
+    """
+    Planner/statistics row estimate. Only MySQL exposes one cheaply; other
+    dialects return None and the caller falls back to an exact count.
+    """
+    bind = db.get_bind()
+    if bind.dialect.name != "mysql":
+        return None
+
+    if not filtered:
+        table = query.get_final_froms()[0].name
+        return db.execute(
+            text(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+            ),
+            {"table": table},
+        ).scalar_one_or_none()
+
+    compiled = query.order_by(None).compile(dialect=bind.dialect)
+    plan = db.connection().exec_driver_sql("EXPLAIN " + str(compiled), _driver_params(compiled)).mappings().first()
+    if plan is None or plan.get("rows") is None:
+        return None
+    return int(plan["rows"] * float(plan.get("filtered") or 100) / 100)
+
+
+def resolve_total(
+    db: Session,
+    query: Select,
+    total_mode: str,
+    count_key: Optional[Tuple[str, Hashable]] = None,
+) -> Tuple[Optional[int], Optional[bool]]:
+    """
+    Returns (total, is_exact) for total_mode exact|estimate|none.
+
+    count_key is (table_name, normalized filters); when given, exact counts are
+    served from and stored in the count cache.
+    """
+    if total_mode == "none":
+        return None, None
+
+    if total_mode == "estimate":
+        if count_key is not None:
+            cached = count_cache.get(*count_key)
+            if cached is not None:
+                return cached, True
+        estimate = _estimated_total(db, query, filtered=bool(count_key and count_key[1]))
+        if estimate is not None:
+            return estimate, False
+
+    return _exact_total(db, query, count_key), True
+
+
+def _fetch(db: Session, query: Select) -> list:
+    """ORM objects for select(Model), row tuples for column selects (see `window_columns`)."""
+    result = db.execute(query)
+    return result.scalars().all() if len(query.column_descriptions) == 1 else result.all()
+
+
+def window_columns(sort_fields: List[Tuple[object, str]], *extra: Any) -> List[Any]:
+    """
+    Columns to select instead of the whole entity when only the shape of a page
+    is needed (which rows, their versions, the cursors): the sort keys, which
+    end with the primary key, plus `extra`.
+    """
+    columns: Dict[str, Any] = {}
+    for col in [*(c for c, _ in sort_fields), *extra]:
+        columns.setdefault(col.key, col)
+    return list(columns.values())
+
+
+def apply_pagination(
+    db: Session,
+    query: Select,
+    page: int,
+    page_size: int,
+    total_mode: str = "exact",
+    count_key: Optional[Tuple[str, Hashable]] = None,
+) -> PaginationResult:
+    total, total_exact = resolve_total(db, query, total_mode, count_key)
+    total_pages = None
+    if total is not None:
+        total_pages = max(1, ceil(total / page_size)) if page_size > 0 else 1
 
     offset = (page - 1) * page_size
-    rows = db.execute(query.offset(offset).limit(page_size)).scalars().all()
-    return PaginationResult(items=rows, total=total, total_pages=total_pages)
+    rows = _fetch(db, query.offset(offset).limit(page_size))
+    return PaginationResult(items=rows, total=total, total_pages=total_pages, total_exact=total_exact)
 
 
 def parse_sort(sort: Optional[str], allowed_fields: Dict[str, object]) -> List[Tuple[object, str]]:
@@ -56,7 +181,235 @@ def parse_sort(sort: Optional[str], allowed_fields: Dict[str, object]) -> List[T
     return parsed
 
 
+def parse_fields(fields: Optional[str], allowed_fields: Dict[str, object]) -> Optional[List[str]]:
+    """
+    fields selects the attributes returned, comma-separated:
+      fields=truck_id,unit_number,is_active
+    Returns the names in allowed_fields order (the schema order), or None for all.
+    """
+    if not fields:
+        return None
+
+    requested = {p.strip() for p in fields.split(",") if p.strip()}
+    if not requested:
+        return None
+
+    for field in requested:
+        if field not in allowed_fields:
+            raise HTTPException(status_code=422, detail=f"Invalid field: {field}")
+    return [name for name in allowed_fields if name in requested]
+
+
+def with_tiebreaker(sort_fields: List[Tuple[object, str]], pk: object) -> List[Tuple[object, str]]:
+    """
+    Appends the primary key as the last sort key (unless already present) so
+    the ordering is total and pages never overlap or skip rows. It takes the
+    direction of the key before it: an index on (col) (which ends with the
+    primary key) can then be read backwards for `-col`, with no filesort.
+    """
+    if any(col is pk for col, _ in sort_fields):
+        return sort_fields
+    direction = sort_fields[-1][1] if sort_fields else "asc"
+    return [*sort_fields, (pk, direction)]
+
+
 def apply_sort(query: Select, sort_fields: List[Tuple[object, str]]) -> Select:
     for col, direction in sort_fields:
         query = query.order_by(desc(col) if direction == "desc" else asc(col))
-    return query
\ No newline at end of file
+    return query
+
+
+# -------------------------
+# Keyset (cursor) pagination
+# -------------------------
+def _sort_signature(sort_fields: List[Tuple[object, str]]) -> str:
+    return ",".join(("-" if direction == "desc" else "") + col.key for col, direction in sort_fields)
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any, col: Any) -> Any:
+    """
+    Inverse of _encode_value for a value of `col`. Cursors come from clients,
+    so anything _encode_value could not have produced for that column is a
+    ValueError rather than a literal of the wrong type in the SQL.
+    """
+    if value is None:
+        if not col.expression.nullable:
+            raise ValueError(f"{col.key} cannot be null")
+        return None
+    python_type = col.type.python_type
+    if python_type is datetime:
+        if not (isinstance(value, dict) and value.keys() == {"dt"} and isinstance(value["dt"], str)):
+            raise ValueError(f"{col.key} must be a datetime")
+        return datetime.fromisoformat(value["dt"])
+    # type() rather than isinstance(): a bool is not an int here.
+    if type(value) is not python_type or (python_type is int and not -(2**63) <= value < 2**63):
+        raise ValueError(f"{col.key} must be a {python_type.__name__}")
+    return value
+
+
+def encode_cursor(sort_fields: List[Tuple[object, str]], item: Any, direction: str) -> str:
+    payload = {
+        "s": _sort_signature(sort_fields),
+        "d": direction,
+        "v": [_encode_value(getattr(item, col.key)) for col, _ in sort_fields],
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_fields: List[Tuple[object, str]]) -> Tuple[List[Any], str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        encoded = payload["v"]
+        direction = payload["d"]
+        signature = payload["s"]
+        if signature != _sort_signature(sort_fields) or len(encoded) != len(sort_fields) or direction not in ("next", "prev"):
+            raise HTTPException(status_code=422, detail="Cursor does not match the requested sort")
+        values = [_decode_value(value, col) for value, (col, _) in zip(encoded, sort_fields)]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+    return values, direction
+
+
+def _after(col: Any, value: Any, direction: str) -> Any:
+    # NULLs sort first ascending and last descending (MySQL/SQLite semantics).
+    if direction == "asc":
+        return col.is_not(None) if value is None else col > literal(value, col.type)
+    return false() if value is None else or_(col < literal(value, col.type), col.is_(None))
+
+
+def _equal(col: Any, value: Any) -> Any:
+    return col.is_(None) if value is None else col == literal(value, col.type)
+
+
+def keyset_predicate(sort_fields: List[Tuple[object, str]], values: List[Any]) -> Any:
+    """
+    WHERE clause selecting the rows strictly after `values` in the given order.
+
+    Uses a row-value comparison `(a, b) > (x, y)` when every key shares one
+    direction and no NULLs are involved, otherwise the equivalent expanded form
+    `a > x OR (a = x AND b > y)`.
+    """
+    directions = {direction for _, direction in sort_fields}
+    nullable = any(col.expression.nullable for col, _ in sort_fields) or any(v is None for v in values)
+    if len(directions) == 1 and not nullable:
+        cols = tuple_(*[col for col, _ in sort_fields])
+        vals = tuple_(*[literal(v, col.type) for (col, _), v in zip(sort_fields, values)])
+        return cols > vals if directions == {"asc"} else cols < vals
+
+    clauses = []
+    for i, (col, direction) in enumerate(sort_fields):
+        prefix = [_equal(c, v) for (c, _), v in zip(sort_fields[:i], values[:i])]
+        clauses.append(and_(*prefix, _after(col, values[i], direction)))
+    return or_(*clauses)
+
+
+def apply_keyset_pagination(
+    db: Session,
+    query: Select,
+    sort_fields: List[Tuple[object, str]],
+    page_size: int,
+    cursor: Optional[str],
+    total_mode: str = "none",
+    count_key: Optional[Tuple[str, Hashable]] = None,
+) -> PaginationResult:
+    """
+    Seeks past the cursor instead of using OFFSET, so every page costs the same.
+
+    `sort_fields` must already end with the primary key (see `with_tiebreaker`).
+    The total (over the unseeked query) is only computed if asked for.
+    """
+    total, total_exact = resolve_total(db, query, total_mode, count_key)
+
+    direction = "next"
+    if cursor:
+        values, direction = decode_cursor(cursor, sort_fields)
+
+    # Walking backwards is walking forwards over the reversed order.
+    reverse = {"asc": "desc", "desc": "asc"}
+    fields = sort_fields if direction == "next" else [(col, reverse[d]) for col, d in sort_fields]
+
+    if cursor:
+        query = query.where(keyset_predicate(fields, values))
+    query = apply_sort(query.order_by(None), fields)
+
+    rows = _fetch(db, query.limit(page_size + 1))
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == "prev":
+        rows.reverse()
+
+    has_next = has_more if direction == "next" else bool(cursor)
+    has_prev = bool(cursor) if direction == "next" else has_more
+
+    return PaginationResult(
+        items=rows,
+        total=total,
+        total_pages=max(1, ceil(total / page_size)) if total is not None else None,
+        total_exact=total_exact,
+        next_cursor=encode_cursor(sort_fields, rows[-1], "next") if rows and has_next else None,
+        prev_cursor=encode_cursor(sort_fields, rows[0], "prev") if rows and has_prev else None,
+    )
+
+
+# -------------------------
+# Delta sync (updated_since=)
+# -------------------------
+def reject_combined(name: str, **params: Any) -> None:
+    """422 if any of `params` (query parameter values) is set alongside `name`."""
+    conflicting = sorted(param for param, value in params.items() if value is not None)
+    if conflicting:
+        raise HTTPException(status_code=422, detail=f"{name} cannot be combined with: {', '.join(conflicting)}")
+
+
+def check_delta_params(updated_since: Optional[datetime], **params: Any) -> Optional[datetime]:
+    """
+    Validates a delta-sync request and returns updated_since as naive UTC (how
+    updated_at is stored), or None when not syncing. `params` are the request's
+    filters and sort: a row leaving a filter would never be reported, and the
+    order is fixed to (updated_at, pk), so none can be combined with it.
+    """
+    if updated_since is None:
+        return None
+    reject_combined("updated_since", **params)
+    if updated_since.tzinfo is not None:
+        updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+    return updated_since
+
+
+def delta_sort_fields(updated_at: Any, pk: Any) -> List[Tuple[object, str]]:
+    return [(updated_at, "asc"), (pk, "asc")]
+
+
+def apply_delta_pagination(
+    db: Session,
+    query: Select,
+    updated_at: Any,
+    pk: Any,
+    updated_since: datetime,
+    page_size: int,
+    cursor: Optional[str],
+) -> PaginationResult:
+    """
+    Rows with updated_at >= updated_since, walked by cursor in (updated_at, pk)
+    order, which the composite index on those columns serves as a range scan:
+    the cost follows the number of changes, not the table size.
+
+    The last page carries the high-water mark for the next sync: now minus
+    delta_sync_settle_seconds, because updated_at is set before the write
+    commits. The next sync re-reads that window (a few rows twice) rather
+    than miss a write that committed late.
+    """
+    sort_fields = delta_sort_fields(updated_at, pk)
+    high_water_mark = max(updated_since, utcnow() - timedelta(seconds=settings.delta_sync_settle_seconds))
+    result = apply_keyset_pagination(db, query.where(updated_at >= updated_since), sort_fields, page_size, cursor)
+    if result.next_cursor is None:
+        result.high_water_mark = high_water_mark
+    return result
@@ -0,0 +1,93 @@
+"""
+Fast JSON for list pages.
+
+The list services select plain column tuples; this module turns them straight
+into response bytes instead of building ORM entities, then `*Out` models, then
+letting FastAPI validate those again through `response_model` and encode them.
+
+The bytes match FastAPI's encoding of the response model: compact separators,
+non-ASCII kept as UTF-8, datetimes as pydantic writes them (ISO 8601, "Z" for
+UTC). orjson is used when installed, the standard library otherwise.
+"""
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional: only faster
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_UTC_Z)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+
+def row_dicts(rows: Sequence[Any], fields: Sequence[str]) -> List[Dict[str, Any]]:
+    """Rows (named tuples from a column select) as dicts with `fields`, in that order."""
+    if not rows:
+        return []
+    positions = [rows[0]._fields.index(name) for name in fields]
+    if len(positions) == 1:
+        position = positions[0]
+        return [{fields[0]: row[position]} for row in rows]
+    pick = itemgetter(*positions)
+    return [dict(zip(fields, pick(row))) for row in rows]
+
+
+def embed_related(rows: Sequence[Any], foreign_key: str, related: Sequence[Any], schema: Type[BaseModel], key: str) -> List[Optional[Dict[str, Any]]]:
+    """
+    The related object for each row (None if unset or missing), matching
+    `row.<foreign_key>` to `related_row.<key>`; related rows render as `schema`.
+    """
+    by_key = {getattr(r, key): d for r, d in zip(related, row_dicts(related, list(schema.model_fields)))}
+    return [by_key.get(getattr(row, foreign_key)) for row in rows]
+
+
+def list_body(
+    meta: BaseModel,
+    rows: Sequence[Any],
+    item_schema: Type[BaseModel],
+    fields: Optional[Sequence[str]] = None,
+    expanded: Optional[Dict[str, List[Any]]] = None,
+    tombstones: Optional[List[Dict[str, Any]]] = None,
+) -> bytes:
+    """
+    Body of a `{"meta": ..., "items": [...]}` list response, items limited to
+    `fields` (a sparse fieldset) when given, plus one key per `expanded`
+    relation (see `embed_related`), plus `"tombstones"` when given (see
+    `split_tombstones`). The rows are trusted as they come from typed
+    columns; only the small meta model goes through pydantic.
+    """
+    items = row_dicts(rows, fields or list(item_schema.model_fields))
+    for name, values in (expanded or {}).items():
+        for item, value in zip(items, values):
+            item[name] = value
+    body = {"meta": meta.model_dump(mode="json"), "items": items}
+    if tombstones is not None:
+        body["tombstones"] = tombstones
+    return dumps(body)
+
+
+def split_tombstones(rows: Sequence[Any], pk: str) -> Tuple[List[Any], List[Dict[str, Any]]]:
+    """Delta sync rows: (active rows, `{pk, updated_at}` of the deactivated ones)."""
+    live = [row for row in rows if row.is_active]
+    tombstones = [{pk: getattr(row, pk), "updated_at": row.updated_at} for row in rows if not row.is_active]
+    return live, tombstones
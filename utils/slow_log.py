@@ -0,0 +1,217 @@
+"""
+Slow-query / slow-request log and on-demand request profiles.
+
+- Statements slower than SLOW_QUERY_MS are recorded with their parameters
+  (redacted by default), the request_id and duration. SELECTs also get an
+  EXPLAIN, run afterwards by a single background worker on a separate
+  connection, so the request neither waits for it nor shares its transaction.
+- Requests slower than SLOW_REQUEST_MS are recorded with their SQL totals.
+- With PROFILE_REQUESTS enabled, a request sending `X-Profile: 1` is run
+  under cProfile (sampled by PROFILE_SAMPLE_RATE, one at a time). The response
+  carries X-Profile-Id and the stats are kept for /admin/profiles/{id}.
+
+Everything is kept in bounded in-memory ring buffers exposed under /admin.
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import itertools
+import logging
+import pstats
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import Engine
+
+from config import settings
+from utils.request_context import get_request_id
+
+logger = logging.getLogger("fem_api.slow")
+
+PROFILE_HEADER = "X-Profile"
+# EXPLAINs waiting for the worker; beyond this new slow queries are logged without a plan.
+MAX_PENDING_EXPLAINS = 16
+
+
+class RingLog:
+    """Last `size` entries, each with a sequential id."""
+
+    def __init__(self, size: int):
+        self._entries: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            entry["id"] = next(self._ids)
+            self._entries.append(entry)
+        return entry
+
+    def list(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()  # newest first
+        return entries[:limit] if limit else entries
+
+    def get(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((e for e in self._entries if e["id"] == entry_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+slow_queries = RingLog(settings.slow_log_size)
+slow_requests = RingLog(settings.slow_log_size)
+profiles = RingLog(max(1, settings.slow_log_size // 10))
+
+_explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+_pending_explains = 0
+_pending_lock = threading.Lock()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _redact(parameters: Any) -> Any:
+    if not settings.slow_query_redact_params:
+        return parameters if isinstance(parameters, (dict, list)) else list(parameters or ())
+    if isinstance(parameters, dict):
+        return {name: "?" for name in parameters}
+    return ["?"] * len(parameters or ())
+
+
+# -------------------------
+# Slow queries
+# -------------------------
+def record_query(engine: Engine, node: str, statement: str, parameters: Any, context: Any, elapsed: float) -> None:
+    """Called from the cursor event when a statement exceeded settings.slow_query_ms."""
+    entry = slow_queries.add(
+        {
+            "at": _now(),
+            "request_id": get_request_id() or None,
+            "node": node,
+            "duration_ms": round(elapsed * 1000, 2),
+            "statement": statement,
+            "parameters": _redact(parameters),
+            "explain": None,
+        }
+    )
+    logger.warning("slow_query duration_ms=%s node=%s statement=%s", entry["duration_ms"], node, " ".join(statement.split())[:500])
+
+    # Only plain SELECTs: EXPLAIN of a write is not free everywhere, and
+    # executemany/streamed statements cannot be replayed as one query.
+    if not settings.slow_query_explain or context.executemany or context.execution_options.get("stream_results"):
+        return
+    if not statement.lstrip()[:6].upper() == "SELECT":
+        return
+    _submit_explain(engine, entry, statement, parameters)
+
+
+def _submit_explain(engine: Engine, entry: Dict[str, Any], statement: str, parameters: Any) -> None:
+    global _pending_explains
+    with _pending_lock:
+        if _pending_explains >= MAX_PENDING_EXPLAINS:
+            entry["explain"] = {"skipped": "too many pending EXPLAINs"}
+            return
+        _pending_explains += 1
+    _explainer.submit(_explain, engine, entry, statement, parameters)
+
+
+def _explain(engine: Engine, entry: Dict[str, Any], statement: str, parameters: Any) -> None:
+    global _pending_explains
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        with engine.connect() as conn:
+            # Skip the instrumentation: the EXPLAIN itself must not be logged or counted.
+            conn = conn.execution_options(slow_log_skip=True)
+            result = conn.exec_driver_sql(prefix + statement, parameters)
+            entry["explain"] = [dict(row._mapping) for row in result]
+    except Exception as exc:
+        entry["explain"] = {"error": f"{exc.__class__.__name__}: {exc}"}
+    finally:
+        with _pending_lock:
+            _pending_explains -= 1
+
+
+# -------------------------
+# Slow requests
+# -------------------------
+def record_request(method: str, path: str, route: str, status: int, elapsed: float, statements: int, db_seconds: float) -> None:
+    entry = slow_requests.add(
+        {
+            "at": _now(),
+            "request_id": get_request_id() or None,
+            "method": method,
+            "path": path,
+            "route": route,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 2),
+            "statements": statements,
+            "db_ms": round(db_seconds * 1000, 2),
+        }
+    )
+    logger.warning(
+        "slow_request method=%s path=%s status=%s duration_ms=%s statements=%s db_ms=%s",
+        method, path, status, entry["duration_ms"], statements, entry["db_ms"],
+    )
+
+
+# -------------------------
+# Profiles
+# -------------------------
+_profile_lock = threading.Lock()
+
+
+def start_profile(header_value: Optional[str]) -> Optional[cProfile.Profile]:
+    """
+    A running profiler if this request asked for one and was sampled, else None.
+    cProfile covers the event-loop thread only (not threadpool workers) and
+    sees whatever else the loop runs meanwhile; one profile runs at a time.
+    """
+    if not settings.profile_requests or header_value not in ("1", "true"):
+        return None
+    if random.random() >= settings.profile_sample_rate or not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler is active on this thread
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def finish_profile(profiler: cProfile.Profile, method: str, path: str, elapsed: float) -> int:
+    profiler.disable()
+    _profile_lock.release()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(50)
+    entry = profiles.add(
+        {
+            "at": _now(),
+            "request_id": get_request_id() or None,
+            "method": method,
+            "path": path,
+            "duration_ms": round(elapsed * 1000, 2),
+            "stats": out.getvalue(),
+        }
+    )
+    return entry["id"]
+
+
+def query_threshold_seconds() -> float:
+    # <= 0 disables; +inf keeps the hot-path check a single comparison.
+    return settings.slow_query_ms / 1000 if settings.slow_query_ms > 0 else float("inf")
+
+
+def request_threshold_seconds() -> float:
+    return settings.slow_request_ms / 1000 if settings.slow_request_ms > 0 else float("inf")
+
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Type, TypeVar
+
+from sqlalchemy import case, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import utcnow
+
+T = TypeVar("T")
+
+
+def update_by_pk(db: Session, model: Type[T], pk: Any, values: Dict[str, Any]) -> Optional[T]:
+    """
+    UPDATE <table> SET <values> WHERE <pk> = :pk without loading the row first.
+    Returns the updated entity, or None if no row has that pk.
+
+    Where the dialect supports UPDATE ... RETURNING (SQLite, PostgreSQL) the
+    row comes back in the same statement; otherwise (MySQL) it is read back
+    with one SELECT in the same transaction.
+
+    updated_at and version only move when a value actually changes, as with
+    the ORM unit of work (a no-op PATCH or deactivating an inactive row keeps
+    them).
+    """
+    pk_col = model.__mapper__.primary_key[0]
+    changed = or_(*[getattr(model, name).is_distinct_from(value) for name, value in values.items()])
+    stmt = (
+        update(model)
+        .where(pk_col == pk)
+        # updated_at and version first: MySQL evaluates SET left to right, so they must compare against the old values.
+        .ordered_values(
+            (model.updated_at, case((changed, utcnow()), else_=model.updated_at)),
+            (model.version, case((changed, model.version + 1), else_=model.version)),
+            *[(getattr(model, name), value) for name, value in values.items()],
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    if db.get_bind().dialect.update_returning:
+        return db.scalars(stmt.returning(model)).one_or_none()
+    if db.execute(stmt).rowcount == 0:
+        return None
+    return db.get(model, pk, populate_existing=True)
+
+
+def is_foreign_key_violation(exc: IntegrityError) -> bool:
+    """True if the write referenced a missing parent row (MySQL error 1452, SQLite/PostgreSQL by message)."""
+    orig = exc.orig
+    if getattr(orig, "args", None) and orig.args[0] == 1452:
+        return True
+    return "foreign key" in str(orig).lower()